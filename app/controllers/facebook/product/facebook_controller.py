@@ -1,81 +1,119 @@
 # controllers/facebook_controller.py
+import os
 import time
+import asyncio
 import logging
-import json
-from typing import Dict, Any, List
-from fastapi import HTTPException
-from fastapi.responses import JSONResponse
+from contextlib import aclosing
+from typing import Dict, Any, List, AsyncGenerator, Optional, Tuple
 
-from ....models.facebook.facebook_metadata_model import ScrapeRequest, ScraperConfig
+from ....models.facebook.facebook_metadata_model import ScrapeRequest, ScrapeJobRequest, ScraperConfig
 from ....services.facebook.product.scraper_core import AsyncFacebookScraperStreaming
-from ....exceptions.social_integration import SocialScrapingFailedException, InvalidSocialURLException
+from ....services.facebook.product.job_manager import ScrapeJobManager
+from ....services.facebook.product.scheduler import ScrapeScheduler, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from ....services.facebook.product.rate_limiter import RateLimiter
+from ....exceptions.social_integration import (
+    SocialScrapingFailedException, InvalidSocialURLException, ScrapeJobNotFoundException
+)
 
 logger = logging.getLogger(__name__)
 
-
-
-def make_serializable(obj):
-    """Hàm đệ quy để đảm bảo tất cả dữ liệu có thể serialize thành JSON"""
-    if isinstance(obj, (str, int, float, bool, type(None))):
-        return obj
-    elif isinstance(obj, dict):
-        return {key: make_serializable(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [make_serializable(item) for item in obj]
-    else:
-        return str(obj)
+# Số slot scrape dùng chung của engine (request chỉ điều chỉnh window của riêng nó)
+ENGINE_MAX_CONCURRENT = int(os.getenv('FB_MAX_CONCURRENT', '6'))
+# Ngân sách request tới Facebook của cả process (dùng chung cho mọi pool)
+ENGINE_REQUESTS_PER_MINUTE = int(os.getenv('FB_REQUESTS_PER_MINUTE', '30'))
 
 
 class FacebookScraperController:
-    def __init__(self):
-        self.scraper = None
-        self.config = None
-
-    async def init_scraper(self, config: ScraperConfig):
-        """Khởi tạo scraper với cấu hình"""
-        # Nếu scraper đã tồn tại và cấu hình không thay đổi, không cần tạo mới
-        if self.scraper and self.config == config:
-            return self.scraper
-
-        # Dọn dẹp scraper cũ nếu có
-        if self.scraper:
-            await self.cleanup()
-
-        # Tạo scraper mới với cấu hình
-        self.scraper = AsyncFacebookScraperStreaming(
-            headless=config.headless,
-            max_concurrent=config.max_concurrent,
-            cache_ttl=config.cache_ttl,
-            enable_images=config.enable_images,
-            mode=config.mode  # Add mode parameter
-        )
-        # Khởi tạo context manager
-        await self.scraper.__aenter__()
+    """
+    Dùng chung scraper (browser pool + task engine) sống lâu dài giữa các request:
+    - Chỉ option cấp browser (headless, enable_images) chọn pool; tối đa 4 pool, tạo lazy
+    - mode, cache_ttl, max_concurrent áp dụng theo từng lần gọi, không relaunch browser;
+      window / batch_size của request bị giới hạn bởi số slot của scheduler
+    - Mọi pool dùng chung một scheduler và một rate limiter nên tổng số slot scrape
+      và số request/phút không tăng theo số pool
+    """
+
+    def __init__(self, max_concurrent: int = ENGINE_MAX_CONCURRENT,
+                 requests_per_minute: int = ENGINE_REQUESTS_PER_MINUTE):
+        self.config = ScraperConfig()  # cấu hình mặc định (cập nhật qua /config)
+        self.scheduler = ScrapeScheduler(max_concurrent=max_concurrent)
+        self.rate_limiter = RateLimiter(max_requests_per_minute=requests_per_minute, max_concurrent=max_concurrent)
+        self.scrapers: Dict[Tuple[bool, bool], AsyncFacebookScraperStreaming] = {}
+        self._scrapers_lock = asyncio.Lock()
+        self.job_manager = ScrapeJobManager(self.init_scraper)
+
+    @staticmethod
+    def _pool_key(config: ScraperConfig) -> Tuple[bool, bool]:
+        return bool(config.headless), bool(config.enable_images)
+
+    def _clamp_concurrency(self, value: Optional[int]) -> int:
+        """window / batch_size do request gửi lên, không vượt quá số slot của scheduler"""
+        return max(1, min(value or self.scheduler.max_concurrent, self.scheduler.max_concurrent))
+
+    @property
+    def scraper(self) -> Optional[AsyncFacebookScraperStreaming]:
+        """Scraper của cấu hình mặc định (None nếu chưa khởi tạo)"""
+        return self.scrapers.get(self._pool_key(self.config))
+
+    async def init_scraper(self, config: ScraperConfig) -> AsyncFacebookScraperStreaming:
+        """Lấy scraper dùng chung cho option browser của config, tạo mới ở lần đầu"""
+        key = self._pool_key(config)
+        scraper = self.scrapers.get(key)
+        if scraper:
+            return scraper
+
+        async with self._scrapers_lock:
+            scraper = self.scrapers.get(key)
+            if scraper is None:
+                logger.info(f"Launching shared scraper pool (headless={key[0]}, enable_images={key[1]})")
+                scraper = AsyncFacebookScraperStreaming(
+                    headless=config.headless,
+                    max_concurrent=self.scheduler.max_concurrent,
+                    cache_ttl=self.config.cache_ttl,
+                    enable_images=config.enable_images,
+                    mode=self.config.mode,
+                    scheduler=self.scheduler,
+                    rate_limiter=self.rate_limiter
+                )
+                # Khởi tạo context manager
+                await scraper.__aenter__()
+                self.scrapers[key] = scraper
+        return scraper
+
+    async def configure(self, config: ScraperConfig) -> AsyncFacebookScraperStreaming:
+        """Cập nhật cấu hình mặc định và khởi động sẵn pool tương ứng (không đóng pool đang chạy)"""
         self.config = config
-        return self.scraper
+        return await self.init_scraper(config)
 
     async def cleanup(self):
-        """Dọn dẹp scraper"""
-        if self.scraper:
-            await self.scraper.__aexit__(None, None, None)
-            self.scraper = None
-            self.config = None
+        """Dọn dẹp job và toàn bộ scraper (khi shutdown)"""
+        await self.job_manager.shutdown()
+        async with self._scrapers_lock:
+            scrapers, self.scrapers = list(self.scrapers.values()), {}
+        for scraper in scrapers:
+            try:
+                await scraper.__aexit__(None, None, None)
+            except Exception as e:
+                logger.warning(f"Error closing scraper: {e}")
+        await self.rate_limiter.close()
 
     # =============================================
     # PHƯƠNG PHÁP 1: Streaming Results
     # =============================================
-    async def method_streaming(self, request: ScrapeRequest) -> Dict[str, Any]:
+    async def method_streaming(self, request: ScrapeRequest) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Phương pháp 1: Streaming - trả về kết quả ngay khi từng URL hoàn thành
         Tốt cho việc hiển thị progress real-time
-        """
-        start_time = time.time()
 
+        Validate + khởi tạo scraper trước (lỗi vẫn trả về HTTP status bình thường),
+        sau đó trả về async generator các event: start -> result (mỗi URL) -> summary.
+        Đóng generator (client ngắt kết nối) sẽ hủy phần việc còn lại.
+        """
         # Validate URLs first
         for url in request.urls:
             if not url.startswith(('http://', 'https://')):
                 raise InvalidSocialURLException(url, "facebook")
-        
+
         # Khởi tạo scraper
         config = ScraperConfig(
             headless=request.headless,
@@ -86,49 +124,67 @@ class FacebookScraperController:
         )
         scraper = await self.init_scraper(config)
 
-        # Chuẩn bị response
-        response = {
+        return self._stream_events(scraper, request, config)
+
+    async def _stream_events(self, scraper: AsyncFacebookScraperStreaming, request: ScrapeRequest,
+                             config: ScraperConfig) -> AsyncGenerator[Dict[str, Any], None]:
+        start_time = time.time()
+        processed = 0
+        successful_count = 0
+        cache_hits = 0
+
+        yield {
+            "event": "start",
             "method": "streaming",
-            "success": True,
             "total_urls": len(request.urls),
-            "mode": config.mode,  # Include mode in response
-            "start_time": start_time,
-            "results": [],
-            "errors": []
+            "mode": config.mode,
+            "start_time": start_time
         }
 
-        # Xử lý streaming
+        # Headers đã gửi đi, lỗi giữa chừng được báo bằng event "error" thay vì HTTP status
         try:
-            async for result in scraper.get_multiple_metadata_streaming(request.urls, mode=config.mode):
-                url = result["url"]
-                data = result["data"]
-
-                # Thêm vào results
-                serializable_data = make_serializable(data)
-                response["results"].append({
-                    "url": url,
-                    "data": serializable_data,
-                    "processed_at": time.time()
-                })
-
-                # Log errors
-                if not data.get('success', False):
-                    response["errors"].append({
-                        "url": url,
-                        "error": data.get('error', 'Unknown error')
-                    })
+            results = scraper.get_multiple_metadata_streaming(request.urls, mode=config.mode,
+                                                              priority=PRIORITY_BATCH,
+                                                              client_id=request.client_id or "default",
+                                                              budget=request.max_wait,
+                                                              window=self._clamp_concurrency(config.max_concurrent),
+                                                              cache_ttl=config.cache_ttl,
+                                                              trace=bool(request.trace))
+            async with aclosing(results) as stream:
+                async for result in stream:
+                    data = result["data"]
+                    processed += 1
+                    if data.get('success', False):
+                        successful_count += 1
+                    if data.get('from_cache', False):
+                        cache_hits += 1
+
+                    event = {
+                        "event": "result",
+                        "index": processed,
+                        "url": result["url"],
+                        "data": data,
+                        "processed_at": time.time()
+                    }
+                    if not data.get('success', False):
+                        event["error"] = data.get('error', 'Unknown error')
+                    yield event
 
         except Exception as e:
             logger.error(f"Error in method_streaming: {str(e)}")
-            raise SocialScrapingFailedException(request.urls[0] if request.urls else "", "facebook", str(e))
+            yield {"event": "error", "error": str(e), "processed": processed}
 
-        response["end_time"] = time.time()
-        response["total_time"] = response["end_time"] - start_time
-        response["successful_count"] = sum(1 for r in response["results"]
-                                        if r["data"].get('success', False))
-        response["failed_count"] = len(request.urls) - response["successful_count"]
-
-        return response
+        end_time = time.time()
+        yield {
+            "event": "summary",
+            "total_urls": len(request.urls),
+            "processed": processed,
+            "successful_count": successful_count,
+            "failed_count": processed - successful_count,
+            "cache_hits": cache_hits,
+            "end_time": end_time,
+            "total_time": end_time - start_time
+        }
 
     # =============================================
     # PHƯƠNG PHÁP 2: Batch Processing
@@ -156,8 +212,13 @@ class FacebookScraperController:
         scraper = await self.init_scraper(config)
 
         # Thực hiện batch scraping
-        batch_size = request.batch_size or config.max_concurrent
-        results = await scraper.get_multiple_metadata(request.urls, mode=config.mode, batch_size=batch_size)
+        batch_size = self._clamp_concurrency(request.batch_size or config.max_concurrent)
+        results = await scraper.get_multiple_metadata(request.urls, mode=config.mode, batch_size=batch_size,
+                                                      priority=PRIORITY_BATCH,
+                                                      client_id=request.client_id or "default",
+                                                      budget=request.max_wait,
+                                                      cache_ttl=config.cache_ttl,
+                                                      trace=bool(request.trace))
 
         # Chuẩn bị response
         response = {
@@ -177,8 +238,7 @@ class FacebookScraperController:
         failed_count = 0
 
         for url, data in results.items():
-            serializable_data = make_serializable(data)
-            response["results"][url] = serializable_data
+            response["results"][url] = data
 
             if data.get('success', False):
                 successful_count += 1
@@ -205,8 +265,9 @@ class FacebookScraperController:
     # =============================================
     # PHƯƠNG PHÁP 3: Single URL
     # =============================================
-    async def method_single(self, url: str, config: ScraperConfig) -> Dict[str, Any]:
-        """Scrape một URL duy nhất"""
+    async def method_single(self, url: str, config: ScraperConfig, client_id: str = "default",
+                            max_wait: float = None, trace: bool = False) -> Dict[str, Any]:
+        """Scrape một URL duy nhất (priority interactive, không xếp sau các batch lớn)"""
         start_time = time.time()
 
         if not url.startswith(('http://', 'https://')):
@@ -214,7 +275,9 @@ class FacebookScraperController:
         
         scraper = await self.init_scraper(config)
         # Use the mode from config when calling get_facebook_metadata
-        result = await scraper.get_facebook_metadata(url, mode=config.mode)
+        result = await scraper.get_facebook_metadata(url, mode=config.mode, priority=PRIORITY_INTERACTIVE,
+                                                     client_id=client_id, budget=max_wait,
+                                                     cache_ttl=config.cache_ttl, trace=trace)
 
         response = {
             "method": "single",
@@ -224,7 +287,41 @@ class FacebookScraperController:
             "start_time": start_time,
             "end_time": time.time(),
             "total_time": time.time() - start_time,
-            "data": make_serializable(result)
+            "data": result
         }
 
-        return response
\ No newline at end of file
+        return response
+
+    # =============================================
+    # PHƯƠNG PHÁP 4: Async Jobs (batch lớn)
+    # =============================================
+    async def submit_job(self, request: ScrapeJobRequest) -> Dict[str, Any]:
+        """Tạo job chạy nền và trả về job ID ngay"""
+        config = ScraperConfig(
+            headless=request.headless,
+            cache_ttl=request.cache_ttl,
+            enable_images=request.enable_images,
+            mode=request.mode
+        )
+        window = self._clamp_concurrency(request.window) if request.window else None
+        job = self.job_manager.submit(request.urls, mode=config.mode, client_id=request.client_id or "default",
+                                      budget=request.max_wait, window=window, config=config)
+        return job.to_status()
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        job = self.job_manager.get(job_id)
+        if job is None:
+            raise ScrapeJobNotFoundException(job_id)
+        return job.to_status()
+
+    async def get_job_results(self, job_id: str, cursor: int = 0, limit: int = 100) -> Dict[str, Any]:
+        page = await self.job_manager.get_results(job_id, cursor=cursor, limit=limit)
+        if page is None:
+            raise ScrapeJobNotFoundException(job_id)
+        return page
+
+    async def cancel_job(self, job_id: str) -> Dict[str, Any]:
+        job = await self.job_manager.cancel(job_id)
+        if job is None:
+            raise ScrapeJobNotFoundException(job_id)
+        return job.to_status()
@@ -1,5 +1,7 @@
 from app.services.youtube.youtube_service_og import YouTubeServiceOg
 from app.services.youtube.youtube_service_detail import YouTubeServiceDetail
+from app.services.youtube.youtube_metadata_batch import youtube_metadata_batch, KIND_OG, KIND_FULL
+from app.models.youtube.youtube_metadata_model import YouTubeBatchRequest
 from app.config.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -24,4 +26,14 @@ class YouTubeController:
         logger.info(f"Detailed metadata fetched successfully for: {url}")
         return result
 
+# --- BATCH ---
 
+    @staticmethod
+    def get_metadata_og_batch(request: YouTubeBatchRequest):
+        logger.info(f"Received batch request for OG metadata: {len(request.urls)} URLs")
+        return youtube_metadata_batch.stream(request.urls, KIND_OG, request.max_concurrent)
+
+    @staticmethod
+    def get_metadata_detail_batch(request: YouTubeBatchRequest):
+        logger.info(f"Received batch request for detailed metadata: {len(request.urls)} URLs")
+        return youtube_metadata_batch.stream(request.urls, KIND_FULL, request.max_concurrent)
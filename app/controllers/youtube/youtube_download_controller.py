@@ -1,5 +1,17 @@
-from fastapi import HTTPException
+import asyncio
+from pathlib import Path
+from urllib.parse import quote
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from app.services.youtube.youtube_download_jobs import (
+    download_job_manager, DownloadJob, DownloadQueueFullError, KIND_VIDEO, KIND_AUDIO, JOB_COMPLETED
+)
 from app.services.youtube.youtube_download_service import YouTubeDownloadService
+from app.services.youtube.download_store import download_store
+from app.utils.media_response import conditional_file_response, media_type_for_file
+from app.models.youtube.youtube_download_model import DownloadJobRequest
+from app.exceptions.video import DownloadJobNotFoundException
 from app.config.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -7,12 +19,16 @@ logger = get_logger(__name__)
 class YouTubeDownloadController:
 
     @staticmethod
-    async def download_video(url: str, quality: str):
-        logger.info(f"Received request to download video: {url}, quality: {quality}")
+    async def download_video(url: str, quality: str, mode: str = "merged"):
+        logger.info(f"Received request to download video: {url}, quality: {quality}, mode: {mode}")
         try:
-            file_path = await YouTubeDownloadService.download_video(url, quality)
+            # Chạy qua hàng đợi download (giới hạn worker, gộp request trùng)
+            job = download_job_manager.submit(url, KIND_VIDEO, quality=quality, mode=mode)
+            file_path = await download_job_manager.wait(job)
             logger.info(f"Video download completed successfully: {file_path}")
-            return {"file_path": file_path}
+            return {"file_path": file_path, "job_id": job.id}
+        except DownloadQueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             logger.error(f"Error downloading video {url}: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
@@ -21,11 +37,132 @@ class YouTubeDownloadController:
     async def download_audio(url: str, audio_format: str):
         logger.info(f"Received request to download audio: {url}, format: {audio_format}")
         try:
-            file_path = await YouTubeDownloadService.download_audio(url, audio_format)
+            job = download_job_manager.submit(url, KIND_AUDIO, audio_format=audio_format)
+            file_path = await download_job_manager.wait(job)
             logger.info(f"Audio download completed successfully: {file_path}")
-            return {"file_path": file_path}
+            return {"file_path": file_path, "job_id": job.id}
+        except DownloadQueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             logger.error(f"Error downloading audio {url}: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
+# --- JOBS ---
 
+    @staticmethod
+    def submit_job(request: DownloadJobRequest):
+        try:
+            job = download_job_manager.submit(request.url, request.kind, quality=request.quality,
+                                              mode=request.mode, audio_format=request.audio_format)
+        except DownloadQueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return download_job_manager.status(job)
+
+    @staticmethod
+    def get_job(job_id: str):
+        job = download_job_manager.get(job_id)
+        if job is None:
+            raise DownloadJobNotFoundException(job_id)
+        return download_job_manager.status(job)
+
+    @staticmethod
+    def list_jobs():
+        return {"jobs": download_job_manager.list_jobs()}
+
+    @staticmethod
+    async def cancel_job(job_id: str):
+        job = await download_job_manager.cancel(job_id)
+        if job is None:
+            raise DownloadJobNotFoundException(job_id)
+        return download_job_manager.status(job)
+
+    @staticmethod
+    async def get_job_media(job_id: str):
+        """Thông tin media (duration, codec, bitrate, size) của file kết quả, đọc từ sidecar của store"""
+        job = download_job_manager.get(job_id)
+        if job is None:
+            raise DownloadJobNotFoundException(job_id)
+        if job.status != JOB_COMPLETED or not job.file_path:
+            raise HTTPException(status_code=409, detail=f"Download job {job_id} is {job.status}, not completed")
+        if not Path(job.file_path).is_file():
+            raise HTTPException(status_code=404, detail="Downloaded file is no longer available")
+        media = await asyncio.to_thread(YouTubeDownloadService.media_info, job.file_path)
+        if media is None:
+            raise HTTPException(status_code=503, detail="Media information unavailable (ffprobe not found or failed)")
+        return {"job_id": job.id, "file_path": job.file_path, "media": media}
+
+    @staticmethod
+    def get_store_entry(key: str):
+        meta = download_store.get_meta(key)
+        if meta is None:
+            raise HTTPException(status_code=404, detail=f"Artifact {key} not found in download store")
+        return meta
+
+# --- FILE STREAMING ---
+
+    @staticmethod
+    async def stream_video(request: Request, url: str, quality: str, mode: str = "merged",
+                           progressive: bool = True):
+        try:
+            job = download_job_manager.submit(url, KIND_VIDEO, quality=quality, mode=mode)
+        except DownloadQueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return await YouTubeDownloadController.job_file_response(request, job, progressive)
+
+    @staticmethod
+    async def stream_audio(request: Request, url: str, audio_format: str, progressive: bool = True):
+        try:
+            job = download_job_manager.submit(url, KIND_AUDIO, audio_format=audio_format)
+        except DownloadQueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return await YouTubeDownloadController.job_file_response(request, job, progressive)
+
+    @staticmethod
+    async def stream_job_file(request: Request, job_id: str, progressive: bool = True):
+        job = download_job_manager.get(job_id)
+        if job is None:
+            raise DownloadJobNotFoundException(job_id)
+        return await YouTubeDownloadController.job_file_response(request, job, progressive)
+
+    @staticmethod
+    async def job_file_response(request: Request, job: DownloadJob, progressive: bool = True):
+        """
+        Job đã xong: trả file (Range, ETag/If-None-Match).
+        Đang tải và file đang ghi chính là kết quả cuối cùng: stream phần đã tải rồi đọc tiếp tới hết.
+        Còn lại (merge video + audio, convert audio): chờ job xong rồi trả file.
+        """
+        if progressive and request.headers.get("range") is None:
+            source = await download_job_manager.wait_for_source(job)
+            if source is not None:
+                logger.info(f"Streaming download job {job.id} while downloading: {source[1]}")
+                filename = Path(source[1]).name
+                return StreamingResponse(
+                    download_job_manager.iter_progressive(job),
+                    media_type=media_type_for_file(filename),
+                    headers={"Content-Disposition": _content_disposition(filename),
+                             "X-Download-Job": job.id}
+                )
+
+        try:
+            file_path = await download_job_manager.wait(job)
+        except Exception as e:
+            logger.error(f"Error waiting for download job {job.id}: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+        # Giữ artifact trong store tới khi gửi xong (không bị evict giữa chừng)
+        key = download_store.key_for_path(file_path)
+        background = None
+        if key is not None:
+            download_store.pin(key)
+            background = BackgroundTask(download_store.unpin, key)
+        try:
+            return conditional_file_response(request, file_path, filename=Path(file_path).name, tag=key,
+                                             headers={"X-Download-Job": job.id}, background=background)
+        except OSError as e:
+            if key is not None:
+                download_store.unpin(key)
+            raise HTTPException(status_code=404, detail=f"Downloaded file is no longer available: {e}")
+
+
+def _content_disposition(filename: str) -> str:
+    return f"attachment; filename*=utf-8''{quote(filename)}"
@@ -11,12 +11,14 @@ class ErrorCode(str, Enum):
     INVALID_VIDEO_URL = "INVALID_VIDEO_URL"
     VIDEO_FETCH_FAILED = "VIDEO_FETCH_FAILED"
     VIDEO_PROCESSING_FAILED = "VIDEO_PROCESSING_FAILED"
+    DOWNLOAD_JOB_NOT_FOUND = "DOWNLOAD_JOB_NOT_FOUND"
     
     # Social integration errors
     INVALID_SOCIAL_URL = "INVALID_SOCIAL_URL"
     SOCIAL_FETCH_FAILED = "SOCIAL_FETCH_FAILED"
     SOCIAL_SCRAPING_FAILED = "SOCIAL_SCRAPING_FAILED"
     SOCIAL_RATE_LIMITED = "SOCIAL_RATE_LIMITED"
+    SCRAPE_JOB_NOT_FOUND = "SCRAPE_JOB_NOT_FOUND"
     
     # Authentication errors
     UNAUTHORIZED = "UNAUTHORIZED"
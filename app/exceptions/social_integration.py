@@ -62,4 +62,16 @@ class SocialRateLimitedException(AppException):
             message=f"Rate limit exceeded for {platform}" if platform else "Social media API rate limit exceeded",
             status_code=429,
             details=details
-        )
\ No newline at end of file
+        )
+
+
+class ScrapeJobNotFoundException(AppException):
+    """Raised when a scrape job ID does not exist (or has expired)"""
+
+    def __init__(self, job_id: str = ""):
+        super().__init__(
+            code=ErrorCode.SCRAPE_JOB_NOT_FOUND,
+            message=f"Scrape job not found: {job_id}" if job_id else "Scrape job not found",
+            status_code=404,
+            details={"job_id": job_id}
+        )
@@ -41,4 +41,16 @@ class VideoProcessingFailedException(AppException):
             message=f"Failed to process video: {url}" if url else "Failed to process video",
             status_code=500,
             details=details
-        )
\ No newline at end of file
+        )
+
+
+class DownloadJobNotFoundException(AppException):
+    """Raised when a download job ID does not exist (or has expired)"""
+
+    def __init__(self, job_id: str = ""):
+        super().__init__(
+            code=ErrorCode.DOWNLOAD_JOB_NOT_FOUND,
+            message=f"Download job not found: {job_id}" if job_id else "Download job not found",
+            status_code=404,
+            details={"job_id": job_id}
+        )
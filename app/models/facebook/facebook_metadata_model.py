@@ -13,6 +13,9 @@ class ScrapeRequest(BaseModel):
     max_concurrent: Optional[int] = 5
     cache_ttl: Optional[int] = 600
     mode: Optional[str] = "simple"  # simple|full|super
+    client_id: Optional[str] = None  # dùng để chia sẻ công bằng giữa các API client
+    max_wait: Optional[float] = None  # thời gian chờ slot tối đa (giây), vượt quá sẽ bị từ chối sớm
+    trace: Optional[bool] = False  # trả về thời gian từng giai đoạn trong key `timings` của mỗi kết quả
     
     @field_validator('urls')
     @classmethod
@@ -27,6 +30,30 @@ class ScrapeRequest(BaseModel):
         return v
 
 
+class ScrapeJobRequest(BaseModel):
+    """Job chạy nền cho batch lớn (kết quả lấy theo trang qua /facebook/jobs/{id}/results)"""
+    urls: List[str]
+    enable_images: Optional[bool] = True  # cùng mặc định với /streaming, /batch, /single -> dùng chung pool
+    headless: Optional[bool] = True
+    cache_ttl: Optional[int] = 600
+    mode: Optional[str] = "simple"  # simple|full|super
+    window: Optional[int] = None  # số URL xử lý cùng lúc trong job (tối đa bằng số slot của engine)
+    client_id: Optional[str] = None
+    max_wait: Optional[float] = None
+
+    @field_validator('urls')
+    @classmethod
+    def validate_urls(cls, v):
+        if not v:
+            raise ValueError('URLs cannot be empty')
+        if len(v) > 200000:
+            raise ValueError('Too many URLs. Maximum 200000 URLs per job.')
+        for url in v:
+            if not url.startswith(('http://', 'https://')):
+                raise ValueError(f'Invalid URL format: {url}')
+        return v
+
+
 class ScraperConfig(BaseModel):
     headless: Optional[bool] = True
     max_concurrent: Optional[int] = 5
@@ -0,0 +1,32 @@
+from typing import Optional
+from pydantic import BaseModel, field_validator
+
+
+class DownloadJobRequest(BaseModel):
+    """Job download chạy nền (theo dõi progress qua /youtube/full/jobs/{id})"""
+    url: str
+    kind: str = "video"                 # video|audio
+    quality: Optional[str] = "720p"     # 360p, 480p, 720p, 1080p (kind=video)
+    mode: Optional[str] = "merged"      # video|merged (kind=video)
+    audio_format: Optional[str] = "mp3"  # mp3, m4a, webm... (kind=audio)
+
+    @field_validator('url')
+    @classmethod
+    def validate_url(cls, v):
+        if not v.startswith(('http://', 'https://')):
+            raise ValueError(f'Invalid URL format: {v}')
+        return v
+
+    @field_validator('kind')
+    @classmethod
+    def validate_kind(cls, v):
+        if v not in ("video", "audio"):
+            raise ValueError("kind must be 'video' or 'audio'")
+        return v
+
+    @field_validator('mode')
+    @classmethod
+    def validate_mode(cls, v):
+        if v is not None and v not in ("video", "merged"):
+            raise ValueError("mode must be 'video' or 'merged'")
+        return v
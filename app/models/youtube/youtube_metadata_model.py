@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, field_validator
 
 class YouTubeMetadata(BaseModel):
     video_id: str
@@ -8,3 +9,24 @@ class YouTubeMetadata(BaseModel):
     url: str | None
     site_name: str | None = "YouTube"
     type: str | None = "video"
+
+
+class YouTubeBatchRequest(BaseModel):
+    urls: List[str]
+    max_concurrent: Optional[int] = None  # số video lấy cùng lúc (mặc định theo server)
+
+    @field_validator('urls')
+    @classmethod
+    def validate_urls(cls, v):
+        if not v:
+            raise ValueError('URLs cannot be empty')
+        if len(v) > 500:  # Limit to prevent abuse
+            raise ValueError('Too many URLs. Maximum 500 URLs allowed.')
+        return v
+
+    @field_validator('max_concurrent')
+    @classmethod
+    def validate_max_concurrent(cls, v):
+        if v is not None and not 1 <= v <= 32:
+            raise ValueError('max_concurrent must be between 1 and 32')
+        return v
@@ -0,0 +1,79 @@
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.exceptions.auth import UnauthorizedException, InsufficientPermissionsException
+from app.utils.profiler import profiler, loop_watchdog, to_collapsed, top_functions
+from app.services.ffmpeg_service.ffmpeg_service import ffmpeg_service
+from app.services.youtube.download_tuner import download_tuner
+
+def require_admin(request: Request):
+    """
+    Bắt buộc header X-Admin-Token khớp ADMIN_TOKEN trong env.
+    Không đặt ADMIN_TOKEN thì admin endpoints bị tắt (403): sau reverse proxy mọi request
+    đều đến từ localhost nên không thể dựa vào IP client.
+    """
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        raise InsufficientPermissionsException(resource="admin endpoints (ADMIN_TOKEN is not set)", action="access")
+    provided = request.headers.get("X-Admin-Token", "")
+    if not secrets.compare_digest(provided, token):
+        raise UnauthorizedException("Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profile")
+async def profile(
+    seconds: float = 10.0,
+    interval_ms: float = 10.0,
+    threads: str = "all",       # all|loop
+    format: str = "collapsed"   # collapsed|json
+):
+    """
+    Lấy mẫu stack của event loop thread và các thread executor trong `seconds` giây.
+    format=collapsed trả về collapsed stack (flamegraph.pl, speedscope, inferno),
+    format=json trả về top hàm theo self time kèm các stack.
+    """
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="A profiling session is already running")
+    try:
+        result = await profiler.profile(seconds, interval=interval_ms / 1000.0, loop_only=threads == "loop")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    stacks = result["stacks"]
+    if format == "json":
+        return JSONResponse(content={
+            "duration": result["duration"],
+            "interval": result["interval"],
+            "samples": result["samples"],
+            "top_functions": top_functions(stacks),
+            "stacks": dict(stacks.most_common())
+        })
+    return PlainTextResponse(to_collapsed(stacks))
+
+
+@router.get("/loop-stalls")
+async def loop_stalls(limit: Optional[int] = 20):
+    """Các lần event loop bị block vượt ngưỡng gần đây, kèm stack tại thời điểm phát hiện"""
+    status = loop_watchdog.get_status()
+    if limit is not None:
+        status["stalls"] = status["stalls"][-limit:]
+    return status
+
+
+@router.get("/ffmpeg")
+async def ffmpeg_status():
+    """Số process FFmpeg đang chạy / đang chờ slot và giới hạn hiện tại"""
+    return ffmpeg_service.get_status()
+
+
+@router.get("/download-tuner")
+async def download_tuner_status():
+    """Throughput đo được, băng thông chia cho mỗi download và thông số download kế tiếp sẽ dùng"""
+    return download_tuner.get_status()
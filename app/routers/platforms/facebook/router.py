@@ -1,11 +1,17 @@
 # routers/facebook_router.py
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 import time
+from typing import Optional
 
-from ....models.facebook.facebook_metadata_model import ScrapeRequest, ScraperConfig
+from ....models.facebook.facebook_metadata_model import ScrapeRequest, ScrapeJobRequest, ScraperConfig
 from ....controllers.facebook.product.facebook_controller import FacebookScraperController
 from ....services.facebook.product.scaler import scaler
+from ....services.facebook.product.host_limiter import host_limiter
+from ....utils.fast_json import FastJSONResponse
+from ....utils.streaming import (
+    STREAM_HEADERS, choose_stream_format, encode_event_stream, media_type_for
+)
 
 # Tạo router với prefix
 router = APIRouter(prefix="/facebook", tags=["facebook"])
@@ -20,50 +26,75 @@ async def facebook_root():
     return {
         "message": "Facebook Scraper API",
         "endpoints": {
-            "/streaming": "Scrape URLs with streaming method (POST)",
+            "/streaming": "Scrape URLs with streaming method, NDJSON/SSE (POST)",
             "/batch": "Scrape URLs with batch method (POST)",
             "/single": "Scrape single URL (GET)",
+            "/jobs": "Submit a background scrape job for large batches (POST)",
+            "/jobs/{job_id}": "Job status and progress (GET) / cancel job (DELETE)",
+            "/jobs/{job_id}/results": "Paginated job results, ?cursor=&limit= (GET)",
             "/config": "Update scraper configuration (POST)"
         }
     }
 
 
+def _client_id(http_request: Request, client_id: Optional[str] = None) -> str:
+    """client_id do client gửi lên, mặc định là IP của client"""
+    if client_id:
+        return client_id
+    return http_request.client.host if http_request.client else "default"
+
+
 @router.post("/streaming")
-async def scrape_streaming(request: ScrapeRequest):
+async def scrape_streaming(request: ScrapeRequest, http_request: Request,
+                           format: Optional[str] = None):  # ndjson|sse
     """
     Phương pháp Streaming:
-    - Trả về kết quả ngay khi từng URL hoàn thành
-    - Tốt cho real-time progress
+    - Gửi từng kết quả ngay khi URL hoàn thành (NDJSON mặc định, SSE với
+      ?format=sse hoặc header Accept: text/event-stream)
+    - Event: start -> result (mỗi URL) -> summary
+    - Client ngắt kết nối thì phần việc còn lại bị hủy
     """
     try:
-        result = await controller.method_streaming(request)
-        return JSONResponse(content=result, status_code=200)
+        request.client_id = _client_id(http_request, request.client_id)
+        events = await controller.method_streaming(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    stream_format = choose_stream_format(format, http_request.headers.get("accept"))
+    return StreamingResponse(
+        encode_event_stream(events, http_request, stream_format),
+        media_type=media_type_for(stream_format),
+        headers=STREAM_HEADERS
+    )
+
 
 @router.post("/batch")
-async def scrape_batch(request: ScrapeRequest):
+async def scrape_batch(request: ScrapeRequest, http_request: Request):
     """
     Phương pháp Batch:
     - Xử lý theo batch và trả về tất cả cùng lúc
     - Tốt cho xử lý số lượng lớn
     """
     try:
+        request.client_id = _client_id(http_request, request.client_id)
         result = await controller.method_batch(request)
-        return JSONResponse(content=result, status_code=200)
+        return FastJSONResponse(content=result, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/single")
 async def scrape_single(
+    http_request: Request,
     url: str,
     headless: bool = True,
     max_concurrent: int = 5,
     cache_ttl: int = 600,
     enable_images: bool = True,
-    mode: str = "simple"  # simple|full|super
+    mode: str = "simple",  # simple|full|super
+    client_id: Optional[str] = None,
+    max_wait: Optional[float] = None,  # thời gian chờ slot tối đa (giây)
+    trace: bool = False  # trả về thời gian từng giai đoạn trong data.timings
 ):
     """
     Scrape một URL duy nhất
@@ -76,23 +107,57 @@ async def scrape_single(
             enable_images=enable_images,
             mode=mode
         )
-        result = await controller.method_single(url, config)
-        return JSONResponse(content=result, status_code=200)
+        result = await controller.method_single(url, config, client_id=_client_id(http_request, client_id),
+                                                max_wait=max_wait, trace=trace)
+        return FastJSONResponse(content=result, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/jobs", status_code=202, response_class=FastJSONResponse)
+async def submit_job(request: ScrapeJobRequest, http_request: Request):
+    """
+    Tạo job scrape chạy nền cho batch lớn, trả về job_id ngay.
+    Theo dõi qua GET /jobs/{job_id}, lấy kết quả qua GET /jobs/{job_id}/results
+    """
+    request.client_id = _client_id(http_request, request.client_id)
+    return FastJSONResponse(content=await controller.submit_job(request), status_code=202)
+
+
+@router.get("/jobs")
+async def list_jobs():
+    return {"jobs": controller.job_manager.list_jobs()}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Trạng thái và progress của job"""
+    return controller.get_job(job_id)
+
+
+@router.get("/jobs/{job_id}/results", response_class=FastJSONResponse)
+async def get_job_results(job_id: str, cursor: int = 0, limit: int = 100):
+    """
+    Kết quả theo trang (theo thứ tự hoàn thành).
+    Gọi tiếp với cursor=next_cursor cho tới khi next_cursor = null
+    """
+    return FastJSONResponse(content=await controller.get_job_results(job_id, cursor=cursor, limit=limit))
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Hủy job, các kết quả đã có vẫn lấy được"""
+    return await controller.cancel_job(job_id)
+
+
 @router.post("/config")
 async def update_config(config: ScraperConfig):
     """
     Cập nhật cấu hình scraper
     """
     try:
-        # Cleanup scraper cũ nếu có
-        await controller.cleanup()
-
-        # Khởi tạo scraper mới
-        await controller.init_scraper(config)
+        # Cập nhật cấu hình mặc định và khởi động sẵn pool (không đóng pool đang phục vụ request khác)
+        await controller.configure(config)
 
         return {
             "success": True,
@@ -108,10 +173,17 @@ async def health_check():
     """Health check cho Facebook scraper"""
     return {
         "status": "healthy",
-        "scraper_initialized": controller.scraper is not None
+        "scraper_initialized": controller.scraper is not None,
+        "scraper_pools": len(controller.scrapers)
     }
 
 
+@router.on_event("shutdown")
+async def shutdown_scrapers():
+    """Đóng browser pool dùng chung khi tắt server"""
+    await controller.cleanup()
+
+
 # Scaling-related endpoints
 @router.get("/scaling/status")
 async def get_scaling_status():
@@ -126,6 +198,15 @@ async def get_scaling_status():
         raise HTTPException(status_code=500, detail=f"Error getting scaling status: {str(e)}")
 
 
+@router.get("/scaling/host-limits")
+async def get_host_limits():
+    """Concurrency limit (AIMD) hiện tại theo từng host đích"""
+    return {
+        "status": "success",
+        "data": host_limiter.get_status()
+    }
+
+
 @router.post("/scaling/manual")
 async def manual_scaling_operation(operation: str, value: int = None):
     """
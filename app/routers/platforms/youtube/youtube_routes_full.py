@@ -1,6 +1,12 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
+from typing import Optional
+from fastapi.responses import StreamingResponse
+from app.models.youtube.youtube_metadata_model import YouTubeBatchRequest
+from app.utils.streaming import STREAM_HEADERS, choose_stream_format, encode_event_stream, media_type_for
 from app.controllers.youtube.youtube_controller import YouTubeController
 from app.controllers.youtube.youtube_download_controller import YouTubeDownloadController
+from app.models.youtube.youtube_download_model import DownloadJobRequest
+from app.services.youtube.download_store import download_store
 from app.config.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -26,7 +32,7 @@ async def download_video(
 ):
     logger.info(f"Received request to download video: {url}, quality: {quality}, mode: {mode}")
     try:
-        result = await YouTubeDownloadController.download_video(url, quality)
+        result = await YouTubeDownloadController.download_video(url, quality, mode)
         logger.info(f"Successfully returned download video response for: {url}")
         return result
     except Exception as e:
@@ -46,4 +52,94 @@ async def download_audio(
         return result
     except Exception as e:
         logger.error(f"Error in download audio request for {url}: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+@router.get("/download-video/file")
+async def stream_video_file(
+    request: Request,
+    url: str = Query(...),
+    quality: str = Query("720p", description="Quality: 360p, 480p, 720p, 1080p"),
+    mode: str = Query("merged", description="Mode: video, merged"),
+    progressive: bool = Query(True, description="Stream while downloading when the file needs no merge/convert")
+):
+    """Trả thẳng file video (Range, ETag); đã có trong store thì trả ngay"""
+    logger.info(f"Received request to stream video: {url}, quality: {quality}, mode: {mode}")
+    return await YouTubeDownloadController.stream_video(request, url, quality, mode, progressive)
+
+
+@router.get("/download-audio/file")
+async def stream_audio_file(
+    request: Request,
+    url: str = Query(...),
+    audio_format: str = Query("mp3", description="Format: mp3, m4a, webm"),
+    progressive: bool = Query(True, description="Stream while downloading when the file needs no convert")
+):
+    logger.info(f"Received request to stream audio: {url}, format: {audio_format}")
+    return await YouTubeDownloadController.stream_audio(request, url, audio_format, progressive)
+
+
+@router.post("/jobs", status_code=202)
+async def submit_download_job(request: DownloadJobRequest):
+    """
+    Tạo job download chạy nền, trả về job_id ngay.
+    Theo dõi progress qua GET /jobs/{job_id}, hủy qua DELETE /jobs/{job_id}
+    """
+    logger.info(f"Received download job: {request.url}, kind: {request.kind}")
+    return YouTubeDownloadController.submit_job(request)
+
+
+@router.get("/jobs")
+async def list_download_jobs():
+    return YouTubeDownloadController.list_jobs()
+
+
+@router.get("/jobs/{job_id}")
+async def get_download_job(job_id: str):
+    """Trạng thái, progress (bytes, speed, eta) và file_path khi xong"""
+    return YouTubeDownloadController.get_job(job_id)
+
+
+@router.get("/jobs/{job_id}/file")
+async def get_download_job_file(request: Request, job_id: str, progressive: bool = True):
+    """File kết quả của job (chờ job xong, hoặc stream trong lúc tải nếu được)"""
+    return await YouTubeDownloadController.stream_job_file(request, job_id, progressive)
+
+
+@router.get("/jobs/{job_id}/media")
+async def get_download_job_media(job_id: str):
+    """Duration, codec, bitrate, kích thước của file kết quả (ffprobe một lần, lưu trong store)"""
+    return await YouTubeDownloadController.get_job_media(job_id)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_download_job(job_id: str):
+    return await YouTubeDownloadController.cancel_job(job_id)
+
+
+@router.get("/store")
+async def get_download_store_status():
+    """Dung lượng đã dùng / quota, số artifact, hit/miss/eviction của download store"""
+    return download_store.get_status()
+
+
+@router.get("/store/{key}")
+async def get_download_store_entry(key: str):
+    """Metadata của một artifact trong store (meta.json, gồm thông tin media)"""
+    return YouTubeDownloadController.get_store_entry(key)
+
+@router.post("/batch")
+async def get_metadata_detail_batch(request: YouTubeBatchRequest, http_request: Request,
+                                    format: Optional[str] = None):  # ndjson|sse
+    """
+    Metadata cho nhiều URL: chuẩn hóa theo video ID, bỏ trùng, cache hit trả trước,
+    phần còn lại lấy song song (giới hạn). Mỗi video một dòng NDJSON (SSE với ?format=sse)
+    """
+    logger.info(f"Received batch request for detailed metadata: {len(request.urls)} URLs")
+    events = YouTubeController.get_metadata_detail_batch(request)
+    stream_format = choose_stream_format(format, http_request.headers.get("accept"))
+    return StreamingResponse(
+        encode_event_stream(events, http_request, stream_format),
+        media_type=media_type_for(stream_format),
+        headers=STREAM_HEADERS
+    )
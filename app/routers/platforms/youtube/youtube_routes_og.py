@@ -1,4 +1,8 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
+from typing import Optional
+from fastapi.responses import StreamingResponse
+from app.models.youtube.youtube_metadata_model import YouTubeBatchRequest
+from app.utils.streaming import STREAM_HEADERS, choose_stream_format, encode_event_stream, media_type_for
 from app.controllers.youtube.youtube_controller import YouTubeController
 from app.config.logging_config import get_logger
 
@@ -12,3 +16,20 @@ async def get_metadata_og(url: str = Query(...)):
     result = await YouTubeController.get_metadata_og(url)
     logger.info(f"Successfully returned OG metadata for: {url}")
     return result
+
+
+@router.post("/batch")
+async def get_metadata_og_batch(request: YouTubeBatchRequest, http_request: Request,
+                                format: Optional[str] = None):  # ndjson|sse
+    """
+    Metadata cho nhiều URL: chuẩn hóa theo video ID, bỏ trùng, cache hit trả trước,
+    phần còn lại lấy song song (giới hạn). Mỗi video một dòng NDJSON (SSE với ?format=sse)
+    """
+    logger.info(f"Received batch request for OG metadata: {len(request.urls)} URLs")
+    events = YouTubeController.get_metadata_og_batch(request)
+    stream_format = choose_stream_format(format, http_request.headers.get("accept"))
+    return StreamingResponse(
+        encode_event_stream(events, http_request, stream_format),
+        media_type=media_type_for(stream_format),
+        headers=STREAM_HEADERS
+    )
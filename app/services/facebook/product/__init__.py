@@ -12,6 +12,11 @@ from .fetcher import PageFetcher
 from .extractor import DataExtractor
 from .task_engine import TaskEngine, SharedInMemoryCache
 from .large_batch_processor import LargeBatchProcessor
+from .url_canonicalizer import FacebookUrlCanonicalizer, url_canonicalizer
+from .pipeline import BoundedTaskWindow
+from .job_manager import ScrapeJobManager, ScrapeJob
+from .scrape_result import ScrapeResult
+from .host_limiter import HostConcurrencyLimiter, host_limiter
 
 __all__ = [
     'BrowserPool',
@@ -24,5 +29,13 @@ __all__ = [
     'DataExtractor',
     'TaskEngine',
     'SharedInMemoryCache',
-    'LargeBatchProcessor'
+    'LargeBatchProcessor',
+    'FacebookUrlCanonicalizer',
+    'url_canonicalizer',
+    'BoundedTaskWindow',
+    'ScrapeJobManager',
+    'ScrapeJob',
+    'ScrapeResult',
+    'HostConcurrencyLimiter',
+    'host_limiter'
 ]
\ No newline at end of file
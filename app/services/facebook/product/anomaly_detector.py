@@ -2,7 +2,6 @@ import time
 import math
 from typing import Dict, List, Optional, Tuple
 from collections import deque
-import statistics
 
 from .metrics import (
     FACEBOOK_NAVIGATION_DURATION,
@@ -11,49 +10,29 @@ from .metrics import (
     increment_rate_limits,
     increment_checkpoints
 )
-
-
-class EWMA:
-    """Exponentially Weighted Moving Average for anomaly detection"""
-    
-    def __init__(self, alpha: float = 0.3):
-        self.alpha = alpha
-        self.value = None
-        self.initialized = False
-    
-    def update(self, new_value: float) -> float:
-        if not self.initialized:
-            self.value = new_value
-            self.initialized = True
-        else:
-            self.value = self.alpha * new_value + (1 - self.alpha) * self.value
-        return self.value
-    
-    def get_value(self) -> Optional[float]:
-        return self.value
+from .rolling_stats import EWMA, RollingWindow
 
 
 class ZScoreDetector:
-    """Z-score based anomaly detector with rolling window"""
+    """Z-score based anomaly detector with rolling window (mean/stdev cập nhật O(1))"""
     
     def __init__(self, window_size: int = 50, threshold: float = 2.0):
         self.window_size = window_size
         self.threshold = threshold
-        self.values = deque(maxlen=window_size)
+        self.values = RollingWindow(window_size)
     
     def update(self, new_value: float) -> Tuple[float, bool]:  # (z_score, is_anomaly)
-        self.values.append(new_value)
+        self.values.add(new_value)
         
         if len(self.values) < 10:  # Need minimum values for statistics
             return 0.0, False
         
-        mean = statistics.mean(self.values)
-        stdev = statistics.stdev(self.values) if len(self.values) > 1 else 0.0
+        stdev = self.values.stdev
         
         if stdev == 0:
             return 0.0, False
         
-        z_score = abs(new_value - mean) / stdev
+        z_score = abs(new_value - self.values.mean) / stdev
         is_anomaly = z_score > self.threshold
         
         return z_score, is_anomaly
@@ -9,6 +9,7 @@ from playwright.async_api import async_playwright, Browser, Page, BrowserContext
 logger = logging.getLogger(__name__)
 
 from .metrics import update_active_contexts, update_active_pages, update_browser_memory
+from .tracing import trace_span
 
 
 class BrowserPool:
@@ -164,6 +165,10 @@ class BrowserPool:
 
     async def get_page(self) -> Tuple[Page, BrowserContext]:
         """Lấy page từ pool, tạo thêm context + pages nếu cần."""
+        with trace_span("page_checkout"):
+            return await self._checkout_page()
+
+    async def _checkout_page(self) -> Tuple[Page, BrowserContext]:
         if self._context_queue.empty():
             async with self._context_lock:
                 if self._context_queue.empty():
@@ -9,6 +9,7 @@ from playwright.async_api import Page
 logger = logging.getLogger(__name__)
 
 from .metrics import observe_extraction_duration
+from .tracing import trace_span
 
 
 class DataExtractor:
@@ -156,12 +157,13 @@ class DataExtractor:
         
         start = time.time()
         
-        if selected_mode == "simple":
-            meta = await self.extract_simple(page)
-        elif selected_mode == "full":
-            meta = await self.extract_full(page)
-        else:
-            meta = await self.extract_super(page)
+        with trace_span("extraction", mode=selected_mode):
+            if selected_mode == "simple":
+                meta = await self.extract_simple(page)
+            elif selected_mode == "full":
+                meta = await self.extract_full(page)
+            else:
+                meta = await self.extract_super(page)
 
         if not isinstance(meta, dict):
             meta = {"title": None}
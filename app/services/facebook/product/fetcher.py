@@ -11,6 +11,8 @@ logger = logging.getLogger(__name__)
 
 from .browser_pool import BrowserPool
 from .metrics import observe_navigation_duration
+from .host_limiter import host_limiter
+from .tracing import trace_span
 
 
 class PageFetcher:
@@ -23,19 +25,27 @@ class PageFetcher:
     async def fetch_page_content(self, page: Page, url: str, mode: str = "simple") -> Dict[str, Any]:
         """Navigate to URL and return the page for extraction"""
         start = time.time()
-        try:
-            # Try with commit first for faster loading
-            await page.goto(url, wait_until="commit", timeout=8000, referer="https://www.facebook.com/")
-        except Exception as e:
-            # Fallback to network idle for complex pages
-            logger.debug(f"First goto failed {url}: {e}")
+        # Số navigation đồng thời tới mỗi host do AIMD limiter điều chỉnh theo latency / rate limit
+        async with host_limiter.slot(url) as slot:
             try:
-                await page.goto(url, wait_until="networkidle", timeout=15000)
-            except Exception as e2:
-                raise e2
+                # Try with commit first for faster loading
+                with trace_span("navigation", wait_until="commit"):
+                    response = await page.goto(url, wait_until="commit", timeout=8000, referer="https://www.facebook.com/")
+            except Exception as e:
+                # Fallback to network idle for complex pages
+                logger.debug(f"First goto failed {url}: {e}")
+                try:
+                    with trace_span("navigation", wait_until="networkidle"):
+                        response = await page.goto(url, wait_until="networkidle", timeout=15000)
+                except Exception as e2:
+                    raise e2
 
-        # Wait a bit for dynamic content but with reduced time
-        await page.wait_for_timeout(random.uniform(300, 800))
+            if response is not None and response.status == 429:
+                slot.mark_rate_limited()
+
+            # Wait a bit for dynamic content but with reduced time
+            with trace_span("readiness_wait"):
+                await page.wait_for_timeout(random.uniform(300, 800))
         
         navigation_time = time.time() - start
         observe_navigation_duration(navigation_time, mode)
@@ -44,6 +54,7 @@ class PageFetcher:
         return {
             "page": page,
             "url": url,
+            "final_url": page.url,  # URL sau redirect (dùng để resolve short link)
             "navigation_time": navigation_time,
             "success": True,
             "timestamp": time.time()
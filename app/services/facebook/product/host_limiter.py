@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+from .metrics import update_host_concurrency_limit
+from .url_canonicalizer import canonical_host
+from .tracing import trace_span
+
+
+def _is_rate_limit_error(error: BaseException) -> bool:
+    message = str(error).lower()
+    return "429" in message or "rate" in message or "too many requests" in message
+
+
+class HostSlot:
+    """Handle của một navigation đang chạy, dùng để báo tín hiệu rate limit"""
+    __slots__ = ("host", "start", "rate_limited")
+
+    def __init__(self, host: str):
+        self.host = host
+        self.start = time.monotonic()
+        self.rate_limited = False
+
+    def mark_rate_limited(self) -> None:
+        self.rate_limited = True
+
+
+class AIMDLimit:
+    """
+    Concurrency limit của một host theo AIMD + latency gradient:
+    - Thành công, latency bình thường: additive increase (+1 mỗi "vòng" = +1/limit mỗi request)
+    - Latency ngắn hạn vượt `latency_tolerance` lần baseline: giảm nhẹ (x latency_backoff)
+    - Rate limit (429...): giảm mạnh (x rate_limit_backoff) và tạm ngưng tăng trong `cooldown` giây
+    - Lỗi/timeout: giảm nhẹ như latency cao
+    """
+
+    def __init__(self, host: str, initial_limit: float = 4, min_limit: float = 1, max_limit: float = 16,
+                 latency_tolerance: float = 2.0, latency_backoff: float = 0.9,
+                 rate_limit_backoff: float = 0.5, cooldown: float = 10.0):
+        self.host = host
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.latency_backoff = latency_backoff
+        self.rate_limit_backoff = rate_limit_backoff
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._baseline: Optional[float] = None   # EWMA chậm (latency "bình thường")
+        self._short: Optional[float] = None      # EWMA nhanh (latency hiện tại)
+        self._no_increase_until = 0.0
+
+        self.stats = {"completed": 0, "rate_limited": 0, "errors": 0, "decreases": 0}
+
+    async def acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot đã được cấp đúng lúc bị cancel -> trả lại
+                self.abandon()
+            raise
+
+    def release(self, latency: float, rate_limited: bool = False, error: bool = False) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        self.stats["completed"] += 1
+
+        if rate_limited:
+            self.on_rate_limit()
+        elif error:
+            self.stats["errors"] += 1
+            self._decrease(self.latency_backoff)
+        else:
+            self._observe_latency(latency)
+
+        update_host_concurrency_limit(self.host, self.limit)
+        self._wake()
+
+    def abandon(self) -> None:
+        """Trả slot mà không tính là tín hiệu về host (request bị cancel)"""
+        self.in_flight = max(0, self.in_flight - 1)
+        self._wake()
+
+    def on_rate_limit(self) -> None:
+        self.stats["rate_limited"] += 1
+        self._decrease(self.rate_limit_backoff)
+        self._no_increase_until = time.monotonic() + self.cooldown
+        update_host_concurrency_limit(self.host, self.limit)
+
+    def _observe_latency(self, latency: float) -> None:
+        if self._baseline is None:
+            self._baseline = self._short = latency
+        else:
+            self._short = 0.3 * latency + 0.7 * self._short
+            self._baseline = 0.02 * latency + 0.98 * self._baseline
+
+        if self._short > self._baseline * self.latency_tolerance:
+            self._decrease(self.latency_backoff)
+        elif time.monotonic() >= self._no_increase_until:
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(1.0, self.limit))
+
+    def _decrease(self, factor: float) -> None:
+        self.limit = max(self.min_limit, self.limit * factor)
+        self.stats["decreases"] += 1
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if future.done():
+                continue  # waiter đã bị cancel
+            self.in_flight += 1
+            future.set_result(True)
+
+    def get_status(self) -> Dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "baseline_latency": self._baseline,
+            "recent_latency": self._short,
+            **self.stats
+        }
+
+
+class HostConcurrencyLimiter:
+    """
+    Giới hạn số navigation đang chạy theo từng host đích (AIMD).
+    Chỉ bao quanh navigation thật: cache hit không bao giờ đi qua đây.
+    """
+
+    def __init__(self, **limit_options):
+        self.limit_options = limit_options
+        self._limits: Dict[str, AIMDLimit] = {}
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        """Host chuẩn của `url`: m./mbasic./www.facebook.com là cùng một origin, chung một giới hạn"""
+        try:
+            return canonical_host(urlsplit(url).hostname or "unknown")
+        except ValueError:
+            return "unknown"
+
+    def get_limit(self, host: str) -> AIMDLimit:
+        limit = self._limits.get(host)
+        if limit is None:
+            limit = self._limits[host] = AIMDLimit(host, **self.limit_options)
+        return limit
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """
+        Giữ một slot navigation cho host của `url`.
+        Exception có dấu hiệu rate limit (429, "rate"...) được tính là tín hiệu rate limit
+        """
+        limit = self.get_limit(self.host_of(url))
+        with trace_span("host_slot_wait", host=limit.host):
+            await limit.acquire()
+        slot = HostSlot(limit.host)
+        try:
+            yield slot
+        except Exception as e:
+            limit.release(time.monotonic() - slot.start,
+                          rate_limited=slot.rate_limited or _is_rate_limit_error(e), error=True)
+            raise
+        except BaseException:
+            # Cancel: không phải tín hiệu về host, chỉ trả slot
+            limit.abandon()
+            raise
+        else:
+            limit.release(time.monotonic() - slot.start, rate_limited=slot.rate_limited)
+
+    def record_rate_limit(self, url: str) -> None:
+        """Tín hiệu rate limit phát hiện sau navigation (checkpoint, nội dung lỗi...)"""
+        self.get_limit(self.host_of(url)).on_rate_limit()
+
+    def get_status(self) -> Dict[str, Dict]:
+        return {host: limit.get_status() for host, limit in self._limits.items()}
+
+
+# Global instance for use in other modules
+host_limiter = HostConcurrencyLimiter()
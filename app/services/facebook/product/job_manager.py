@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import uuid
+import asyncio
+import logging
+import tempfile
+import threading
+from array import array
+from contextlib import aclosing
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+
+from .scheduler import PRIORITY_BATCH
+from ....utils.fast_json import dumps_bytes, loads
+
+logger = logging.getLogger(__name__)
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+
+class ScrapeJob:
+    """
+    Một job scrape chạy nền; kết quả được append theo thứ tự hoàn thành.
+    Kết quả không giữ trong bộ nhớ: mỗi kết quả là một dòng NDJSON trong file spool của job,
+    bộ nhớ chỉ giữ offset (8 bytes) của từng dòng để đọc trang theo cursor.
+    Dòng mới nằm trong buffer (tối đa ~`flush_bytes`) rồi mới được ghi xuống file bằng
+    asyncio.to_thread; đọc trang cũng chạy trên thread -> không có IO file trên event loop.
+    """
+
+    def __init__(self, urls: List[str], mode: str = "simple", client_id: str = "default",
+                 budget: Optional[float] = None, window: Optional[int] = None, config: Any = None,
+                 spool_dir: Optional[str] = None, flush_bytes: int = 256 * 1024):
+        self.id = str(uuid.uuid4())
+        self.urls = urls
+        self.mode = mode
+        self.client_id = client_id
+        self.budget = budget
+        self.window = window
+        self.config = config  # cấu hình scraper truyền cho scraper_provider
+        self.status = JOB_QUEUED
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.spool_path = os.path.join(spool_dir or tempfile.gettempdir(), f"scrape_job_{self.id}.ndjson")
+        self.flush_bytes = flush_bytes
+        self._spool = None
+        self._offsets = array("q")  # offset bắt đầu của từng kết quả trong file spool
+        self._spool_size = 0        # tổng số byte kết quả (đã ghi + còn trong buffer)
+        self._written = 0           # số byte đã nằm trong file; buffer bắt đầu từ offset này
+        self._buffer = bytearray()
+        self._spool_lock = asyncio.Lock()      # flush và đọc trang không xen nhau
+        self._write_lock = threading.Lock()    # write bị cancel vẫn chạy nốt trên thread
+        self.successful = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def processed(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def needs_flush(self) -> bool:
+        return len(self._buffer) >= self.flush_bytes
+
+    def add_result(self, url: str, data: Dict[str, Any]) -> None:
+        """Append vào buffer (không IO); caller gọi `await flush()` khi needs_flush"""
+        line = dumps_bytes({"url": url, "data": data}) + b"\n"
+        self._buffer += line
+        self._offsets.append(self._spool_size)
+        self._spool_size += len(line)
+        if data.get("success", False):
+            self.successful += 1
+        else:
+            self.failed += 1
+        if data.get("from_cache", False):
+            self.cache_hits += 1
+
+    async def flush(self) -> None:
+        """Ghi buffer xuống file spool trên thread"""
+        async with self._spool_lock:
+            if not self._buffer:
+                return
+            data = bytes(self._buffer)
+            # Ghi theo offset tuyệt đối: bị cancel giữa chừng thì lần flush sau ghi lại đúng chỗ cũ
+            await asyncio.to_thread(self._write, self._written, data)
+            del self._buffer[:len(data)]  # trong lúc ghi, add_result chỉ append vào cuối buffer
+            self._written += len(data)
+
+    def _write(self, offset: int, data: bytes) -> None:
+        with self._write_lock:
+            if self._spool is None:
+                self._spool = open(self.spool_path, "r+b" if os.path.exists(self.spool_path) else "wb")
+            self._spool.seek(offset)
+            self._spool.write(data)
+            self._spool.flush()
+
+    async def read_results(self, start: int, end: int) -> List[Dict[str, Any]]:
+        """Kết quả [start, end): phần đã ghi đọc từ file spool (trên thread), phần còn lại từ buffer"""
+        end = min(end, self.processed)
+        if start >= end:
+            return []
+        begin = self._offsets[start]
+        stop = self._offsets[end] if end < self.processed else self._spool_size
+        async with self._spool_lock:
+            chunk = b""
+            if begin < self._written:
+                chunk = await asyncio.to_thread(_read_range, self.spool_path, begin, min(stop, self._written))
+            if stop > self._written:
+                chunk += self._buffer[max(begin, self._written) - self._written:stop - self._written]
+        return [loads(line) for line in chunk.splitlines()]
+
+    def close(self, remove: bool = False) -> None:
+        with self._write_lock:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+        if remove:
+            self._buffer.clear()
+            try:
+                os.remove(self.spool_path)
+            except OSError:
+                pass
+
+    def to_status(self) -> Dict[str, Any]:
+        total = len(self.urls)
+        elapsed = None
+        rate = None
+        eta = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            if elapsed > 0 and self.processed:
+                rate = self.processed / elapsed
+                if self.status == JOB_RUNNING:
+                    eta = (total - self.processed) / rate
+
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "mode": self.mode,
+            "client_id": self.client_id,
+            "total_urls": total,
+            "processed": self.processed,
+            "successful": self.successful,
+            "failed": self.failed,
+            "cache_hits": self.cache_hits,
+            "progress": self.processed / total if total else 1.0,
+            "urls_per_second": rate,
+            "eta_seconds": eta,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed": elapsed,
+            "error": self.error
+        }
+
+
+class ScrapeJobManager:
+    """
+    Job API cho batch lớn (hàng nghìn - hàng trăm nghìn URL):
+    - submit() trả về job ngay, job chạy nền qua scraper streaming (bounded window)
+    - Theo dõi progress qua get(job_id).to_status(), lấy kết quả theo cursor (offset) qua get_results()
+    - Giới hạn số job chạy cùng lúc; kết quả ghi ra file spool trong `spool_dir` (không giữ trong RAM)
+    - Job đã xong bị xóa (kèm file spool) sau `job_ttl` giây: kiểm tra mỗi lần đọc
+      và bởi task dọn dẹp định kỳ (chạy khi còn job)
+    """
+
+    def __init__(self, scraper_provider: Callable[[Any], Awaitable[Any]], max_running_jobs: int = 2,
+                 job_ttl: int = 6 * 3600, max_page_size: int = 1000, spool_dir: Optional[str] = None,
+                 cleanup_interval: float = 300.0):
+        self.scraper_provider = scraper_provider
+        self.max_running_jobs = max_running_jobs
+        self.job_ttl = job_ttl
+        self.max_page_size = max_page_size
+        self.spool_dir = spool_dir or os.getenv("FB_JOB_SPOOL_DIR") or os.path.join(tempfile.gettempdir(),
+                                                                                        "hypa_scrape_jobs")
+        self.cleanup_interval = cleanup_interval
+        self.jobs: Dict[str, ScrapeJob] = {}
+        self._semaphore = asyncio.Semaphore(max_running_jobs)
+        self._cleanup_task: Optional[asyncio.Task] = None
+
+    def submit(self, urls: List[str], mode: str = "simple", client_id: str = "default",
+               budget: Optional[float] = None, window: Optional[int] = None, config: Any = None) -> ScrapeJob:
+        self._cleanup_expired()
+        os.makedirs(self.spool_dir, exist_ok=True)
+        job = ScrapeJob(urls, mode=mode, client_id=client_id, budget=budget, window=window, config=config,
+                        spool_dir=self.spool_dir)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+        logger.info(f"Submitted scrape job {job.id} with {len(urls)} URLs (mode: {mode}, client: {client_id})")
+        return job
+
+    def get(self, job_id: str) -> Optional[ScrapeJob]:
+        self._cleanup_expired()
+        return self.jobs.get(job_id)
+
+    async def get_results(self, job_id: str, cursor: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """
+        Trả về một trang kết quả bắt đầu từ `cursor`.
+        next_cursor = None khi job đã xong và không còn kết quả nào phía sau.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+
+        cursor = max(0, cursor)
+        limit = max(1, min(limit, self.max_page_size))
+        page = await job.read_results(cursor, cursor + limit)
+        end = cursor + len(page)
+        finished = job.status in FINISHED_STATUSES
+        has_more = end < job.processed or not finished
+
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "cursor": cursor,
+            "next_cursor": end if has_more else None,
+            "count": len(page),
+            "processed": job.processed,
+            "total_urls": len(job.urls),
+            "results": page
+        }
+
+    async def cancel(self, job_id: str) -> Optional[ScrapeJob]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job.task and not job.task.done():
+            job.task.cancel()
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                pass
+        if job.status not in FINISHED_STATUSES:
+            # Task bị cancel trước khi kịp chạy
+            job.status = JOB_CANCELLED
+            job.finished_at = time.time()
+        return job
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        self._cleanup_expired()
+        return [job.to_status() for job in self.jobs.values()]
+
+    async def shutdown(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+        for job_id in list(self.jobs.keys()):
+            await self.cancel(job_id)
+        for job in self.jobs.values():
+            job.close(remove=True)
+        self.jobs.clear()
+
+    async def _run(self, job: ScrapeJob) -> None:
+        try:
+            async with self._semaphore:
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+                scraper = await self.scraper_provider(job.config)
+
+                results = scraper.get_multiple_metadata_streaming(job.urls, mode=job.mode, priority=PRIORITY_BATCH,
+                                                                  client_id=job.client_id, budget=job.budget,
+                                                                  window=job.window,
+                                                                  cache_ttl=getattr(job.config, "cache_ttl", None))
+                async with aclosing(results) as stream:
+                    async for item in stream:
+                        job.add_result(item["url"], item["data"])
+                        if job.needs_flush:
+                            await job.flush()
+
+                job.status = JOB_COMPLETED
+                logger.info(f"Scrape job {job.id} completed: {job.successful}/{len(job.urls)} successful")
+        except asyncio.CancelledError:
+            job.status = JOB_CANCELLED
+            logger.info(f"Scrape job {job.id} cancelled after {job.processed}/{len(job.urls)} URLs")
+            raise
+        except Exception as e:
+            logger.exception(f"Scrape job {job.id} failed")
+            job.status = JOB_FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            try:
+                await job.flush()
+            except Exception:
+                # Phần chưa ghi vẫn đọc được từ buffer
+                logger.exception(f"Failed to flush results of scrape job {job.id}")
+            job.close()
+
+    async def _cleanup_loop(self) -> None:
+        """Dọn job hết hạn định kỳ kể cả khi không có request nào; dừng khi không còn job"""
+        while self.jobs:
+            await asyncio.sleep(self.cleanup_interval)
+            self._cleanup_expired()
+
+    def _cleanup_expired(self) -> None:
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.status in FINISHED_STATUSES and job.finished_at
+                   and now - job.finished_at > self.job_ttl]
+        for job_id in expired:
+            self.jobs.pop(job_id).close(remove=True)
+        if expired:
+            logger.info(f"Removed {len(expired)} expired scrape jobs")
+
+
+def _read_range(path: str, begin: int, stop: int) -> bytes:
+    with open(path, "rb") as spool:
+        spool.seek(begin)
+        return spool.read(stop - begin)
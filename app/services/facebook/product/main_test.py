@@ -31,6 +31,6 @@ if __name__ == "__main__":
         }
         async with AsyncFacebookScraperStreaming(**conf) as s:
             async for item in s.get_multiple_metadata_streaming(urls):
-                print(json.dumps(item, indent=2, ensure_ascii=False))
+                print(json.dumps({"url": item["url"], "data": item["data"].to_dict()}, indent=2, ensure_ascii=False))
 
     asyncio.run(demo())
@@ -81,12 +81,29 @@ SINGLE_FLIGHT_COORDINATION_FAILURES = Counter(
     ['error_type']
 )
 
+FACEBOOK_SCHEDULER_REJECTIONS = Counter(
+    'facebook_scheduler_rejections_total',
+    'Total number of scrape requests rejected by the scheduler',
+    ['mode', 'reason']  # reason: 'admission', 'deadline'
+)
+
 # Gauge metrics
 FACEBOOK_QUEUE_SIZE = Gauge(
     'facebook_queue_size', 
     'Current number of jobs in scraping queue'
 )
 
+FACEBOOK_RATE_LIMITER_PERMITS_IN_USE = Gauge(
+    'facebook_rate_limiter_permits_in_use',
+    'Current number of rate limiter concurrency permits held'
+)
+
+FACEBOOK_HOST_CONCURRENCY_LIMIT = Gauge(
+    'facebook_host_concurrency_limit',
+    'Adaptive (AIMD) navigation concurrency limit per target host',
+    ['host']
+)
+
 FACEBOOK_ACTIVE_CONTEXTS = Gauge(
     'facebook_active_contexts', 
     'Current number of active browser contexts'
@@ -138,6 +155,13 @@ FACEBOOK_QUEUE_WAITING_DURATION = Histogram(
     buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0, float('inf')]
 )
 
+FACEBOOK_RATE_LIMIT_WAIT_DURATION = Histogram(
+    'facebook_rate_limit_wait_duration_seconds',
+    'Time spent waiting for a rate limiter token',
+    ['scope'],  # 'local', 'global'
+    buckets=[0.01, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, float('inf')]
+)
+
 FACEBOOK_WORKER_IDLE_DURATION = Histogram(
     'facebook_worker_idle_duration_seconds',
     'Time workers spend idle between tasks',
@@ -190,9 +214,18 @@ def increment_cache_eviction(cache_type: str):
 def increment_response_status(status_type: str, mode: str):
     FACEBOOK_RESPONSE_STATUS.labels(status_type=status_type, mode=mode).inc()
 
+def increment_scheduler_rejection(mode: str, reason: str):
+    FACEBOOK_SCHEDULER_REJECTIONS.labels(mode=mode, reason=reason).inc()
+
 def update_queue_size(size: int):
     FACEBOOK_QUEUE_SIZE.set(size)
 
+def update_permits_in_use(count: int):
+    FACEBOOK_RATE_LIMITER_PERMITS_IN_USE.set(count)
+
+def update_host_concurrency_limit(host: str, limit: float):
+    FACEBOOK_HOST_CONCURRENCY_LIMIT.labels(host=host).set(limit)
+
 def update_active_contexts(count: int):
     FACEBOOK_ACTIVE_CONTEXTS.set(count)
 
@@ -217,6 +250,9 @@ def observe_extraction_duration(duration: float, mode: str):
 def observe_queue_waiting_duration(duration: float, mode: str):
     FACEBOOK_QUEUE_WAITING_DURATION.labels(mode=mode).observe(duration)
 
+def observe_rate_limit_wait(duration: float, scope: str):
+    FACEBOOK_RATE_LIMIT_WAIT_DURATION.labels(scope=scope).observe(duration)
+
 def observe_worker_idle_duration(duration: float):
     FACEBOOK_WORKER_IDLE_DURATION.observe(duration)
 
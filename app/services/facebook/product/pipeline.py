@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+from typing import Iterable, Callable, Awaitable, AsyncGenerator, Set, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class BoundedTaskWindow:
+    """
+    Producer/consumer pipeline giữ tối đa `window` task chạy cùng lúc.
+
+    - Chỉ tạo task mới khi có task hoàn thành VÀ consumer đã lấy kết quả
+      (backpressure: consumer chậm thì không nạp thêm việc)
+    - Số task đang chạy theo dõi O(1) qua `in_flight`
+    - Khi generator bị đóng/cancel (client ngắt kết nối...), các task còn
+      đang chạy bị cancel và phần việc chưa bắt đầu bị bỏ qua
+    """
+
+    def __init__(self, worker: Callable[[T], Awaitable[R]], window: int = 10):
+        self.worker = worker
+        self.window = max(1, window)
+        self._tasks: Set[asyncio.Task] = set()
+        self.submitted = 0
+        self.completed = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def _fill(self, iterator) -> None:
+        while len(self._tasks) < self.window:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self._tasks.add(asyncio.create_task(self.worker(item)))
+            self.submitted += 1
+
+    async def stream(self, items: Iterable[T]) -> AsyncGenerator[R, None]:
+        """Yield kết quả theo thứ tự hoàn thành"""
+        iterator = iter(items)
+        try:
+            self._fill(iterator)
+            while self._tasks:
+                done, _ = await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    self._tasks.discard(task)
+                    self.completed += 1
+                    yield task.result()
+                    # Consumer đã lấy kết quả -> nạp thêm việc
+                    self._fill(iterator)
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks.clear()
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+import math
+import time
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# redis là optional: không có thì chỉ dùng sketch local
+try:
+    import redis.asyncio as redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis = None
+    REDIS_AVAILABLE = False
+
+
+class DDSketch:
+    """
+    Quantile sketch (DDSketch) cho giá trị không âm:
+    - Mỗi giá trị rơi vào bucket log-scale, sai số tương đối <= `relative_accuracy`
+    - add() O(1); số bucket chỉ phụ thuộc khoảng giá trị (không phụ thuộc số mẫu)
+    - Mergeable (cộng count theo bucket) -> gộp theo mode, theo thời gian, theo process qua Redis
+    - Danh sách key đã sort được cache tới khi có bucket mới/bucket bị xóa: quantile() không sort lại
+      mỗi lần gọi (bucket ổn định rất nhanh, add() sau đó chỉ tăng count)
+    """
+    __slots__ = ("relative_accuracy", "min_value", "_log_gamma", "bins", "zero_count", "count", "_sorted_keys")
+
+    def __init__(self, relative_accuracy: float = 0.02, min_value: float = 1e-6):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value  # giá trị nhỏ hơn được tính là 0
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self._sorted_keys: Optional[List[int]] = None
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        # Điểm giữa (theo sai số tương đối) của bucket (gamma^(k-1), gamma^k]
+        return 2.0 * math.exp(key * self._log_gamma) / (1.0 + math.exp(self._log_gamma))
+
+    def add(self, value: float, weight: int = 1) -> None:
+        if value <= self.min_value:
+            self.zero_count += weight
+        else:
+            key = self._key(value)
+            bins = self.bins
+            if key in bins:
+                bins[key] += weight
+            else:
+                bins[key] = weight
+                self._sorted_keys = None
+        self.count += weight
+
+    def merge(self, other: "DDSketch") -> None:
+        self._combine(other, 1)
+
+    def subtract(self, other: "DDSketch") -> None:
+        """Bỏ các mẫu của `other` (phải là một phần đã được merge vào sketch này)"""
+        self._combine(other, -1)
+
+    def _combine(self, other: "DDSketch", sign: int) -> None:
+        if other._log_gamma != self._log_gamma:
+            raise ValueError("Cannot combine sketches with different relative accuracy")
+        bins = self.bins
+        for key, count in other.bins.items():
+            current = bins.get(key)
+            updated = (current or 0) + sign * count
+            if updated > 0:
+                bins[key] = updated
+                if current is None:
+                    self._sorted_keys = None
+            elif current is not None:
+                del bins[key]
+                self._sorted_keys = None
+        self.zero_count = max(0, self.zero_count + sign * other.zero_count)
+        self.count = max(0, self.count + sign * other.count)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        keys = self._sorted_keys
+        if keys is None:
+            keys = self._sorted_keys = sorted(self.bins)
+        bins = self.bins
+        for key in keys:
+            seen += bins[key]
+            if rank < seen:
+                return self._value(key)
+        return self._value(keys[-1]) if keys else 0.0
+
+    def quantiles(self, qs: Iterable[float]) -> Dict[float, Optional[float]]:
+        return {q: self.quantile(q) for q in qs}
+
+    def copy(self) -> "DDSketch":
+        sketch = DDSketch(self.relative_accuracy, self.min_value)
+        sketch.merge(self)
+        return sketch
+
+    def to_counts(self) -> Dict[str, int]:
+        """Dạng {bucket: count} để lưu Redis hash ("z" = zero bucket)"""
+        counts = {str(key): count for key, count in self.bins.items()}
+        if self.zero_count:
+            counts["z"] = self.zero_count
+        return counts
+
+    @classmethod
+    def from_counts(cls, counts: Dict, relative_accuracy: float = 0.02,
+                    min_value: float = 1e-6) -> "DDSketch":
+        sketch = cls(relative_accuracy, min_value)
+        for key, count in counts.items():
+            if isinstance(key, bytes):
+                key = key.decode()
+            count = int(count)
+            if count <= 0:
+                continue
+            if key == "z":
+                sketch.zero_count += count
+            else:
+                sketch.bins[int(key)] = sketch.bins.get(int(key), 0) + count
+            sketch.count += count
+        return sketch
+
+
+class WindowedSketch:
+    """
+    Sketch của `window_seconds` giây gần nhất, chia thành `slices` lát thời gian.
+    Lát hết hạn bị trừ khỏi sketch tổng -> add() và quantile() không phụ thuộc số mẫu.
+    """
+
+    def __init__(self, window_seconds: float = 300.0, slices: int = 10, relative_accuracy: float = 0.02):
+        self.window_seconds = window_seconds
+        self.slices = slices
+        self.slice_seconds = window_seconds / slices
+        self.relative_accuracy = relative_accuracy
+        self._slices: deque = deque()  # (slice_id, DDSketch), cũ -> mới
+        self._total = DDSketch(relative_accuracy)
+
+    def slice_id(self, now: Optional[float] = None) -> int:
+        return int((now if now is not None else time.time()) // self.slice_seconds)
+
+    def _expire(self, current_id: int) -> None:
+        while self._slices and self._slices[0][0] <= current_id - self.slices:
+            _, expired = self._slices.popleft()
+            self._total.subtract(expired)
+
+    def add(self, value: float, now: Optional[float] = None) -> None:
+        current_id = self.slice_id(now)
+        self._expire(current_id)
+        if not self._slices or self._slices[-1][0] != current_id:
+            self._slices.append((current_id, DDSketch(self.relative_accuracy)))
+        self._slices[-1][1].add(value)
+        self._total.add(value)
+
+    def sketch(self, now: Optional[float] = None) -> DDSketch:
+        """Sketch tổng của cửa sổ hiện tại (không copy, không được sửa)"""
+        self._expire(self.slice_id(now))
+        return self._total
+
+    @property
+    def count(self) -> int:
+        return self.sketch().count
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.sketch().quantile(q)
+
+
+class RedisSketchStore:
+    """
+    Gộp sketch của mọi process qua Redis để scale theo percentile cả cluster:
+    - record() chỉ cộng vào sketch pending local (không I/O)
+    - flush() ghi pending bằng HINCRBY vào hash `{prefix}:{mode}:{slice_id}` (slice theo wall clock)
+    - fetch() đọc các slice còn trong cửa sổ của mọi mode và merge lại
+    """
+
+    def __init__(self, redis_url: str, key_prefix: str = "fb_scaler:queue_wait",
+                 window_seconds: float = 300.0, slices: int = 10, relative_accuracy: float = 0.02):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis package is not installed")
+        self._redis = redis.from_url(redis_url, decode_responses=True)
+        self.key_prefix = key_prefix
+        self.window_seconds = window_seconds
+        self.slices = slices
+        self.slice_seconds = window_seconds / slices
+        self.relative_accuracy = relative_accuracy
+        self.key_ttl = int(window_seconds + self.slice_seconds) + 60
+        self._pending: Dict[Tuple[str, int], DDSketch] = {}
+
+    @property
+    def modes_key(self) -> str:
+        return f"{self.key_prefix}:modes"
+
+    def _key(self, mode: str, slice_id: int) -> str:
+        return f"{self.key_prefix}:{mode}:{slice_id}"
+
+    def record(self, mode: str, value: float) -> None:
+        slice_id = int(time.time() // self.slice_seconds)
+        sketch = self._pending.get((mode, slice_id))
+        if sketch is None:
+            sketch = self._pending[(mode, slice_id)] = DDSketch(self.relative_accuracy)
+        sketch.add(value)
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        for (mode, slice_id), sketch in pending.items():
+            key = self._key(mode, slice_id)
+            for field, count in sketch.to_counts().items():
+                pipe.hincrby(key, field, count)
+            pipe.expire(key, self.key_ttl)
+            pipe.sadd(self.modes_key, mode)
+        pipe.expire(self.modes_key, self.key_ttl)
+        try:
+            await pipe.execute()
+        except Exception:
+            # Redis lỗi: giữ lại count để lần flush sau gửi tiếp (record() có thể đã thêm vào pending mới)
+            self._restore(pending)
+            raise
+
+    def _restore(self, pending: Dict[Tuple[str, int], DDSketch]) -> None:
+        # Slice đã ra khỏi cửa sổ thì bỏ: fetch() không đọc nữa, giữ lại chỉ tốn RAM khi Redis lỗi lâu
+        oldest_id = int(time.time() // self.slice_seconds) - self.slices + 1
+        for slice_key, sketch in pending.items():
+            if slice_key[1] < oldest_id:
+                continue
+            current = self._pending.get(slice_key)
+            if current is None:
+                self._pending[slice_key] = sketch
+            else:
+                current.merge(sketch)
+
+    async def fetch(self) -> Dict[str, DDSketch]:
+        modes = sorted(await self._redis.smembers(self.modes_key))
+        if not modes:
+            return {}
+        current_id = int(time.time() // self.slice_seconds)
+        slice_ids = range(current_id - self.slices + 1, current_id + 1)
+
+        pipe = self._redis.pipeline(transaction=False)
+        for mode in modes:
+            for slice_id in slice_ids:
+                pipe.hgetall(self._key(mode, slice_id))
+        rows = await pipe.execute()
+
+        sketches: Dict[str, DDSketch] = {}
+        index = 0
+        for mode in modes:
+            sketch = DDSketch(self.relative_accuracy)
+            for _ in slice_ids:
+                if rows[index]:
+                    sketch.merge(DDSketch.from_counts(rows[index], self.relative_accuracy))
+                index += 1
+            sketches[mode] = sketch
+        return sketches
+
+    async def close(self) -> None:
+        await self._redis.close()
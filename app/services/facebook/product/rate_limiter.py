@@ -1,100 +1,226 @@
 # -*- coding: utf-8 -*-
+import os
 import time
 import asyncio
 import logging
-from collections import deque
+from contextlib import asynccontextmanager
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
-from .metrics import increment_rate_limits
+from .metrics import increment_rate_limits, observe_rate_limit_wait, update_permits_in_use
+from .tracing import trace_span
+
+# redis là optional: không có thì chỉ dùng bucket local
+try:
+    import redis.asyncio as redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis = None
+    REDIS_AVAILABLE = False
+
+
+# Token bucket dùng chung cả cluster. Reservation: token có thể âm, trả về số giây
+# caller phải chờ (caller tự sleep, Redis không giữ lock nào trong lúc chờ).
+# requested âm = trả lại token của reservation bị hủy (không vượt capacity).
+# Trả về string vì Redis cắt số thực của Lua thành integer.
+GLOBAL_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+tokens = math.min(capacity, tokens - requested)
+local wait = 0
+if tokens < 0 then
+    wait = -tokens / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate + wait) + 60)
+return tostring(wait)
+"""
+
+
+class TokenBucket:
+    """
+    Token bucket local theo kiểu reservation:
+    - reserve() trừ token ngay (có thể âm) và trả về thời gian phải chờ
+    - Không lock, không sleep bên trong: người gọi sau luôn nhận thời điểm muộn hơn
+      người gọi trước -> FIFO công bằng
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate            # tokens / giây
+        self.capacity = capacity    # burst tối đa
+        self._tokens = capacity
+        self._last = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        self._refill(time.monotonic())
+        self._tokens -= tokens
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self, tokens: float = 1.0) -> None:
+        """Trả lại token của reservation bị hủy (waiter bị cancel)"""
+        self._refill(time.monotonic())
+        self._tokens = min(self.capacity, self._tokens + tokens)
+
+    @property
+    def available(self) -> float:
+        self._refill(time.monotonic())
+        return self._tokens
 
 
 class RateLimiter:
-    """Rate limiter with per-worker capability and burst support"""
+    """
+    Rate limiter = token bucket (requests/phút, burst) + đếm số request đang chạy.
+    Giới hạn concurrency thuộc về ScrapeScheduler (max_concurrent chỉ dùng làm capacity mặc định của nó).
 
-    def __init__(self, max_requests_per_minute: int = 30, max_concurrent: int = 6, burst_size: int = 5, burst_window: float = 1.0):
+    - Bucket local: fast path, không cần network
+    - Bucket Redis (Lua, tùy chọn): ngân sách chung cho cả cluster, N pod không gửi N lần rate
+    - Chờ token bên ngoài mọi lock; waiter được phục vụ theo thứ tự gọi
+    - Redis lỗi thì tự fallback về bucket local
+    """
+
+    def __init__(self, max_requests_per_minute: int = 30, max_concurrent: int = 6, burst_size: int = 5,
+                 burst_window: float = 1.0, redis_url: Optional[str] = None,
+                 global_requests_per_minute: Optional[int] = None, global_burst_size: Optional[int] = None,
+                 redis_key: str = "fb_rate_limit:global"):
         self.max_requests_per_minute = max_requests_per_minute
         self.max_concurrent = max_concurrent
         self.burst_size = burst_size  # Allow burst of N requests
-        self.burst_window = burst_window  # within this time window (seconds)
-        self._timestamps = deque()
-        self._semaphore = asyncio.Semaphore(max_concurrent)
-        self._lock = asyncio.Lock()  # For thread-safe timestamp operations
+        self.burst_window = burst_window  # giữ cho tương thích, bucket tự xử lý burst
+        self._bucket = TokenBucket(rate=max_requests_per_minute / 60.0, capacity=max(1, burst_size))
+        self._in_use = 0
 
-    async def acquire(self):
-        await self._semaphore.acquire()
-        async with self._lock:
-            now = time.time()
-            # Remove timestamps older than 1 minute
-            while self._timestamps and now - self._timestamps[0] > 60:
-                self._timestamps.popleft()
-            
-            # Check if we've reached the rate limit
-            if len(self._timestamps) >= self.max_requests_per_minute:
-                oldest = self._timestamps[0]
-                wait_time = 60 - (now - oldest)
-                if wait_time > 0:
-                    # Count this as a rate limit event
-                    increment_rate_limits()
-                    # Release semaphore temporarily while waiting
-                    self._semaphore.release()
-                    await asyncio.sleep(wait_time + 0.05)
-                    # Re-acquire semaphore after waiting
-                    await self._semaphore.acquire()
-                    # Update time after sleep
-                    now = time.time()
-            
-            # Add current timestamp
-            self._timestamps.append(now)
+        # Ngân sách cluster-wide (mặc định đọc từ env FB_GLOBAL_REQUESTS_PER_MINUTE)
+        if global_requests_per_minute is None:
+            env_rpm = os.getenv("FB_GLOBAL_REQUESTS_PER_MINUTE")
+            global_requests_per_minute = int(env_rpm) if env_rpm else None
+        self.global_requests_per_minute = global_requests_per_minute
+        self.global_burst_size = global_burst_size or burst_size
+        self.redis_key = redis_key
+        self._redis = None
+        self._global_bucket = None
+        if redis_url and global_requests_per_minute and REDIS_AVAILABLE:
+            self._redis = redis.from_url(redis_url, decode_responses=True)
+            self._global_bucket = self._redis.register_script(GLOBAL_BUCKET_SCRIPT)
+        self._global_error_logged = False
+        self._refund_tasks = set()
 
-    def release(self):
-        try:
-            self._semaphore.release()
-        except Exception:
-            pass  # Semaphore might already be released
+        self.stats = {
+            "acquired": 0,
+            "delayed": 0,
+            "total_wait": 0.0,
+            "global_fallbacks": 0
+        }
 
+    async def wait_for_token(self) -> float:
+        """Chờ tới lượt theo rate limit. Trả về thời gian đã chờ"""
+        local_wait = self._bucket.reserve()
+        global_wait = None
+        try:
+            global_wait = await self._reserve_global()
+            wait_time = max(local_wait, global_wait or 0.0)
+            if wait_time > 0:
+                increment_rate_limits()
+                self.stats["delayed"] += 1
+                await asyncio.sleep(wait_time)
+        except asyncio.CancelledError:
+            # Hủy giữa chừng: trả token để người sau không phải chờ thay.
+            # Bị hủy trong lúc gọi Redis thì không biết script đã chạy hay chưa -> chỉ trả token local
+            # (trả thiếu chỉ làm chậm cluster một chút, trả thừa thì vượt rate)
+            self._bucket.refund()
+            if global_wait is not None:
+                self._refund_global()
+            raise
+        observe_rate_limit_wait(local_wait, "local")
+        if global_wait is not None:
+            observe_rate_limit_wait(global_wait, "global")
 
-class PerWorkerRateLimiter:
-    """Rate limiter that can be used per worker with shared global limits"""
+        self.stats["acquired"] += 1
+        self.stats["total_wait"] += wait_time
+        return wait_time
 
-    def __init__(self, max_requests_per_minute: int = 30, max_concurrent: int = 6, burst_size: int = 5, burst_window: float = 1.0):
-        self.max_requests_per_minute = max_requests_per_minute
-        self.max_concurrent = max_concurrent
-        self.burst_size = burst_size
-        self.burst_window = burst_window
-        self._timestamps = deque()
-        self._semaphore = asyncio.Semaphore(max_concurrent)
-        self._lock = asyncio.Lock()  # For thread-safe timestamp operations
+    @asynccontextmanager
+    async def permit(self):
+        """
+        Một lần request tới Facebook: chờ token rồi tính là đang chạy trong khối `async with`.
+        Permit luôn được trả khi thoát khối (thành công, lỗi hay bị cancel)
+        """
+        with trace_span("rate_limit_wait"):
+            await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
 
     async def acquire(self):
-        await self._semaphore.acquire()
-        async with self._lock:
-            now = time.time()
-            # Remove timestamps older than 1 minute
-            while self._timestamps and now - self._timestamps[0] > 60:
-                self._timestamps.popleft()
-            
-            # Check if we've reached the rate limit
-            if len(self._timestamps) >= self.max_requests_per_minute:
-                oldest = self._timestamps[0]
-                wait_time = 60 - (now - oldest)
-                if wait_time > 0:
-                    # Count this as a rate limit event
-                    increment_rate_limits()
-                    # Release semaphore temporarily while waiting
-                    self._semaphore.release()
-                    await asyncio.sleep(wait_time + 0.05)
-                    # Re-acquire semaphore after waiting
-                    await self._semaphore.acquire()
-                    # Update time after sleep
-                    now = time.time()
-            
-            # Add current timestamp
-            self._timestamps.append(now)
+        await self.wait_for_token()
+        self._in_use += 1
+        update_permits_in_use(self._in_use)
 
     def release(self):
+        if self._in_use <= 0:
+            logger.warning("RateLimiter.release() called without a held permit")
+            return
+        self._in_use -= 1
+        update_permits_in_use(self._in_use)
+
+    @property
+    def permits_in_use(self) -> int:
+        return self._in_use
+
+    async def _reserve_global(self, tokens: float = 1.0) -> Optional[float]:
+        """Số giây phải chờ theo bucket Redis; None khi không dùng được bucket global (không reserve gì)"""
+        if self._global_bucket is None:
+            return None
         try:
-            self._semaphore.release()
-        except Exception:
-            pass  # Semaphore might already be released
\ No newline at end of file
+            wait = await self._global_bucket(
+                keys=[self.redis_key],
+                args=[self.global_requests_per_minute / 60.0, max(1, self.global_burst_size), tokens]
+            )
+            self._global_error_logged = False
+            return float(wait)
+        except Exception as e:
+            self.stats["global_fallbacks"] += 1
+            if not self._global_error_logged:
+                logger.warning(f"Global rate limit bucket unavailable, using local bucket only: {e}")
+                self._global_error_logged = True
+            return None
+
+    def _refund_global(self) -> None:
+        """Trả token Redis ở task nền: caller đang bị cancel, không bắt nó chờ thêm một round-trip"""
+        task = asyncio.create_task(self._reserve_global(-1.0))
+        self._refund_tasks.add(task)
+        task.add_done_callback(self._refund_tasks.discard)
+
+    def get_status(self) -> dict:
+        return {
+            "max_requests_per_minute": self.max_requests_per_minute,
+            "global_requests_per_minute": self.global_requests_per_minute,
+            "global_enabled": self._global_bucket is not None,
+            "max_concurrent": self.max_concurrent,
+            "permits_in_use": self._in_use,
+            "tokens_available": self._bucket.available,
+            **self.stats
+        }
+
+    async def close(self):
+        if self._redis:
+            await self._redis.close()
+
+
+class PerWorkerRateLimiter(RateLimiter):
+    """
+    Rate limiter riêng cho từng worker (bucket local riêng);
+    nếu cấu hình Redis thì các worker vẫn dùng chung ngân sách global
+    """
\ No newline at end of file
@@ -23,6 +23,7 @@ class RedisCache:
         )
 
     def _get_cache_key(self, url: str) -> str:
+        # url ở đây là canonical key (TaskEngine đã canonical hóa qua url_canonicalizer)
         return f"fb_scrape:{hashlib.md5(url.encode()).hexdigest()}"
 
     async def get(self, url: str):
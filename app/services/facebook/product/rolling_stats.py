@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import math
+from typing import List, Optional
+
+
+class EWMA:
+    """Exponentially Weighted Moving Average for anomaly detection"""
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self.value = None
+        self.initialized = False
+
+    def update(self, new_value: float) -> float:
+        if not self.initialized:
+            self.value = new_value
+            self.initialized = True
+        else:
+            self.value = self.alpha * new_value + (1 - self.alpha) * self.value
+        return self.value
+
+    def get_value(self) -> Optional[float]:
+        return self.value
+
+
+class RollingWindow:
+    """
+    Cửa sổ N giá trị gần nhất (ring buffer) với mean/variance cập nhật O(1):
+    Welford khi thêm, Welford ngược khi giá trị cũ nhất bị đẩy ra.
+    Tính lại chính xác sau mỗi `size` lần đẩy ra để sai số float không tích lũy.
+    """
+    __slots__ = ("size", "_values", "_next", "_count", "_mean", "_m2", "_evictions")
+
+    def __init__(self, size: int):
+        if size < 1:
+            raise ValueError("size must be >= 1")
+        self.size = size
+        self._values: List[float] = [0.0] * size
+        self._next = 0
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._evictions = 0
+
+    def add(self, value: float) -> None:
+        value = float(value)
+        if self._count == self.size:
+            self._remove(self._values[self._next])
+            self._evictions += 1
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.size
+
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+
+        if self._evictions >= self.size:
+            self._recompute()
+
+    def _remove(self, value: float) -> None:
+        if self._count <= 1:
+            self._count = 0
+            self._mean = 0.0
+            self._m2 = 0.0
+            return
+        self._count -= 1
+        delta = value - self._mean
+        self._mean -= delta / self._count
+        self._m2 = max(0.0, self._m2 - delta * (value - self._mean))
+
+    def _recompute(self) -> None:
+        values = self.values()
+        self._mean = sum(values) / len(values)
+        self._m2 = sum((v - self._mean) ** 2 for v in values)
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self._count else 0.0
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (n - 1), giống statistics.variance"""
+        return self._m2 / (self._count - 1) if self._count > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def last(self) -> Optional[float]:
+        if not self._count:
+            return None
+        return self._values[(self._next - 1) % self.size]
+
+    def values(self) -> List[float]:
+        """Các giá trị theo thứ tự cũ -> mới (O(n), chỉ dùng cho debug/status)"""
+        if self._count < self.size:
+            return self._values[:self._count]
+        return self._values[self._next:] + self._values[:self._next]
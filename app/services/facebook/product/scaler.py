@@ -1,10 +1,13 @@
 import time
 import asyncio
+import logging
 from typing import Dict, List, Optional, Callable
 from collections import deque, defaultdict
-import statistics
 
 from .metrics import FACEBOOK_QUEUE_WAITING_DURATION
+from .quantile_sketch import DDSketch, WindowedSketch, RedisSketchStore
+
+logger = logging.getLogger(__name__)
 
 
 class WorkerScaler:
@@ -23,9 +26,11 @@ class WorkerScaler:
                  scale_down_threshold: float = 0.2,  # P90 queue wait time in seconds to trigger scale down
                  queue_length_scale_up: int = 5,     # Lower threshold to trigger scale up faster
                  queue_length_scale_down: int = 2,   # Lower threshold to trigger scale down
-                 scaling_window: int = 50,           # Number of recent queue wait times to consider
+                 scaling_window: int = 50,           # Minimum wait samples (x 0.2) before scaling on percentiles
                  cooldown_period: int = 20,          # Reduced cooldown for more responsive scaling
-                 memory_threshold: float = 800.0):   # Memory threshold in MB to trigger worker restart
+                 memory_threshold: float = 800.0,    # Memory threshold in MB to trigger worker restart
+                 wait_window_seconds: float = 300.0, # Time window of the queue wait percentile sketches
+                 cluster_sync_interval: float = 5.0):  # Seconds between Redis sketch syncs
         
         self.min_workers = min_workers
         self.max_workers = max_workers
@@ -37,8 +42,20 @@ class WorkerScaler:
         self.cooldown_period = cooldown_period
         self.memory_threshold = memory_threshold
         
-        # Track queue wait times (now by mode)
-        self.queue_wait_times = defaultdict(lambda: deque(maxlen=scaling_window))
+        # Queue wait percentiles: DDSketch theo cửa sổ thời gian, theo mode + tổng
+        self.wait_window_seconds = wait_window_seconds
+        self.min_wait_samples = max(1, scaling_window // 5)
+        self.wait_sketches = defaultdict(lambda: WindowedSketch(wait_window_seconds))
+        self.wait_sketch_all = WindowedSketch(wait_window_seconds)
+        
+        # Cluster-wide percentiles (Redis), dùng thay sketch local khi còn mới
+        self.cluster_sync_interval = cluster_sync_interval
+        self.cluster_store: Optional[RedisSketchStore] = None
+        self.cluster_sketches: Dict[str, DDSketch] = {}
+        self.cluster_sketch_all: Optional[DDSketch] = None
+        self.cluster_synced_at = 0.0
+        self._cluster_task: Optional[asyncio.Task] = None
+        self._cluster_users = 0
         
         # Track queue lengths by mode
         self.queue_lengths = defaultdict(int)
@@ -65,8 +82,100 @@ class WorkerScaler:
         """
         Add a queue wait time measurement
         """
-        self.queue_wait_times[mode].append((time.time(), wait_time, mode))
+        self.wait_sketches[mode].add(wait_time)
+        self.wait_sketch_all.add(wait_time)
+        if self.cluster_store:
+            self.cluster_store.record(mode, wait_time)
         
+    def _cluster_fresh(self) -> bool:
+        return (self.cluster_sketch_all is not None and
+                time.time() - self.cluster_synced_at < self.cluster_sync_interval * 3)
+    
+    def _wait_sketch(self) -> DDSketch:
+        """Sketch dùng cho quyết định scale: cả cluster nếu vừa sync, không thì của process này"""
+        if self._cluster_fresh():
+            return self.cluster_sketch_all
+        return self.wait_sketch_all.sketch()
+    
+    @staticmethod
+    def _percentiles(sketch: DDSketch) -> Dict:
+        return {
+            'p50': sketch.quantile(0.5) or 0.0,
+            'p90': sketch.quantile(0.9) or 0.0,
+            'p99': sketch.quantile(0.99) or 0.0,
+            'count': sketch.count
+        }
+    
+    def get_wait_percentiles(self) -> Dict:
+        """P50/P90/P99 queue wait time trong cửa sổ hiện tại"""
+        percentiles = self._percentiles(self._wait_sketch())
+        percentiles['source'] = 'cluster' if self._cluster_fresh() else 'local'
+        return percentiles
+    
+    def get_wait_percentiles_by_mode(self) -> Dict[str, Dict]:
+        if self._cluster_fresh():
+            sketches = self.cluster_sketches
+        else:
+            sketches = {mode: windowed.sketch() for mode, windowed in self.wait_sketches.items()}
+        return {mode: self._percentiles(sketch) for mode, sketch in sketches.items()}
+    
+    def start_cluster_sync(self, redis_url: str) -> None:
+        """
+        Bật đồng bộ sketch qua Redis (gọi bởi mỗi scraper có redis_url, chạy một task duy nhất).
+        Mỗi lần gọi phải đi kèm một lần stop_cluster_sync()
+        """
+        self._cluster_users += 1
+        if self._cluster_task and not self._cluster_task.done():
+            return
+        try:
+            self.cluster_store = RedisSketchStore(redis_url, window_seconds=self.wait_window_seconds)
+        except Exception as e:
+            logger.warning(f"Cluster queue wait percentiles disabled: {e}")
+            return
+        self._cluster_task = asyncio.create_task(self._cluster_sync_loop())
+    
+    async def stop_cluster_sync(self) -> None:
+        self._cluster_users = max(0, self._cluster_users - 1)
+        if self._cluster_users:
+            return
+        if self._cluster_task:
+            self._cluster_task.cancel()
+            try:
+                await self._cluster_task
+            except asyncio.CancelledError:
+                pass
+            self._cluster_task = None
+        if self.cluster_store:
+            await self.cluster_store.close()
+            self.cluster_store = None
+        self.cluster_sketch_all = None
+    
+    async def sync_cluster(self) -> None:
+        """Đẩy sketch pending của process này lên Redis rồi đọc lại sketch cả cluster"""
+        await self.cluster_store.flush()
+        sketches = await self.cluster_store.fetch()
+        merged = DDSketch()
+        for sketch in sketches.values():
+            merged.merge(sketch)
+        self.cluster_sketches = sketches
+        self.cluster_sketch_all = merged
+        self.cluster_synced_at = time.time()
+    
+    async def _cluster_sync_loop(self) -> None:
+        error_logged = False
+        while True:
+            try:
+                await self.sync_cluster()
+                error_logged = False
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Redis lỗi: _cluster_fresh() hết hạn và scaler tự quay về sketch local
+                if not error_logged:
+                    logger.warning(f"Queue wait sketch sync failed, using local percentiles: {e}")
+                    error_logged = True
+            await asyncio.sleep(self.cluster_sync_interval)
+    
     def update_queue_length(self, length: int, mode: str = "simple") -> None:
         """
         Update queue length for a specific mode
@@ -83,16 +192,11 @@ class WorkerScaler:
         """
         Check if we should scale up based on P90 queue wait time
         """
-        # Combine wait times from all modes
-        all_wait_times = []
-        for mode_wait_times in self.queue_wait_times.values():
-            all_wait_times.extend([wait_time for _, wait_time, _ in list(mode_wait_times)[-self.scaling_window:]])
-        
-        if len(all_wait_times) < 10:  # Need minimum data points
+        sketch = self._wait_sketch()
+        if sketch.count < self.min_wait_samples:  # Need minimum data points
             return False
         
-        # Calculate P90
-        p90_wait = self._calculate_percentile(all_wait_times, 90)
+        p90_wait = sketch.quantile(0.9)
         
         # Apply hysteresis logic
         if p90_wait > self.scale_up_threshold:
@@ -121,16 +225,11 @@ class WorkerScaler:
         """
         Check if we should scale down based on P90 queue wait time
         """
-        # Combine wait times from all modes
-        all_wait_times = []
-        for mode_wait_times in self.queue_wait_times.values():
-            all_wait_times.extend([wait_time for _, wait_time, _ in list(mode_wait_times)[-self.scaling_window:]])
-        
-        if len(all_wait_times) < 10:  # Need minimum data points
+        sketch = self._wait_sketch()
+        if sketch.count < self.min_wait_samples:  # Need minimum data points
             return False
         
-        # Calculate P90
-        p90_wait = self._calculate_percentile(all_wait_times, 90)
+        p90_wait = sketch.quantile(0.9)
         
         # Apply hysteresis logic
         if p90_wait < self.scale_down_threshold:
@@ -257,14 +356,11 @@ class WorkerScaler:
         """
         Get the suggested worker count based on current metrics
         """
-        all_wait_times = []
-        for mode_wait_times in self.queue_wait_times.values():
-            all_wait_times.extend([wait_time for _, wait_time, _ in list(mode_wait_times)[-self.scaling_window:]])
-        
-        if not all_wait_times:
+        sketch = self._wait_sketch()
+        if not sketch.count:
             return self.current_workers
         
-        p90_wait = self._calculate_percentile(all_wait_times, 90)
+        p90_wait = sketch.quantile(0.9)
         total_queue_length = sum(self.queue_lengths.values())
         
         # Determine scaling factor based on both wait time and queue length
@@ -286,16 +382,9 @@ class WorkerScaler:
         """
         Get current scaling status
         """
-        all_wait_times = []
-        for mode_wait_times in self.queue_wait_times.values():
-            all_wait_times.extend([wait_time for _, wait_time, _ in list(mode_wait_times)[-self.scaling_window:]])
-        
-        if all_wait_times:
-            p90_wait = self._calculate_percentile(all_wait_times, 90)
-            p50_wait = self._calculate_percentile(all_wait_times, 50)
-        else:
-            p90_wait = 0
-            p50_wait = 0
+        percentiles = self.get_wait_percentiles()
+        p90_wait = percentiles['p90']
+        p50_wait = percentiles['p50']
         
         total_queue_length = sum(self.queue_lengths.values())
         
@@ -304,6 +393,10 @@ class WorkerScaler:
             'suggested_workers': self.get_suggested_worker_count(),
             'p90_queue_wait_time': p90_wait,
             'p50_queue_wait_time': p50_wait,
+            'p99_queue_wait_time': percentiles['p99'],
+            'queue_wait_samples': percentiles['count'],
+            'queue_wait_source': percentiles['source'],
+            'queue_wait_by_mode': self.get_wait_percentiles_by_mode(),
             'total_queue_length': total_queue_length,
             'queue_lengths_by_mode': dict(self.queue_lengths),
             'should_scale_up': self.should_scale_up(),
@@ -319,25 +412,6 @@ class WorkerScaler:
             'high_memory_workers': [worker_id for worker_id, memory in self.memory_usage.items() 
                                     if memory > self.memory_threshold]
         }
-    
-    def _calculate_percentile(self, data: List[float], percentile: float) -> float:
-        """
-        Calculate percentile of a data list
-        """
-        if not data:
-            return 0.0
-        
-        sorted_data = sorted(data)
-        index = (percentile / 100) * (len(sorted_data) - 1)
-        lower_index = int(index)
-        upper_index = min(lower_index + 1, len(sorted_data) - 1)
-        
-        if lower_index == upper_index:
-            return sorted_data[lower_index]
-        
-        # Interpolate between the two values
-        fraction = index - lower_index
-        return sorted_data[lower_index] + fraction * (sorted_data[upper_index] - sorted_data[lower_index])
 
 
 # Global instance for use in other modules
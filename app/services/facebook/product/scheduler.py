@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from contextlib import asynccontextmanager
+from collections import defaultdict
+from typing import Optional, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+from .metrics import (
+    update_queue_size, observe_queue_waiting_duration, increment_scheduler_rejection
+)
+from .scaler import scaler
+
+
+# Priority classes (số nhỏ hơn = ưu tiên cao hơn)
+PRIORITY_INTERACTIVE = 0  # single-URL request, người dùng đang chờ
+PRIORITY_NORMAL = 1
+PRIORITY_BATCH = 2        # batch/streaming/job lớn
+
+# Trọng số chia sẻ slot giữa các mode (simple rẻ nhất nên được nhiều slot hơn)
+DEFAULT_MODE_WEIGHTS = {"simple": 3.0, "full": 2.0, "super": 1.0}
+
+
+class SchedulerRejectedError(Exception):
+    """Raised when admission control rejects a request (estimated wait > budget)"""
+
+    def __init__(self, estimated_wait: float, budget: float):
+        self.estimated_wait = estimated_wait
+        self.budget = budget
+        super().__init__(f"Estimated queue wait {estimated_wait:.1f}s exceeds budget {budget:.1f}s")
+
+
+class SchedulerDeadlineError(SchedulerRejectedError):
+    """Raised when a queued request reaches its deadline before getting a slot"""
+
+    def __init__(self, waited: float, budget: float):
+        super().__init__(waited, budget)
+        self.args = (f"Deadline exceeded after waiting {waited:.1f}s in queue",)
+
+
+class ScrapeTicket:
+    """Một request đang chờ (hoặc đang giữ) slot scrape"""
+    __slots__ = ("mode", "client_id", "priority", "deadline", "enqueue_time",
+                 "dispatch_time", "future")
+
+    def __init__(self, mode: str, client_id: str, priority: int, deadline: Optional[float]):
+        self.mode = mode
+        self.client_id = client_id
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueue_time = time.time()
+        self.dispatch_time = None
+        self.future: Optional[asyncio.Future] = None
+
+    def get_waiting_time(self) -> float:
+        end = self.dispatch_time or time.time()
+        return end - self.enqueue_time
+
+
+class ScrapeScheduler:
+    """
+    Scheduler cho các lần scrape thật (cache hit không đi qua đây):
+    - Mỗi mode một priority queue (heapq), key = (priority, virtual finish, seq)
+    - Trong một mode: start-time fair queuing giữa các API client, client gửi
+      batch 2000 URL không chặn client khác
+    - Giữa các mode: stride scheduling theo DEFAULT_MODE_WEIGHTS
+    - Priority class được ưu tiên tuyệt đối (interactive trước batch)
+    - Deadline + admission control: từ chối sớm khi ước tính thời gian chờ vượt budget
+    """
+
+    def __init__(self, max_concurrent: int = 6, mode_weights: Optional[Dict[str, float]] = None,
+                 default_service_time: float = 3.0, service_time_alpha: float = 0.2):
+        self.max_concurrent = max_concurrent
+        self.mode_weights = dict(mode_weights or DEFAULT_MODE_WEIGHTS)
+        self.default_service_time = default_service_time
+        self.service_time_alpha = service_time_alpha
+
+        self._queues: Dict[str, list] = defaultdict(list)        # mode -> heap
+        self._mode_pass: Dict[str, float] = defaultdict(float)    # stride pass theo mode
+        self._global_pass = 0.0
+        self._mode_vtime: Dict[str, float] = defaultdict(float)   # virtual time theo mode
+        self._client_finish: Dict[Tuple[str, str], float] = {}    # (mode, client) -> virtual finish
+        self._client_queued: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._queued_by_mode: Dict[str, int] = defaultdict(int)
+        self._queued_by_priority: Dict[int, int] = defaultdict(int)
+        self._service_time: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._in_use = 0
+
+        self.stats = {
+            "admitted": 0,
+            "rejected": 0,
+            "deadline_exceeded": 0,
+            "dispatched": 0
+        }
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    @asynccontextmanager
+    async def slot(self, mode: str = "simple", client_id: str = "default",
+                   priority: int = PRIORITY_NORMAL, budget: Optional[float] = None):
+        """Giữ một slot scrape trong suốt khối `async with`"""
+        ticket = await self.acquire(mode, client_id, priority, budget)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    async def acquire(self, mode: str = "simple", client_id: str = "default",
+                      priority: int = PRIORITY_NORMAL, budget: Optional[float] = None) -> ScrapeTicket:
+        deadline = None
+        if budget is not None:
+            estimated_wait = self.estimate_wait(priority, mode)
+            if estimated_wait > budget:
+                self.stats["rejected"] += 1
+                increment_scheduler_rejection(mode, "admission")
+                raise SchedulerRejectedError(estimated_wait, budget)
+            deadline = time.time() + budget
+
+        ticket = ScrapeTicket(mode, client_id or "default", priority, deadline)
+        self.stats["admitted"] += 1
+
+        # Fast path: còn slot và không ai đang chờ
+        if self._in_use < self.max_concurrent and not self.total_queued():
+            self._start(ticket)
+            return ticket
+
+        ticket.future = asyncio.get_running_loop().create_future()
+        self._enqueue(ticket)
+
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        try:
+            await asyncio.wait_for(ticket.future, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if ticket.dispatch_time is not None:
+                # Slot đã được cấp đúng lúc timeout/cancel -> trả lại
+                self.release(ticket)
+            else:
+                self._forget(ticket)
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["deadline_exceeded"] += 1
+                increment_scheduler_rejection(mode, "deadline")
+                raise SchedulerDeadlineError(ticket.get_waiting_time(), budget or 0.0) from None
+            raise
+        return ticket
+
+    def release(self, ticket: ScrapeTicket) -> None:
+        if ticket.dispatch_time is None:
+            return
+        service_time = time.time() - ticket.dispatch_time
+        previous = self._service_time.get(ticket.mode, self.default_service_time)
+        self._service_time[ticket.mode] = (self.service_time_alpha * service_time
+                                           + (1 - self.service_time_alpha) * previous)
+        ticket.dispatch_time = None
+        self._in_use = max(0, self._in_use - 1)
+        self._dispatch()
+
+    def estimate_wait(self, priority: int = PRIORITY_NORMAL, mode: str = "simple") -> float:
+        """Ước tính thời gian chờ slot cho request mới (giây)"""
+        ahead = sum(count for p, count in self._queued_by_priority.items() if p <= priority)
+        if ahead == 0 and self._in_use < self.max_concurrent:
+            return 0.0
+        service_time = self._service_time.get(mode, self.default_service_time)
+        return (ahead + 1) * service_time / max(1, self.max_concurrent)
+
+    def total_queued(self) -> int:
+        return sum(self._queued_by_mode.values())
+
+    def get_queue_sizes(self) -> Dict[str, int]:
+        return dict(self._queued_by_mode)
+
+    def get_status(self) -> Dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_use": self._in_use,
+            "queue_sizes_by_mode": self.get_queue_sizes(),
+            "queue_sizes_by_priority": dict(self._queued_by_priority),
+            "total_queue_size": self.total_queued(),
+            "active_clients": len(self._client_finish),
+            "service_time_by_mode": dict(self._service_time),
+            "mode_weights": dict(self.mode_weights),
+            **self.stats
+        }
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+    def _enqueue(self, ticket: ScrapeTicket) -> None:
+        mode, client_key = ticket.mode, (ticket.mode, ticket.client_id)
+
+        # Start-time fair queuing giữa các client trong cùng mode
+        start = max(self._mode_vtime[mode], self._client_finish.get(client_key, 0.0))
+        finish = start + 1.0
+        self._client_finish[client_key] = finish
+        self._client_queued[client_key] += 1
+
+        if not self._queued_by_mode[mode]:
+            # Mode vừa active lại: không cho "dồn" pass cũ để burst
+            self._mode_pass[mode] = max(self._mode_pass[mode], self._global_pass)
+
+        heapq.heappush(self._queues[mode], (ticket.priority, finish, next(self._seq), ticket))
+        self._queued_by_mode[mode] += 1
+        self._queued_by_priority[ticket.priority] += 1
+        self._update_queue_metrics(mode)
+
+    def _forget(self, ticket: ScrapeTicket) -> None:
+        """Bỏ ticket khỏi bộ đếm (heap dọn lazy khi dispatch)"""
+        self._decrement_counts(ticket)
+        self._update_queue_metrics(ticket.mode)
+
+    def _decrement_counts(self, ticket: ScrapeTicket) -> None:
+        mode, client_key = ticket.mode, (ticket.mode, ticket.client_id)
+        self._queued_by_mode[mode] -= 1
+        self._queued_by_priority[ticket.priority] -= 1
+        if self._queued_by_priority[ticket.priority] <= 0:
+            del self._queued_by_priority[ticket.priority]
+        self._client_queued[client_key] -= 1
+        if self._client_queued[client_key] <= 0:
+            del self._client_queued[client_key]
+            self._client_finish.pop(client_key, None)
+
+    def _peek(self, mode: str) -> Optional[tuple]:
+        heap = self._queues[mode]
+        # Lazy deletion: bỏ ticket đã timeout/cancel
+        while heap and heap[0][3].future.done():
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _select_mode(self) -> Optional[str]:
+        best_mode, best_key = None, None
+        for mode in list(self._queues.keys()):
+            head = self._peek(mode)
+            if head is None:
+                continue
+            key = (head[0], self._mode_pass[mode])
+            if best_key is None or key < best_key:
+                best_mode, best_key = mode, key
+        return best_mode
+
+    def _dispatch(self) -> None:
+        while self._in_use < self.max_concurrent:
+            mode = self._select_mode()
+            if mode is None:
+                return
+            _, finish, _, ticket = heapq.heappop(self._queues[mode])
+            self._decrement_counts(ticket)
+
+            self._mode_vtime[mode] = max(self._mode_vtime[mode], finish - 1.0)
+            self._global_pass = self._mode_pass[mode]
+            self._mode_pass[mode] += 1.0 / self.mode_weights.get(mode, 1.0)
+
+            self._start(ticket)
+            ticket.future.set_result(True)
+            self._update_queue_metrics(mode)
+
+    def _start(self, ticket: ScrapeTicket) -> None:
+        ticket.dispatch_time = time.time()
+        self._in_use += 1
+        self.stats["dispatched"] += 1
+
+        waiting_time = ticket.get_waiting_time()
+        observe_queue_waiting_duration(waiting_time, ticket.mode)
+        scaler.add_queue_wait_time(waiting_time, ticket.mode)
+
+    def _update_queue_metrics(self, mode: str) -> None:
+        scaler.update_queue_length(self._queued_by_mode[mode], mode)
+        update_queue_size(self.total_queued())
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import time
+from dataclasses import dataclass, field, replace
+from typing import Optional, Dict, Any, Iterator
+
+
+# Field luôn có mặt trong dict output; các field còn lại chỉ xuất hiện khi khác None
+_CORE_FIELDS = ("url", "success", "from_cache", "scrape_time")
+_OPTIONAL_FIELDS = ("final_url", "navigation_time", "extraction_time", "timestamp", "error", "error_type",
+                    "timings")
+_KNOWN_FIELDS = frozenset(_CORE_FIELDS + _OPTIONAL_FIELDS)
+
+
+@dataclass(frozen=True, slots=True)
+class ScrapeResult:
+    """
+    Kết quả scrape một URL (immutable, __slots__).
+
+    - Dữ liệu trích xuất (title, description, og_data...) nằm trong `data`
+    - to_dict() dựng dict phẳng (shape cũ của API) một lần, lazy, rồi cache lại;
+      encoder JSON gọi to_dict() -> chỉ serialize tại một điểm
+    - Đọc như dict (get, [], in) để các layer không phải copy
+    - Bản cache hit tạo bằng as_cached() (dataclasses.replace), không copy dữ liệu
+    - `timings` (trace theo giai đoạn) chỉ có khi client yêu cầu, không bao giờ được cache
+    """
+    url: str
+    success: bool = False
+    from_cache: bool = False
+    scrape_time: float = 0.0
+    final_url: Optional[str] = None
+    navigation_time: Optional[float] = None
+    extraction_time: Optional[float] = None
+    timestamp: Optional[float] = None
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+    timings: Optional[Dict[str, Any]] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    _dict: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+
+    # ------------------------------------------------------------------
+    # Constructors
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_scrape(cls, fetch_result: Dict[str, Any], extracted: Dict[str, Any],
+                    scrape_time: float) -> "ScrapeResult":
+        """Gộp kết quả fetch + extract (extract ghi đè fetch như {**fetch, **extract} trước đây)"""
+        extracted = dict(extracted)
+        url = extracted.pop("url", None) or fetch_result.get("url")
+        extraction_time = extracted.pop("extraction_time", None)
+        return cls(
+            url=url,
+            success=True,
+            scrape_time=scrape_time,
+            final_url=fetch_result.get("final_url"),
+            navigation_time=fetch_result.get("navigation_time"),
+            extraction_time=extraction_time,
+            timestamp=fetch_result.get("timestamp", time.time()),
+            data=extracted
+        )
+
+    @classmethod
+    def failure(cls, url: str, error: str, error_type: Optional[str] = None, **extra) -> "ScrapeResult":
+        return cls(url=url, success=False, error=error, error_type=error_type,
+                   timestamp=time.time(), data=extra)
+
+    @classmethod
+    def from_dict(cls, value: Dict[str, Any]) -> "ScrapeResult":
+        """Dựng lại từ dict phẳng (Redis cache, Redis pub/sub)"""
+        known = {k: value[k] for k in _KNOWN_FIELDS if k in value}
+        extra = {k: v for k, v in value.items() if k not in _KNOWN_FIELDS}
+        known.setdefault("url", "")
+        return cls(data=extra, **known)
+
+    @classmethod
+    def coerce(cls, value: Any) -> "ScrapeResult":
+        if isinstance(value, cls):
+            return value
+        return cls.from_dict(value or {})
+
+    # ------------------------------------------------------------------
+    # Views
+    # ------------------------------------------------------------------
+    def as_cached(self) -> "ScrapeResult":
+        return self if self.from_cache else replace(self, from_cache=True)
+
+    def with_timings(self, timings: Dict[str, Any]) -> "ScrapeResult":
+        return replace(self, timings=timings)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dict phẳng (được cache, không được sửa)"""
+        cached = self._dict
+        if cached is None:
+            cached = {name: getattr(self, name) for name in _CORE_FIELDS}
+            for name in _OPTIONAL_FIELDS:
+                value = getattr(self, name)
+                if value is not None:
+                    cached[name] = value
+            for key, value in self.data.items():
+                cached.setdefault(key, value)
+            object.__setattr__(self, "_dict", cached)
+        return cached
+
+    # Read-only mapping interface (tương thích code cũ dùng result.get(...))
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.to_dict().get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.to_dict()[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.to_dict()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
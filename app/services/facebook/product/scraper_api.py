@@ -35,7 +35,8 @@ class FacebookScraperAPI:
             if scraper.task_engine and scraper.task_engine.rate_limiter:
                 scraper.task_engine.rate_limiter = PerWorkerRateLimiter(
                     max_requests_per_minute=self.scraper_config.get('max_requests_per_minute', 30),
-                    max_concurrent=self.scraper_config.get('max_concurrent', 6)
+                    max_concurrent=self.scraper_config.get('max_concurrent', 6),
+                    redis_url=self.scraper_config.get('redis_url')
                 )
                 
             while True:
@@ -52,7 +53,7 @@ class FacebookScraperAPI:
                 try:
                     results = {}
                     # Use the new batch_size parameter for more efficient processing and pass mode
-                    async for item in scraper.get_multiple_metadata_streaming(urls, mode=mode, batch_size=25):
+                    async for item in scraper.get_multiple_metadata_streaming(urls, mode=mode, window=25):
                         results[item['url']] = item['data']
                     self.active_jobs[job_id]['status'] = 'completed'
                     self.active_jobs[job_id]['results'] = results
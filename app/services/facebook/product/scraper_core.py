@@ -10,6 +10,7 @@ from typing import Optional, Dict, Any, List, AsyncGenerator, Tuple
 from playwright.async_api import async_playwright, Browser, Page, BrowserContext
 import redis.asyncio as redis
 from collections import deque
+from contextlib import aclosing
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,8 @@ from .extractor import DataExtractor
 from .task_engine import TaskEngine
 from .metrics import update_browser_memory
 from .anomaly_detector import anomaly_detector
+from .scheduler import ScrapeScheduler, PRIORITY_NORMAL, PRIORITY_BATCH
+from .scaler import scaler
 
 
 class AsyncFacebookScraperStreaming:
@@ -34,13 +37,16 @@ class AsyncFacebookScraperStreaming:
                  use_browser_pool: bool = True,
                  max_pages_per_context: int = 5,
                  max_contexts: int = 5,
-                 context_reuse_limit: int = 250):  # Increased from 20 to 250
+                 context_reuse_limit: int = 250,  # Increased from 20 to 250
+                 scheduler: Optional[ScrapeScheduler] = None,  # dùng chung giữa nhiều scraper nếu truyền vào
+                 rate_limiter: Optional[RateLimiter] = None):  # như scheduler: truyền vào thì không tự đóng
         self.mode = mode
         self.headless = headless
         self.max_concurrent = max_concurrent
         self.cache_ttl = cache_ttl
         self.enable_images = enable_images
         self.use_browser_pool = use_browser_pool
+        self.redis_url = redis_url
 
         # caches
         self.redis_cache = RedisCache(redis_url, cache_ttl) if redis_url else None
@@ -52,13 +58,18 @@ class AsyncFacebookScraperStreaming:
 
         # Create components for the new architecture
         self.fetcher = PageFetcher(self.browser_pool) if self.browser_pool else None
+        self._owns_rate_limiter = rate_limiter is None
+        if rate_limiter is None:
+            # redis_url + FB_GLOBAL_REQUESTS_PER_MINUTE: ngân sách request chung cho cả cluster
+            rate_limiter = RateLimiter(max_requests_per_minute=30, max_concurrent=max_concurrent, redis_url=redis_url)
         self.extractor = DataExtractor(mode=mode)
         self.task_engine = TaskEngine(
             fetcher=self.fetcher,
             extractor=self.extractor,
             redis_cache=self.redis_cache,
-            rate_limiter=RateLimiter(max_requests_per_minute=30, max_concurrent=max_concurrent),
-            cache_ttl=cache_ttl
+            rate_limiter=rate_limiter,
+            cache_ttl=cache_ttl,
+            scheduler=scheduler
         ) if self.fetcher and self.extractor else None
 
         # stats - now delegate to task engine
@@ -75,6 +86,9 @@ class AsyncFacebookScraperStreaming:
             await self.browser_pool.initialize()
         if self.redis_cache:
             await self.redis_cache.connect()
+        if self.redis_url:
+            # Percentile queue wait cả cluster cho scaler
+            scaler.start_cluster_sync(self.redis_url)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -82,6 +96,10 @@ class AsyncFacebookScraperStreaming:
             await self.browser_pool.close()
         if self.redis_cache:
             await self.redis_cache.close()
+        if self.task_engine and self.task_engine.rate_limiter and self._owns_rate_limiter:
+            await self.task_engine.rate_limiter.close()
+        if self.redis_url:
+            await scaler.stop_cluster_sync()
         logger.info(f"Scraper stats: {self.stats}")
 
     def _get_optimized_browser_args(self) -> List[str]:
@@ -98,44 +116,54 @@ class AsyncFacebookScraperStreaming:
             args.extend(['--blink-settings=imagesEnabled=false', '--disable-images'])
         return args
 
-    async def get_facebook_metadata(self, url: str, mode: str = None) -> Dict[str, Any]:
-        """Public method with layered cache and rate limiting - now uses new architecture"""
+    async def get_facebook_metadata(self, url: str, mode: str = None, priority: int = PRIORITY_NORMAL,
+                                    client_id: str = "default", budget: Optional[float] = None,
+                                    cache_ttl: Optional[int] = None, trace: bool = False) -> Dict[str, Any]:
+        """
+        Public method with layered cache and rate limiting - now uses new architecture
+        mode/cache_ttl áp dụng cho riêng lần gọi này, mặc định lấy theo instance
+        trace=True: kết quả có thêm key `timings` (thời gian từng giai đoạn)
+        """
         if not self.task_engine:
             raise RuntimeError("Task engine not initialized")
             
         # Use provided mode or default to instance mode
         selected_mode = mode or self.mode
-        result = await self.task_engine.get_facebook_metadata(url, mode=selected_mode)
+        result = await self.task_engine.get_facebook_metadata(url, mode=selected_mode, priority=priority,
+                                                              client_id=client_id, budget=budget,
+                                                              cache_ttl=cache_ttl or self.cache_ttl, trace=trace)
         # Update stats from task engine
         self.stats = self.task_engine.get_engine_stats()
         return result
 
-    async def get_multiple_metadata_streaming(self, urls: List[str], mode: str = None) -> AsyncGenerator[Dict[str, Any], None]:
-        """Stream results as they complete (deduped). Now uses task engine."""
+    async def get_multiple_metadata_streaming(self, urls: List[str], mode: str = None, priority: int = PRIORITY_BATCH,
+                                              client_id: str = "default", budget: Optional[float] = None,
+                                              window: Optional[int] = None,
+                                              cache_ttl: Optional[int] = None,
+                                              trace: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Stream results as they complete (deduped theo canonical key).
+        Chỉ giữ tối đa `window` URL xử lý cùng lúc (mặc định 2x max_concurrent).
+        """
         if not self.task_engine:
             raise RuntimeError("Task engine not initialized")
             
         # Use provided mode or default to instance mode
         selected_mode = mode or self.mode
-        unique_urls = list(dict.fromkeys(urls))
-        logger.info(f"Scraping {len(unique_urls)} unique URLs (from {len(urls)} input) in mode: {selected_mode}")
-
-        async def _wrap(url):
-            try:
-                res = await self.task_engine.get_facebook_metadata(url, mode=selected_mode)
-            except Exception as e:
-                res = {"url": url, "error": str(e), "success": False}
-            return url, res
-
-        tasks = [asyncio.create_task(_wrap(u)) for u in unique_urls]
-
-        # stream in completion order
-        for coro in asyncio.as_completed(tasks):
-            url, res = await coro
-            yield {"url": url, "data": res}
+        # aclosing: khi consumer đóng generator (client ngắt kết nối) thì đóng luôn pipeline bên dưới
+        async with aclosing(self.task_engine.get_multiple_metadata_streaming(
+                urls, mode=selected_mode, window=window or self.max_concurrent * 2,
+                priority=priority, client_id=client_id, budget=budget,
+                cache_ttl=cache_ttl or self.cache_ttl, trace=trace)) as stream:
+            async for item in stream:
+                yield item
+        self.stats = self.task_engine.get_engine_stats()
 
-    async def get_multiple_metadata(self, urls: List[str], mode: str = None, batch_size: Optional[int] = None) -> Dict[str, Any]:
-        """Get multiple metadata using the task engine"""
+    async def get_multiple_metadata(self, urls: List[str], mode: str = None, batch_size: Optional[int] = None,
+                                    priority: int = PRIORITY_BATCH, client_id: str = "default",
+                                    budget: Optional[float] = None, cache_ttl: Optional[int] = None,
+                                    trace: bool = False) -> Dict[str, Any]:
+        """Get multiple metadata using the task engine (batch_size = số URL xử lý cùng lúc)"""
         if not self.task_engine:
             raise RuntimeError("Task engine not initialized")
             
@@ -143,10 +171,11 @@ class AsyncFacebookScraperStreaming:
         selected_mode = mode or self.mode
         if batch_size is None:
             batch_size = min(self.max_concurrent, max(1, len(urls)))
+        logger.info(f"Processing {len(urls)} URLs with window {batch_size} in mode: {selected_mode}")
         results = {}
-        for i in range(0, len(urls), batch_size):
-            batch = urls[i:i + batch_size]
-            logger.info(f"Processing batch {i//batch_size + 1} ({len(batch)} URLs) in mode: {selected_mode}")
-            async for item in self.task_engine.get_multiple_metadata_streaming(batch, mode=selected_mode):
-                results[item['url']] = item['data']
+        async for item in self.get_multiple_metadata_streaming(urls, mode=selected_mode, priority=priority,
+                                                               client_id=client_id, budget=budget,
+                                                               window=batch_size, cache_ttl=cache_ttl,
+                                                               trace=trace):
+            results[item['url']] = item['data']
         return results
\ No newline at end of file
@@ -7,6 +7,7 @@ import hashlib
 import os
 from typing import Optional, Dict, Any, List, AsyncGenerator, Callable
 from collections import OrderedDict, defaultdict
+from contextlib import aclosing, nullcontext
 import redis.asyncio as redis
 
 logger = logging.getLogger(__name__)
@@ -17,12 +18,21 @@ from .fetcher import PageFetcher
 from .extractor import DataExtractor
 from .metrics import (
     increment_scrape_attempts, increment_scrape_success, increment_scrape_failure,
-    increment_cache_hit, increment_cache_miss, update_queue_size,
-    observe_scrape_duration, observe_queue_waiting_duration
+    increment_cache_hit, increment_cache_miss, increment_rate_limits, increment_checkpoints,
+    observe_scrape_duration
 )
 from .anomaly_detector import anomaly_detector
 from .throttler import throttler
+from .host_limiter import host_limiter
 from .scaler import scaler
+from .url_canonicalizer import url_canonicalizer
+from .pipeline import BoundedTaskWindow
+from .scrape_result import ScrapeResult
+from .tracing import trace_span, start_trace, should_sample
+from .scheduler import (
+    ScrapeScheduler, SchedulerRejectedError, SchedulerDeadlineError,
+    PRIORITY_NORMAL, PRIORITY_BATCH
+)
 
 
 class PureSingleFlight:
@@ -35,8 +45,8 @@ class PureSingleFlight:
     Only does: coordination and execution
     """
     
-    def __init__(self, timeout: float = 45.0):
-        self.timeout = timeout
+    def __init__(self, timeout: Optional[float] = 45.0):
+        self.timeout = timeout  # None: chờ tới khi leader xong (fn tự giới hạn thời gian)
         self._futures: Dict[str, asyncio.Future] = {}
         self._locks = defaultdict(asyncio.Lock)
     
@@ -58,12 +68,14 @@ class PureSingleFlight:
                 asyncio.create_task(self._execute_and_cleanup(key, future, fn, *args, **kwargs))
         
         try:
-            return await asyncio.wait_for(future, timeout=self.timeout)
+            # shield: một waiter bị cancel/timeout không được cancel future dùng chung của các follower
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
         except asyncio.TimeoutError:
-            # Cleanup timeout
+            # Cleanup timeout (chỉ gỡ future của lượt này, không gỡ của leader mới)
             async with self._locks[key]:
-                self._futures.pop(key, None)
-            raise
+                if self._futures.get(key) is future:
+                    self._futures.pop(key, None)
+            raise asyncio.TimeoutError(f"Timed out after {self.timeout}s waiting for in-flight request {key}")
     
     async def _execute_and_cleanup(self, key: str, future: asyncio.Future,
                                   fn: Callable, *args, **kwargs):
@@ -86,9 +98,11 @@ class RedisCoordination:
     Redis coordination using Pub/Sub + lock renewal
     """
     
-    def __init__(self, redis_url: str = "redis://localhost:6379", lock_timeout: int = 30):
+    def __init__(self, redis_url: str = "redis://localhost:6379", lock_timeout: int = 30,
+                 wait_timeout: float = 45.0):
         self.redis_url = redis_url
         self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout  # follower chờ kết quả của leader tối đa bao lâu
         self._redis = None
         self._pubsub = None
         self._lock_renewal_tasks = {}
@@ -105,9 +119,11 @@ class RedisCoordination:
             logger.error(f"Failed to connect to Redis at {self.redis_url}: {e}")
             return False
     
-    async def execute_with_coordination(self, url: str, fn: Callable, *args, **kwargs):
+    async def execute_with_coordination(self, url: str, fn: Callable, *args,
+                                        source_url: Optional[str] = None, **kwargs):
         """
-        Execute with cross-process coordination using Pub/Sub
+        Execute with cross-process coordination using Pub/Sub.
+        `url` là key điều phối (URL đã canonical); `source_url` là URL gốc để báo lỗi cho follower.
         """
         # Make sure Redis is available
         if not self._redis:
@@ -128,11 +144,11 @@ class RedisCoordination:
             return await fn(*args, **kwargs)
         
         if is_leader:
-            return await self._execute_as_leader(lock_key, channel_key, fn, *args, **kwargs)
+            return await self._execute_as_leader(lock_key, channel_key, source_url or url, fn, *args, **kwargs)
         else:
             return await self._wait_as_follower(channel_key)
     
-    async def _execute_as_leader(self, lock_key: str, channel_key: str,
+    async def _execute_as_leader(self, lock_key: str, channel_key: str, url: str,
                                 fn: Callable, *args, **kwargs):
         """
         Execute as leader with lock renewal and result broadcasting
@@ -148,7 +164,8 @@ class RedisCoordination:
             # Publish result to channel for followers if Redis is available
             if self._redis:
                 try:
-                    await self._redis.publish(channel_key, json.dumps(result, ensure_ascii=False))
+                    await self._redis.publish(channel_key, json.dumps(ScrapeResult.coerce(result).to_dict(),
+                                                                      ensure_ascii=False))
                 except Exception as e:
                     logger.error(f"Failed to publish result to Redis: {e}")
             
@@ -156,7 +173,7 @@ class RedisCoordination:
         except Exception as e:
             # If there's an error, publish error result so followers know if Redis is available
             error_result = {
-                "url": args[0] if args else "unknown",
+                "url": url,
                 "error": str(e),
                 "success": False,
                 "error_type": "coordination_error"
@@ -225,11 +242,11 @@ class RedisCoordination:
         try:
             # Wait for message or timeout
             start_time = time.time()
-            while time.time() - start_time < 45.0:
+            while time.time() - start_time < self.wait_timeout:
                 try:
                     message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
                     if message and message['data']:
-                        return json.loads(message['data'])
+                        return ScrapeResult.from_dict(json.loads(message['data']))
                 except Exception as e:
                     logger.error(f"Error receiving message from Redis: {e}")
                     raise
@@ -258,7 +275,7 @@ class FacebookCacheManager:
         self.cache_ttl = cache_ttl
         self.negative_cache_ttl = 30  # Short TTL for negative results
     
-    async def get_with_negative_cache(self, url: str) -> Optional[Dict]:
+    async def get_with_negative_cache(self, url: str) -> Optional[ScrapeResult]:
         """Get result, including negative results"""
         # Check local cache first
         if self.local_cache:
@@ -271,6 +288,7 @@ class FacebookCacheManager:
             try:
                 redis_result = await self.redis_cache.get(url)
                 if redis_result:
+                    redis_result = ScrapeResult.from_dict(redis_result)
                     # Cache in local for fast access
                     if self.local_cache:
                         self.local_cache.set(url, redis_result, self.cache_ttl)
@@ -280,29 +298,27 @@ class FacebookCacheManager:
         
         return None
     
-    async def store_result(self, url: str, result: Dict):
-        """Store positive result"""
+    async def store_result(self, url: str, result: ScrapeResult, ttl: Optional[int] = None):
+        """Store positive result (ttl mặc định là cache_ttl của manager)"""
+        ttl = ttl or self.cache_ttl
         # Store in local cache
         if self.local_cache and url and result:
-            self.local_cache.set(url, result, self.cache_ttl)
+            self.local_cache.set(url, result, ttl)
         
         # Store in Redis if available
         if self.redis_cache and url and result:
             try:
-                await self.redis_cache.set(url, result, self.cache_ttl)
+                await self.redis_cache.set(url, result.to_dict(), ttl)
             except Exception:
                 logger.debug("Redis set failed", exc_info=True)
     
     async def store_negative_result(self, url: str, error_info: Dict):
         """Store negative result (error) to prevent repeated attempts"""
-        negative_result = {
-            "success": False,
-            "error_type": error_info.get("type", "unknown") if error_info else "unknown",
-            "error_message": error_info.get("message", "Unknown error") if error_info else "Unknown error",
-            "timestamp": time.time(),
-            "from_cache": True,
-            "scrape_time": 0
-        }
+        negative_result = ScrapeResult.failure(
+            url,
+            error_info.get("message", "Unknown error") if error_info else "Unknown error",
+            error_info.get("type", "unknown") if error_info else "unknown"
+        )
         
         # Store in local cache (short TTL)
         if self.local_cache and url:
@@ -311,7 +327,7 @@ class FacebookCacheManager:
         # Store in Redis cache if available (short TTL)
         if self.redis_cache and url:
             try:
-                await self.redis_cache.set(url, negative_result, self.negative_cache_ttl)
+                await self.redis_cache.set(url, negative_result.to_dict(), self.negative_cache_ttl)
             except Exception:
                 logger.debug("Redis negative result set failed", exc_info=True)
     
@@ -371,14 +387,13 @@ class SharedInMemoryCache:
                 
             self.hits += 1
             # Move to end (most recently used)
-            value = self.cache.pop(cache_key)
-            self.cache[cache_key] = value
+            self.cache.move_to_end(cache_key)
             try:
                 from .metrics import increment_cache_hit
                 increment_cache_hit('memory')
             except:
                 pass  # Ignore metrics errors
-            return value
+            return entry['data']
         self.misses += 1
         try:
             from .metrics import increment_cache_miss
@@ -426,67 +441,18 @@ class SharedInMemoryCache:
         }
 
 
-class TrackedQueueItem:
-    """
-    Wrapper to track queue waiting time
-    """
-    def __init__(self, item, mode: str = "simple"):
-        self.item = item
-        self.enqueue_time = time.time()
-        self.mode = mode
-        
-    def get_waiting_time(self):
-        return time.time() - self.enqueue_time
-
-
-class ModeBasedQueueManager:
-    """
-    Queue manager that separates queues by processing mode (simple, full, super)
-    """
-    def __init__(self):
-        self.queues = defaultdict(list)  # {mode: [TrackedQueueItem, ...]}
-        self.queue_sizes = defaultdict(int)  # {mode: size}
-        self.locks = defaultdict(asyncio.Lock)  # {mode: lock}
-    
-    def add_to_queue(self, item, mode: str = "simple") -> TrackedQueueItem:
-        """Add an item to the appropriate queue based on mode"""
-        tracked_item = TrackedQueueItem(item, mode)
-        self.queues[mode].append(tracked_item)
-        self.queue_sizes[mode] += 1
-        # Update scaler with the new queue length
-        scaler.update_queue_length(self.queue_sizes[mode], mode)
-        return tracked_item
-    
-    def get_from_queue(self, mode: str = "simple") -> Optional[TrackedQueueItem]:
-        """Get an item from the specified mode queue"""
-        if self.queues[mode]:
-            item = self.queues[mode].pop(0)
-            self.queue_sizes[mode] -= 1
-            # Update scaler with the new queue length
-            scaler.update_queue_length(self.queue_sizes[mode], mode)
-            return item
-        return None
-    
-    def get_queue_size(self, mode: str = "simple") -> int:
-        """Get the size of a specific mode queue"""
-        return self.queue_sizes[mode]
-    
-    def get_all_queue_sizes(self) -> Dict[str, int]:
-        """Get all queue sizes by mode"""
-        return dict(self.queue_sizes)
-
-
 class TaskEngine:
     """
     TaskEngine layer: Handle caching, rate limiting, and task orchestration
-    Enhanced with auto-throttling, auto-scaling, anomaly detection, and mode-based queue separation
+    Enhanced with auto-throttling, auto-scaling, anomaly detection, and a priority-aware scheduler
     """
     def __init__(self, 
                  fetcher: PageFetcher,
                  extractor: DataExtractor,
                  redis_cache: Optional[RedisCache] = None,
                  rate_limiter: Optional[RateLimiter] = None,
-                 cache_ttl: int = 300):
+                 cache_ttl: int = 300,
+                 scheduler: Optional[ScrapeScheduler] = None):
         
         self.fetcher = fetcher
         self.extractor = extractor
@@ -497,18 +463,23 @@ class TaskEngine:
         # Shared in-memory cache
         self.shared_cache = SharedInMemoryCache(max_size=500)
         
-        # Mode-based queue management
-        self.queue_manager = ModeBasedQueueManager()
+        # Priority-aware scheduler: per-mode priority queues, fair sharing, admission control
+        self.scheduler = scheduler or ScrapeScheduler(
+            max_concurrent=self.rate_limiter.max_concurrent if self.rate_limiter else 6
+        )
         
-        # Pure single-flight for in-process coordination
-        self.pure_single_flight = PureSingleFlight(timeout=45.0)
+        # Pure single-flight for in-process coordination: không tự timeout (thời gian chờ slot
+        # do scheduler/budget quyết định), giới hạn thời gian chỉ tính từ lúc được cấp slot
+        self.pure_single_flight = PureSingleFlight(timeout=None)
+        self.attempt_timeout = 45.0
         
         # Redis coordination for multi-process coordination - with safe initialization
         try:
             redis_url = "redis://localhost:6379"  # Default, can be overridden
             if self.redis_cache and hasattr(self.redis_cache, 'redis_url'):
                 redis_url = self.redis_cache.redis_url
-            self.redis_coordination = RedisCoordination(redis_url=redis_url, lock_timeout=30)
+            self.redis_coordination = RedisCoordination(redis_url=redis_url, lock_timeout=30,
+                                                        wait_timeout=self.attempt_timeout)
         except Exception:
             logger.warning("Failed to initialize Redis coordination, will use in-process single-flight only")
             self.redis_coordination = None  # Fallback to in-process only
@@ -547,7 +518,30 @@ class TaskEngine:
                 self.redis_coordination = None  # Disable Redis coordination if connection fails
 
     async def get_facebook_metadata(self, url: str, mode: str = "simple", 
-                                  use_cache: bool = True) -> Dict[str, Any]:
+                                  use_cache: bool = True,
+                                  priority: int = PRIORITY_NORMAL,
+                                  client_id: str = "default",
+                                  budget: Optional[float] = None,
+                                  cache_ttl: Optional[int] = None,
+                                  trace: bool = False) -> ScrapeResult:
+        """
+        trace=True: ghi thời gian từng giai đoạn (cache, queue, page, navigation, extraction...)
+        và trả về trong key `timings` của kết quả. Ngoài ra một phần request được trace ngầm
+        theo FB_TRACE_SAMPLE_RATE để export OpenTelemetry (không gắn timings vào kết quả).
+        """
+        if not (trace or should_sample()):
+            return await self._get_facebook_metadata(url, mode, use_cache, priority, client_id, budget, cache_ttl)
+
+        with start_trace(url, mode) as scrape_trace:
+            result = await self._get_facebook_metadata(url, mode, use_cache, priority, client_id, budget, cache_ttl)
+        return result.with_timings(scrape_trace.to_timings()) if trace else result
+
+    async def _get_facebook_metadata(self, url: str, mode: str = "simple",
+                                     use_cache: bool = True,
+                                     priority: int = PRIORITY_NORMAL,
+                                     client_id: str = "default",
+                                     budget: Optional[float] = None,
+                                     cache_ttl: Optional[int] = None) -> ScrapeResult:
         """
         Clean execution flow:
         1. Cache-first (including negative results)
@@ -555,49 +549,55 @@ class TaskEngine:
         3. In-process single-flight (if needed)
         4. Scrape (only by leader)
         5. Fail-fast (no fallback scraping)
+
+        Cache và single-flight dùng canonical key của URL (m./www., tracking params,
+        short link đã resolve) để gộp URL tương đương; browser vẫn mở đúng URL người dùng gửi
+        (canonical bỏ locale/hl, ép https... có thể làm thay đổi nội dung trang).
+
+        priority/client_id/budget chỉ áp dụng khi phải scrape thật (cache miss):
+        budget là thời gian chờ slot tối đa (giây), vượt quá sẽ bị từ chối sớm.
+        cache_ttl (nếu có) ghi đè TTL mặc định khi lưu kết quả của request này.
         """
         
         self.stats["total_requests"] += 1
+        cache_key = url_canonicalizer.canonicalize(url)
         increment_scrape_attempts(mode)
 
-        # Apply throttling delay before processing
-        current_delay = throttler.get_current_delay()
-        if current_delay > 0:
-            await asyncio.sleep(current_delay)
+        # Không sleep trước cache lookup: cache hit không bao giờ bị làm chậm,
+        # việc giảm tốc chỉ áp dụng cho navigation thật (host_limiter theo từng host)
 
         # Step 1: Check cache first (including negative results)
         if use_cache:
             try:
-                cached_result = await self.cache_manager.get_with_negative_cache(url)
+                with trace_span("cache_lookup"):
+                    cached_result = await self.cache_manager.get_with_negative_cache(cache_key)
                 if cached_result:
                     # Update throttler with cache hit
                     throttler.update_cache_stats(cache_hit=True)
                     
                     self.stats["cached_requests"] += 1
-                    result = dict(cached_result)  # Copy to avoid reference issues
-                    result['from_cache'] = True
-                    return result
+                    return cached_result.as_cached()
             except Exception as e:
                 logger.error(f"Cache lookup failed: {e}", exc_info=True)
             else:
                 # Update throttler with cache miss
                 throttler.update_cache_stats(cache_hit=False)
 
+        schedule = {"priority": priority, "client_id": client_id, "budget": budget}
+
         # Step 2: Redis coordination (cross-process) - only if available
         if self.redis_coordination:
             try:
-                redis_result = await self.redis_coordination.execute_with_coordination(
-                    url, self._execute_single_flight_scrape, url, mode
-                )
-                return redis_result
+                with trace_span("coordination"):
+                    redis_result = await self.redis_coordination.execute_with_coordination(
+                        cache_key, self._execute_single_flight_scrape, cache_key, url, mode, cache_ttl,
+                        source_url=url, **schedule
+                    )
+                return ScrapeResult.coerce(redis_result)
             except TimeoutError:
                 # FAIL-FAST: Don't fallback to scraping, return error
-                return {
-                    "url": url,
-                    "error": "Service temporarily unavailable due to high load",
-                    "success": False,
-                    "error_type": "service_unavailable"
-                }
+                return ScrapeResult.failure(url, "Service temporarily unavailable due to high load",
+                                            "service_unavailable")
             except Exception as e:
                 # For other Redis errors, log and fall back to in-process single-flight
                 logger.error(f"Redis coordination error for {url}: {e}")
@@ -607,81 +607,81 @@ class TaskEngine:
 
         # Fallback to in-process single-flight only
         try:
-            result = await self.pure_single_flight.do(url, self._perform_scrape, url, mode)
+            with trace_span("single_flight"):
+                result = await self.pure_single_flight.do(cache_key, self._perform_scrape, url, mode, **schedule)
             
             # Leader is responsible for caching result
-            if result.get("success"):
-                try:
-                    await self.cache_manager.store_result(url, result)
-                except Exception as e:
-                    logger.error(f"Failed to store result in cache: {e}", exc_info=True)
-            else:
-                # Store negative result
-                error_info = {
-                    "type": result.get("error_type", "unknown"),
-                    "message": result.get("error", "Unknown error")
-                }
-                try:
-                    await self.cache_manager.store_negative_result(url, error_info)
-                except Exception as e:
-                    logger.error(f"Failed to store negative result in cache: {e}", exc_info=True)
-            
+            await self._cache_scrape_result(cache_key, result, cache_ttl)
             return result
         except Exception as e:
             # Even on exception, return structured error (no fallback scraping)
-            error_result = {
-                "url": url,
-                "error": str(e),
-                "success": False,
-                "error_type": "scraping_error"
-            }
-            return error_result
+            return ScrapeResult.failure(url, str(e), "scraping_error")
 
-    async def _execute_single_flight_scrape(self, url: str, mode: str) -> Dict[str, Any]:
+    async def _execute_single_flight_scrape(self, cache_key: str, url: str, mode: str,
+                                            cache_ttl: Optional[int] = None, **schedule) -> ScrapeResult:
         """
         Single-flight execution that includes in-process coordination
+        (single-flight/cache theo `cache_key`, scrape `url` gốc)
         """
         # Use pure single-flight for in-process coordination
         async def scrape_fn():
-            return await self._perform_scrape(url, mode)
+            return await self._perform_scrape(url, mode, **schedule)
         
         try:
-            result = await self.pure_single_flight.do(url, scrape_fn)
+            result = await self.pure_single_flight.do(cache_key, scrape_fn)
             
             # Leader is responsible for caching result
-            if result.get("success"):
-                try:
-                    await self.cache_manager.store_result(url, result)
-                except Exception as e:
-                    logger.error(f"Failed to store result in cache: {e}", exc_info=True)
-            else:
-                # Store negative result
-                error_info = {
-                    "type": result.get("error_type", "unknown"),
-                    "message": result.get("error", "Unknown error")
-                }
-                try:
-                    await self.cache_manager.store_negative_result(url, error_info)
-                except Exception as e:
-                    logger.error(f"Failed to store negative result in cache: {e}", exc_info=True)
-            
+            await self._cache_scrape_result(cache_key, result, cache_ttl)
             return result
         except Exception as e:
             # Even on exception, return structured error (no fallback scraping)
-            error_result = {
-                "url": url,
-                "error": str(e),
-                "success": False,
-                "error_type": "scraping_error"
+            return ScrapeResult.failure(url, str(e), "scraping_error")
+
+    async def _cache_scrape_result(self, cache_key: str, result: Dict[str, Any], cache_ttl: Optional[int] = None):
+        """Lưu kết quả (positive/negative) theo canonical key"""
+        if result.get("error_type") in ("overloaded", "deadline_exceeded"):
+            # Bị scheduler từ chối: không phải lỗi của URL, không negative-cache
+            return
+        if not result.get("success"):
+            # Store negative result
+            error_info = {
+                "type": result.get("error_type", "unknown"),
+                "message": result.get("error", "Unknown error")
             }
-            return error_result
+            try:
+                with trace_span("cache_write", negative=True):
+                    await self.cache_manager.store_negative_result(cache_key, error_info)
+            except Exception as e:
+                logger.error(f"Failed to store negative result in cache: {e}", exc_info=True)
+            return
+
+        try:
+            with trace_span("cache_write"):
+                await self.cache_manager.store_result(cache_key, result, cache_ttl)
+        except Exception as e:
+            logger.error(f"Failed to store result in cache: {e}", exc_info=True)
 
-    async def _perform_scrape(self, url: str, mode: str = "simple") -> Dict[str, Any]:
-        """Execute the actual scraping - only called by leader"""
-        # Apply rate limiting
-        if self.rate_limiter:
-            await self.rate_limiter.acquire()
+        # Short link (share/, fb.watch): ghi nhận URL đích để các URL tương đương dùng chung cache
+        if not url_canonicalizer.is_short_link(cache_key):
+            return
+        for candidate in (result.get("url"), result.get("final_url")):
+            resolved_key = url_canonicalizer.record_resolution(cache_key, candidate)
+            if resolved_key:
+                try:
+                    await self.cache_manager.store_result(resolved_key, result, cache_ttl)
+                except Exception as e:
+                    logger.error(f"Failed to store resolved result in cache: {e}", exc_info=True)
+                break
 
+    async def _perform_scrape(self, url: str, mode: str = "simple",
+                              priority: int = PRIORITY_NORMAL,
+                              client_id: str = "default",
+                              budget: Optional[float] = None) -> ScrapeResult:
+        """
+        Execute the actual scraping with retry/backoff - only called by leader.
+        Mỗi lần thử xin một slot của scheduler và trả lại ngay khi xong: backoff giữa các lần thử
+        không giữ slot. `attempt_timeout` chỉ tính từ lúc được cấp slot (không gồm thời gian xếp hàng).
+        """
         # Implement retry mechanism with exponential backoff
         max_retries = 3
         retry_count = 0
@@ -689,80 +689,33 @@ class TaskEngine:
 
         while retry_count <= max_retries:
             try:
-                start = time.time()
-                
-                # Get a page and context from pool via fetcher
-                page, context = await self.fetcher.browser_pool.get_page()
-                
-                try:
-                    # Fetch page content
-                    fetch_result = await self.fetcher.fetch_page_content(page, url, mode)
-                    
-                    # Update throttler with navigation time
-                    throttler.update_navigation_time(fetch_result["navigation_time"], mode)
-                    
-                    # Extract data
-                    extracted_data = await self.extractor.extract_data(fetch_result["page"], mode)
-                    
-                    # Combine results
-                    result = {**fetch_result, **extracted_data}
-                    # Remove the page object as it shouldn't be returned to the user
-                    if "page" in result:
-                        del result["page"]
-                    result["success"] = True
-                    result["from_cache"] = False
-                    result["scrape_time"] = time.time() - start
-                    
-                    if result and result.get("success"):
-                        self.stats["successful_scrapes"] += 1
-                        increment_scrape_success(mode)
-                        observe_scrape_duration(result["scrape_time"], mode)
-                    else:
-                        self.stats["failed_scrapes"] += 1
-                        # Determine error type for metrics
-                        error_type = "unknown"
-                        if result.get("error"):
-                            error_msg = str(result["error"]).lower()
-                            if "rate" in error_msg or "limit" in error_msg:
-                                error_type = "rate_limited"
-                                try:
-                                    from .metrics import increment_rate_limits
-                                    throttler.record_rate_limit_event()  # Update throttler
-                                    increment_rate_limits()
-                                except:
-                                    pass  # Ignore metrics errors
-                            elif "checkpoint" in error_msg or "restricted" in error_msg:
-                                error_type = "checkpoint"
-                                try:
-                                    from .metrics import increment_checkpoints
-                                    increment_checkpoints()
-                                except:
-                                    pass  # Ignore metrics errors
-                            else:
-                                error_type = "other_error"
-                        try:
-                            increment_scrape_failure(error_type, mode)
-                        except:
-                            pass  # Ignore metrics errors
-
-                    self.stats["total_time"] += result.get("scrape_time", 0)
-                    return result
-                    
-                finally:
-                    # Return page to pool with context
-                    await self.fetcher.browser_pool.return_page(page, context)
+                with trace_span("queue_wait", priority=priority, attempt=retry_count):
+                    ticket = await self.scheduler.acquire(mode, client_id, priority, budget)
+            except SchedulerRejectedError as e:
+                error_type = "deadline_exceeded" if isinstance(e, SchedulerDeadlineError) else "overloaded"
+                logger.warning(f"Scheduler rejected {url} ({error_type}): {e}")
+                return ScrapeResult.failure(url, str(e), error_type, estimated_wait=e.estimated_wait)
 
+            try:
+                return await asyncio.wait_for(self._scrape_once(url, mode), timeout=self.attempt_timeout)
             except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = asyncio.TimeoutError(f"Scraping {url} timed out after {self.attempt_timeout}s")
                 last_exception = e
                 retry_count += 1
-                if retry_count <= max_retries:
-                    # Exponential backoff: wait 2^retry_count seconds
-                    wait_time = 2 ** retry_count
-                    logger.warning(f"Retry {retry_count}/{max_retries} for {url} after error: {e}. Waiting {wait_time}s")
+            finally:
+                self.scheduler.release(ticket)
+
+            if retry_count <= max_retries:
+                # Exponential backoff: wait 2^retry_count seconds
+                wait_time = 2 ** retry_count
+                logger.warning(f"Retry {retry_count}/{max_retries} for {url} after error: {last_exception}. "
+                               f"Waiting {wait_time}s")
+                with trace_span("retry_backoff", attempt=retry_count):
                     await asyncio.sleep(wait_time)
-                else:
-                    # All retries exhausted
-                    logger.error(f"All retries exhausted for {url}. Last error: {e}")
+            else:
+                # All retries exhausted
+                logger.error(f"All retries exhausted for {url}. Last error: {last_exception}")
 
         # If we get here, all retries failed
         logger.error(f"get_facebook_metadata error for {url} after {max_retries} retries: {last_exception}")
@@ -771,6 +724,7 @@ class TaskEngine:
         error_msg = str(last_exception).lower()
         if "rate" in error_msg or "limit" in error_msg:
             error_type = "rate_limited"
+            host_limiter.record_rate_limit(url)
             try:
                 throttler.record_rate_limit_event()  # Update throttler
                 increment_rate_limits()
@@ -788,50 +742,106 @@ class TaskEngine:
             increment_scrape_failure(error_type, mode)
         except:
             pass  # Ignore metrics errors
-        result = {"url": url, "error": str(last_exception), "success": False, "scrape_time": 0}
-        if self.rate_limiter:
-            self.rate_limiter.release()
-        return result
-
-    async def get_multiple_metadata_streaming(self, urls: List[str], mode: str = "simple", batch_size: int = 25) -> AsyncGenerator[Dict[str, Any], None]:
-        """Process URLs in smaller batches within the streaming function for better resource management"""
-        unique_urls = list(dict.fromkeys(urls))
-        logger.info(f"Processing {len(unique_urls)} URLs in batches of {batch_size} in mode: {mode}")
-        
-        # Process URLs in smaller batches to prevent overwhelming the system
-        for i in range(0, len(unique_urls), batch_size):
-            batch = unique_urls[i:i + batch_size]
-            
-            # Update queue size for this mode
-            self.queue_manager.queue_sizes[mode] = len(batch)
-            scaler.update_queue_length(len(batch), mode)
-            update_queue_size(len(batch))
+        return ScrapeResult.failure(url, str(last_exception), error_type)
 
-            async def _process_batch_item(url):
-                tracked_item = TrackedQueueItem(url, mode)
-                try:
-                    # Record waiting time
-                    waiting_time = tracked_item.get_waiting_time()
-                    observe_queue_waiting_duration(waiting_time, mode)
-                    # Add to scaler for auto-scaling decisions
-                    scaler.add_queue_wait_time(waiting_time, mode)
-                    
-                    res = await self.get_facebook_metadata(url, mode=mode)
-                except Exception as e:
-                    res = {"url": url, "error": str(e), "success": False}
-                return url, res
+    def _permit(self):
+        return self.rate_limiter.permit() if self.rate_limiter else nullcontext()
 
-            tasks = [asyncio.create_task(_process_batch_item(u)) for u in batch]
+    async def _scrape_once(self, url: str, mode: str = "simple") -> ScrapeResult:
+        """Một lần thử - caller phải đang giữ slot của scheduler"""
+        # Mỗi lần thử là một request tới Facebook: giữ permit (rate token) trong lúc làm việc với browser
+        async with self._permit():
+            start = time.time()
 
-            # Process batch items as they complete
-            for coro in asyncio.as_completed(tasks):
-                url, res = await coro
-                # Update queue size when task completes
-                current_size = len([t for t in tasks if not t.done()])
-                self.queue_manager.queue_sizes[mode] = current_size
-                scaler.update_queue_length(current_size, mode)
-                update_queue_size(current_size)
-                yield {"url": url, "data": res}
+            # Get a page and context from pool via fetcher
+            page, context = await self.fetcher.browser_pool.get_page()
+
+            try:
+                # Fetch page content
+                fetch_result = await self.fetcher.fetch_page_content(page, url, mode)
+
+                # Update throttler with navigation time
+                throttler.update_navigation_time(fetch_result["navigation_time"], mode)
+
+                # Page object không bao giờ nằm trong result: chỉ giữ kiểu JSON-native
+                # (dữ liệu từ page.evaluate) để response encode một lần, không cần duyệt lại
+                scraped_page = fetch_result.pop("page")
+                extracted_data = await self.extractor.extract_data(scraped_page, mode)
+
+                # Combine results
+                result = ScrapeResult.from_scrape(fetch_result, extracted_data, time.time() - start)
+
+                if result and result.get("success"):
+                    self.stats["successful_scrapes"] += 1
+                    increment_scrape_success(mode)
+                    observe_scrape_duration(result.scrape_time, mode)
+                else:
+                    self.stats["failed_scrapes"] += 1
+                    # Determine error type for metrics
+                    error_type = "unknown"
+                    if result.get("error"):
+                        error_msg = str(result["error"]).lower()
+                        if "rate" in error_msg or "limit" in error_msg:
+                            error_type = "rate_limited"
+                            host_limiter.record_rate_limit(url)
+                            try:
+                                throttler.record_rate_limit_event()  # Update throttler
+                                increment_rate_limits()
+                            except:
+                                pass  # Ignore metrics errors
+                        elif "checkpoint" in error_msg or "restricted" in error_msg:
+                            error_type = "checkpoint"
+                            try:
+                                increment_checkpoints()
+                            except:
+                                pass  # Ignore metrics errors
+                        else:
+                            error_type = "other_error"
+                    try:
+                        increment_scrape_failure(error_type, mode)
+                    except:
+                        pass  # Ignore metrics errors
+
+                self.stats["total_time"] += result.scrape_time
+                return result
+
+            finally:
+                # Return page to pool with context
+                with trace_span("page_return"):
+                    await self.fetcher.browser_pool.return_page(page, context)
+
+    async def get_multiple_metadata_streaming(self, urls: List[str], mode: str = "simple", window: Optional[int] = None,
+                                              priority: int = PRIORITY_BATCH, client_id: str = "default",
+                                              budget: Optional[float] = None,
+                                              cache_ttl: Optional[int] = None,
+                                              trace: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Stream kết quả theo thứ tự hoàn thành, giữ tối đa `window` URL xử lý cùng lúc
+        (mặc định 2x số slot của scheduler) thay vì tạo một task cho mỗi URL
+        """
+        # Dedup theo canonical key: URL tương đương chỉ scrape một lần, kết quả trả về cho từng URL gốc
+        url_groups = url_canonicalizer.group_urls(urls)
+        if window is None:
+            window = self.scheduler.max_concurrent * 2
+        logger.info(f"Processing {len(url_groups)} unique URLs (from {len(urls)} input) with window {window} in mode: {mode}")
+
+        async def _process_item(key):
+            # Scrape URL gốc đầu tiên của nhóm (canonical key chỉ dùng để gộp/cache)
+            url = url_groups[key][0]
+            try:
+                # Queue wait time và queue length được scheduler ghi nhận khi cấp slot
+                res = await self.get_facebook_metadata(url, mode=mode, priority=priority,
+                                                       client_id=client_id, budget=budget, cache_ttl=cache_ttl,
+                                                       trace=trace)
+            except Exception as e:
+                res = ScrapeResult.failure(url, str(e), "scraping_error")
+            return key, res
+
+        pipeline = BoundedTaskWindow(_process_item, window=window)
+        async with aclosing(pipeline.stream(url_groups.keys())) as stream:
+            async for key, res in stream:
+                for original_url in url_groups[key]:
+                    yield {"url": original_url, "data": res}
 
     async def get_multiple_metadata(self, urls: List[str], mode: str = "simple", batch_size: Optional[int] = 25) -> Dict[str, Any]:
         if batch_size is None:
@@ -839,21 +849,14 @@ class TaskEngine:
             batch_size = min(self.rate_limiter.max_concurrent if self.rate_limiter else 6, max(1, len(urls)))
         
         results = {}
-        for i in range(0, len(urls), batch_size):
-            batch = urls[i:i + batch_size]
-            logger.info(f"Processing batch {i//batch_size + 1} ({len(batch)} URLs) in mode: {mode}")
-            
-            # Update queue size for this mode
-            self.queue_manager.queue_sizes[mode] = len(batch)
-            scaler.update_queue_length(len(batch), mode)
-            update_queue_size(len(batch))
-            
-            async for item in self.get_multiple_metadata_streaming(batch, mode, batch_size):
-                results[item['url']] = item['data']
+        async for item in self.get_multiple_metadata_streaming(urls, mode, window=batch_size):
+            results[item['url']] = item['data']
         return results
 
     def get_cache_stats(self):
-        return self.shared_cache.stats()
+        stats = self.shared_cache.stats()
+        stats["url_aliases"] = url_canonicalizer.stats()
+        return stats
 
     def get_engine_stats(self):
         return self.stats
@@ -868,7 +871,4 @@ class TaskEngine:
     
     def get_queue_status(self):
         """Get current queue status by mode"""
-        return {
-            'queue_sizes_by_mode': self.queue_manager.get_all_queue_sizes(),
-            'total_queue_size': sum(self.queue_manager.get_all_queue_sizes().values())
-        }
\ No newline at end of file
+        return self.scheduler.get_status()
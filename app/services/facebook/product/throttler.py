@@ -2,6 +2,7 @@ import time
 import math
 import asyncio
 from typing import Dict, Optional
+from collections import deque
 from enum import Enum
 
 from .metrics import (
@@ -10,6 +11,7 @@ from .metrics import (
     FACEBOOK_RATE_LIMITS
 )
 from .anomaly_detector import anomaly_detector
+from .rolling_stats import RollingWindow
 
 
 class ThrottleReason(Enum):
@@ -42,17 +44,17 @@ class AdaptiveThrottler:
         self.cache_miss_threshold = cache_miss_threshold
         self.memory_threshold = memory_threshold
         
-        # Track historical metrics
-        self.navigation_durations = []
-        self.cache_miss_events = []
-        self.rate_limit_events = []
-        self.memory_usage = []
-        
         # Window sizes for calculation - adjusted for large batch processing
         self.duration_window_size = 15  # Smaller window for faster adaptation
         self.event_window_size = 20    # Smaller window for faster adaptation
         self.memory_window_size = 8    # Smaller window for faster adaptation
         
+        # Track historical metrics (ring buffer, trung bình cập nhật O(1) mỗi lần scrape)
+        self.navigation_durations = RollingWindow(self.duration_window_size)
+        self.cache_miss_events = RollingWindow(self.event_window_size)  # 1.0 = miss, 0.0 = hit
+        self.rate_limit_events = deque(maxlen=self.event_window_size)
+        self.memory_usage = RollingWindow(self.memory_window_size)
+        
         # Current throttle state
         self.current_delay = base_delay
         self.last_throttle_time = time.time()
@@ -68,10 +70,7 @@ class AdaptiveThrottler:
         Update with new navigation duration and return suggested delay
         """
         # Add to duration history
-        self.navigation_durations.append((time.time(), duration))
-        
-        # Keep only recent values
-        self._trim_window(self.navigation_durations, self.duration_window_size)
+        self.navigation_durations.add(duration)
         
         # Check for anomalies using the detector
         anomaly_result = anomaly_detector.add_navigation_time(duration, mode)
@@ -90,12 +89,7 @@ class AdaptiveThrottler:
         """
         Update with cache hit/miss and return suggested delay
         """
-        current_time = time.time()
-        is_miss = not cache_hit
-        self.cache_miss_events.append((current_time, is_miss))
-        
-        # Keep only recent values
-        self._trim_window(self.cache_miss_events, self.event_window_size)
+        self.cache_miss_events.add(0.0 if cache_hit else 1.0)
         
         # Calculate cache miss rate
         miss_rate = self._get_cache_miss_rate()
@@ -112,11 +106,7 @@ class AdaptiveThrottler:
         """
         Record a rate limit event and return suggested delay
         """
-        current_time = time.time()
-        self.rate_limit_events.append(current_time)
-        
-        # Keep only recent values
-        self._trim_window(self.rate_limit_events, self.event_window_size)
+        self.rate_limit_events.append(time.time())
         
         # Use the anomaly detector to track rate limits
         anomaly_result = anomaly_detector.add_rate_limit_event()
@@ -134,11 +124,7 @@ class AdaptiveThrottler:
         """
         Update with memory usage and return suggested delay
         """
-        current_time = time.time()
-        self.memory_usage.append((current_time, memory_mb))
-        
-        # Keep only recent values
-        self._trim_window(self.memory_usage, self.memory_window_size)
+        self.memory_usage.add(memory_mb)
         
         # Check if memory usage is high
         if memory_mb > self.memory_threshold:
@@ -185,32 +171,17 @@ class AdaptiveThrottler:
         self.throttle_reason = reason
         self.active_throttle_until = time.time() + (suggested_delay * 3)  # Throttle for 3x the delay period
         
-    def _trim_window(self, data_list: list, window_size: int) -> None:
-        """
-        Trim the list to keep only the most recent values
-        """
-        if len(data_list) > window_size:
-            data_list[:] = data_list[-window_size:]
-    
     def _get_recent_avg_duration(self) -> float:
         """
-        Calculate average of recent navigation durations
+        Average of recent navigation durations (O(1))
         """
-        if not self.navigation_durations:
-            return 0.0
-        
-        recent_durations = [duration for _, duration in self.navigation_durations]
-        return sum(recent_durations) / len(recent_durations)
+        return self.navigation_durations.mean
     
     def _get_cache_miss_rate(self) -> float:
         """
-        Calculate cache miss rate from recent events
+        Cache miss rate from recent events (O(1): mean of 0/1 values)
         """
-        if not self.cache_miss_events:
-            return 0.0
-        
-        miss_count = sum(1 for _, is_miss in self.cache_miss_events if is_miss)
-        return miss_count / len(self.cache_miss_events)
+        return self.cache_miss_events.mean
 
 
 # Global instance for use in other modules
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import random
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# OpenTelemetry là optional: chỉ export khi có SDK + exporter và đặt FB_TRACE_OTLP_ENDPOINT
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    OTEL_AVAILABLE = True
+except ImportError:
+    otel_trace = None
+    OTEL_AVAILABLE = False
+
+
+# Trace của lần scrape hiện tại; task con (single-flight leader, pipeline) kế thừa qua context
+_current_trace: ContextVar[Optional["ScrapeTrace"]] = ContextVar("facebook_scrape_trace", default=None)
+
+# Tỷ lệ scrape được trace ngầm để export (kể cả khi client không yêu cầu timings)
+TRACE_SAMPLE_RATE = float(os.getenv("FB_TRACE_SAMPLE_RATE", "0") or 0)
+
+
+class ScrapeTrace:
+    """
+    Thời gian từng giai đoạn của một lần scrape:
+    cache_lookup, queue_wait, rate_limit_wait, page_checkout, host_slot_wait,
+    navigation, readiness_wait, extraction, cache_write...
+    """
+    __slots__ = ("url", "mode", "started", "started_ns", "finished", "spans")
+
+    def __init__(self, url: str, mode: Optional[str] = None):
+        self.url = url
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.started_ns = time.time_ns()  # mốc wall clock cho OpenTelemetry
+        self.finished: Optional[float] = None
+        self.spans: List[Tuple[str, float, float, Dict[str, Any]]] = []
+
+    def record(self, name: str, start: float, end: float, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.spans.append((name, start, end, attributes or {}))
+
+    def finish(self) -> None:
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def to_timings(self) -> Dict[str, Any]:
+        """Dạng trả về trong key `timings` của kết quả (ms)"""
+        stages: Dict[str, float] = {}
+        spans = []
+        for name, start, end, attributes in self.spans:
+            duration = (end - start) * 1000
+            stages[name] = round(stages.get(name, 0.0) + duration, 2)
+            spans.append({
+                "name": name,
+                "offset_ms": round((start - self.started) * 1000, 2),
+                "duration_ms": round(duration, 2),
+                **attributes
+            })
+        return {"total_ms": round(self.total * 1000, 2), "stages": stages, "spans": spans}
+
+
+def current_trace() -> Optional[ScrapeTrace]:
+    return _current_trace.get()
+
+
+def should_sample() -> bool:
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+@contextmanager
+def trace_span(name: str, **attributes):
+    """Ghi một span vào trace hiện tại; không có trace thì gần như không tốn gì"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        trace.record(name, start, time.perf_counter(), attributes)
+
+
+@contextmanager
+def start_trace(url: str, mode: Optional[str] = None):
+    """Bắt đầu trace cho một URL trong context hiện tại; export khi kết thúc"""
+    trace = ScrapeTrace(url, mode)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+        export_trace(trace)
+
+
+_tracer = None
+_tracer_initialized = False
+
+
+def _get_tracer():
+    global _tracer, _tracer_initialized
+    if _tracer_initialized:
+        return _tracer
+    _tracer_initialized = True
+
+    endpoint = os.getenv("FB_TRACE_OTLP_ENDPOINT")  # vd: http://localhost:4318/v1/traces
+    if not endpoint:
+        return None
+    if not OTEL_AVAILABLE:
+        logger.warning("FB_TRACE_OTLP_ENDPOINT is set but opentelemetry-sdk/exporter is not installed")
+        return None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "hypa-facebook-scraper"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    _tracer = provider.get_tracer(__name__)
+    logger.info(f"Exporting scrape traces to {endpoint}")
+    return _tracer
+
+
+def export_trace(trace: ScrapeTrace) -> None:
+    """Dựng lại span OpenTelemetry từ trace đã xong (root span + một span con mỗi giai đoạn)"""
+    tracer = _get_tracer()
+    if tracer is None:
+        return
+
+    def to_ns(perf_time: float) -> int:
+        return trace.started_ns + int((perf_time - trace.started) * 1e9)
+
+    try:
+        root = tracer.start_span("facebook.scrape", start_time=trace.started_ns,
+                                 attributes={"url": trace.url, "mode": trace.mode or ""})
+        parent = otel_trace.set_span_in_context(root)
+        for name, start, end, attributes in trace.spans:
+            span = tracer.start_span(f"facebook.{name}", context=parent, start_time=to_ns(start),
+                                     attributes={k: v for k, v in attributes.items() if v is not None})
+            span.end(end_time=to_ns(end))
+        root.end(end_time=to_ns(trace.finished or time.perf_counter()))
+    except Exception as e:
+        logger.debug(f"Failed to export scrape trace: {e}")
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import re
+import time
+import logging
+from functools import lru_cache
+from collections import OrderedDict
+from typing import Optional, Dict, List
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+
+# Các host tương đương với www.facebook.com (mobile, basic, locale...)
+FACEBOOK_HOST_ALIASES = {
+    "facebook.com",
+    "m.facebook.com",
+    "mbasic.facebook.com",
+    "touch.facebook.com",
+    "mobile.facebook.com",
+    "web.facebook.com",
+    "free.facebook.com",
+    "d.facebook.com",
+    "fb.com",
+    "www.fb.com",
+}
+CANONICAL_HOST = "www.facebook.com"
+LOCALE_HOST_RE = re.compile(r"^[a-z]{2}-[a-z]{2}\.facebook\.com$")
+
+# Host chỉ dùng để redirect (short link)
+SHORT_LINK_HOSTS = {"fb.watch", "fb.me", "www.fb.watch"}
+SHORT_LINK_PATH_PREFIXES = ("/share/",)
+
+# Tracking params không ảnh hưởng tới nội dung trang
+TRACKING_PARAMS = {
+    "fbclid", "mibextid", "rdid", "share_url", "ref", "refsrc", "refid",
+    "_rdr", "_rdc", "_ft_", "paipv", "eav", "sfnsn", "extid", "hc_ref",
+    "fref", "hc_location", "acontext", "notif_id", "notif_t", "ref_notif_type",
+    "comment_tracking", "locale", "hl", "sfns",
+}
+TRACKING_PARAM_PREFIXES = ("__", "utm_")
+
+# Trang redirect tới đây nghĩa là không resolve được nội dung thật
+UNRESOLVED_PATH_PREFIXES = ("/login", "/checkpoint", "/recover", "/cookie", "/share/")
+
+
+def _is_tracking_param(name: str) -> bool:
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PARAM_PREFIXES)
+
+
+def canonical_host(host: str) -> str:
+    """Host chuẩn: vi-vn.facebook.com, m.facebook.com... đều là cùng nội dung -> www.facebook.com"""
+    host = host.lower()
+    if host in FACEBOOK_HOST_ALIASES or LOCALE_HOST_RE.match(host):
+        return CANONICAL_HOST
+    return host
+
+
+@lru_cache(maxsize=4096)
+def normalize_facebook_url(url: str) -> str:
+    """
+    Chuẩn hóa cú pháp URL (không cần network):
+    - https + host chuẩn (m./mbasic./web. -> www.facebook.com)
+    - bỏ tracking params, fragment, port mặc định
+    - sắp xếp query params, bỏ dấu '/' cuối path
+    """
+    if not url:
+        return url
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+
+    host = canonical_host(parts.hostname or "")
+    if not host:
+        return url
+
+    netloc = host
+    if parts.port and parts.port not in (80, 443):
+        netloc = f"{host}:{parts.port}"
+
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+
+    query_items = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not _is_tracking_param(k)]
+    query_items.sort()
+    query = urlencode(query_items, doseq=True)
+
+    return urlunsplit(("https", netloc, path, query, ""))
+
+
+class FacebookUrlCanonicalizer:
+    """
+    Canonical hóa URL Facebook để cache key, single-flight key và deduplication
+    gộp các URL tương đương về cùng một key.
+
+    - normalize: chuẩn hóa cú pháp (host, tracking params...)
+    - short link (share/, fb.watch): resolve qua cache alias được học từ
+      URL cuối cùng sau khi scrape (không tốn thêm request)
+    """
+
+    def __init__(self, alias_ttl: int = 86400, max_aliases: int = 10000):
+        self.alias_ttl = alias_ttl
+        self.max_aliases = max_aliases
+        self._aliases: "OrderedDict[str, tuple]" = OrderedDict()  # short_url -> (resolved_url, timestamp)
+        self.alias_hits = 0
+        self.alias_misses = 0
+
+    def normalize(self, url: str) -> str:
+        return normalize_facebook_url(url)
+
+    def is_short_link(self, url: str) -> bool:
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return False
+        host = (parts.hostname or "").lower()
+        if host in SHORT_LINK_HOSTS:
+            return True
+        return parts.path.startswith(SHORT_LINK_PATH_PREFIXES)
+
+    def canonicalize(self, url: str) -> str:
+        """Trả về canonical key cho URL (đã resolve short link nếu biết)"""
+        normalized = normalize_facebook_url(url)
+        if not self.is_short_link(normalized):
+            return normalized
+
+        entry = self._aliases.get(normalized)
+        if entry is None:
+            self.alias_misses += 1
+            return normalized
+
+        resolved, timestamp = entry
+        if time.time() - timestamp > self.alias_ttl:
+            self._aliases.pop(normalized, None)
+            self.alias_misses += 1
+            return normalized
+
+        self._aliases.move_to_end(normalized)
+        self.alias_hits += 1
+        return resolved
+
+    def record_resolution(self, url: str, resolved_url: Optional[str]) -> Optional[str]:
+        """
+        Ghi nhận short link -> URL đích sau khi scrape.
+        Trả về canonical URL đích nếu được ghi nhận, None nếu bỏ qua.
+        """
+        if not url or not resolved_url:
+            return None
+
+        normalized = normalize_facebook_url(url)
+        if not self.is_short_link(normalized):
+            return None
+
+        target = normalize_facebook_url(resolved_url)
+        target_parts = urlsplit(target)
+        if target_parts.hostname != CANONICAL_HOST:
+            return None
+        if target_parts.path.startswith(UNRESOLVED_PATH_PREFIXES) or target == normalized:
+            return None
+
+        self._aliases[normalized] = (target, time.time())
+        self._aliases.move_to_end(normalized)
+        while len(self._aliases) > self.max_aliases:
+            self._aliases.popitem(last=False)
+        return target
+
+    def group_urls(self, urls: List[str]) -> "OrderedDict[str, List[str]]":
+        """Gom các URL đầu vào theo canonical key (giữ thứ tự xuất hiện)"""
+        groups: "OrderedDict[str, List[str]]" = OrderedDict()
+        for url in urls:
+            key = self.canonicalize(url)
+            group = groups.setdefault(key, [])
+            if url not in group:
+                group.append(url)
+        return groups
+
+    def stats(self) -> Dict:
+        total = self.alias_hits + self.alias_misses
+        return {
+            "aliases": len(self._aliases),
+            "alias_hits": self.alias_hits,
+            "alias_misses": self.alias_misses,
+            "alias_hit_rate": self.alias_hits / total if total > 0 else 0
+        }
+
+
+# Global instance for use in other modules
+url_canonicalizer = FacebookUrlCanonicalizer()
@@ -0,0 +1,186 @@
+import os
+import re
+import sys
+import shutil
+import subprocess
+import threading
+from typing import Optional, Dict, Any, List, Set
+
+from app.config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Thư mục ffmpeg portable trong repo (bản build Windows đặt ở ffmpeg/bin)
+REPO_FFMPEG_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                               "..", "..", "..", "ffmpeg", "bin"))
+
+# Encoder ưu tiên cho từng codec, theo thứ tự (bản build khác nhau bật encoder khác nhau)
+ENCODER_PREFERENCES: Dict[str, List[str]] = {
+    "mp3": ["libmp3lame", "libshine", "mp3_mf"],
+    "aac": ["libfdk_aac", "aac", "aac_mf"],
+    "opus": ["libopus", "opus"],
+    "vorbis": ["libvorbis", "vorbis"],
+    "flac": ["flac"],
+    "pcm_s16le": ["pcm_s16le"],
+}
+# Encoder native đánh dấu experimental, cần -strict -2
+EXPERIMENTAL_ENCODERS = {"opus", "vorbis"}
+
+_VERSION_RE = re.compile(r"^(?:ffmpeg|ffprobe) version (\S+)", re.MULTILINE)
+# Dòng encoder: " A....D libmp3lame           libmp3lame MP3 (MPEG audio layer 3)"
+_ENCODER_RE = re.compile(r"^\s[VAS][F.][S.][X.][B.][D.]\s+(\w[\w-]*)", re.MULTILINE)
+
+
+def _executable(name: str) -> str:
+    return f"{name}.exe" if sys.platform == "win32" else name
+
+
+class FFmpegLocator:
+    """
+    Tìm ffmpeg/ffprobe một lần cho cả app, theo thứ tự:
+    1. Biến môi trường FFMPEG_PATH / FFPROBE_PATH (file hoặc thư mục), FFMPEG_DIR (thư mục)
+    2. Thư mục portable ffmpeg/bin trong repo
+    3. PATH của hệ thống
+    Sau đó chạy `-version` và `-encoders` một lần (cache) để biết version và encoder đã bật.
+    """
+
+    def __init__(self, search_dirs: Optional[List[str]] = None):
+        self.search_dirs = search_dirs
+        self._lock = threading.Lock()
+        self._paths: Dict[str, Optional[str]] = {}
+        self._probed = False
+        self.version: Optional[str] = None
+        self.encoders: Set[str] = set()
+        self.error: Optional[str] = None
+
+    def _candidate_dirs(self) -> List[str]:
+        if self.search_dirs is not None:
+            return list(self.search_dirs)
+        dirs = []
+        if os.getenv("FFMPEG_DIR"):
+            dirs.append(os.getenv("FFMPEG_DIR"))
+        dirs.append(REPO_FFMPEG_DIR)
+        return dirs
+
+    def find(self, name: str) -> Optional[str]:
+        """Đường dẫn tuyệt đối của `name` (ffmpeg|ffprobe), None nếu không tìm thấy"""
+        with self._lock:
+            if name in self._paths:
+                return self._paths[name]
+            path = self._resolve(name)
+            self._paths[name] = path
+        if path:
+            logger.info(f"Using {name} at {path}")
+        else:
+            logger.warning(f"{name} not found (set {name.upper()}_PATH or FFMPEG_DIR, or install it on PATH)")
+        return path
+
+    def _resolve(self, name: str) -> Optional[str]:
+        executable = _executable(name)
+        configured = os.getenv(f"{name.upper()}_PATH")
+        if configured:
+            candidate = os.path.join(configured, executable) if os.path.isdir(configured) else configured
+            if _is_executable(candidate):
+                return os.path.abspath(candidate)
+            logger.warning(f"{name.upper()}_PATH={configured} is not an executable {name}, searching elsewhere")
+
+        for directory in self._candidate_dirs():
+            candidate = os.path.join(directory, executable)
+            if _is_executable(candidate):
+                return os.path.abspath(candidate)
+
+        found = shutil.which(name)
+        return os.path.abspath(found) if found else None
+
+    @property
+    def ffmpeg_path(self) -> Optional[str]:
+        return self.find("ffmpeg")
+
+    @property
+    def ffprobe_path(self) -> Optional[str]:
+        return self.find("ffprobe")
+
+    @property
+    def ffmpeg_dir(self) -> Optional[str]:
+        """Thư mục chứa ffmpeg (cho `ffmpeg_location` của yt-dlp và PATH)"""
+        path = self.ffmpeg_path
+        return os.path.dirname(path) if path else None
+
+    # --- Capabilities ---
+    def probe(self, timeout: float = 10.0) -> Dict[str, Any]:
+        """Chạy `ffmpeg -version` và `ffmpeg -encoders` một lần; các lần sau trả kết quả đã cache"""
+        if self._probed:
+            return self.get_status()
+        path = self.ffmpeg_path
+        with self._lock:
+            if self._probed:
+                return self.get_status()
+            if path is None:
+                self.error = "ffmpeg not found"
+            else:
+                try:
+                    version_out = subprocess.run([path, "-hide_banner", "-version"], capture_output=True,
+                                                 timeout=timeout).stdout.decode("utf-8", errors="replace")
+                    match = _VERSION_RE.search(version_out)
+                    self.version = match.group(1) if match else None
+                    encoders_out = subprocess.run([path, "-hide_banner", "-encoders"], capture_output=True,
+                                                  timeout=timeout).stdout.decode("utf-8", errors="replace")
+                    self.encoders = set(_ENCODER_RE.findall(encoders_out))
+                except (OSError, subprocess.TimeoutExpired) as e:
+                    self.error = f"Failed to run {path}: {e}"
+            self._probed = True
+
+        if self.error:
+            logger.warning(f"FFmpeg unavailable: {self.error}")
+        else:
+            logger.info(f"FFmpeg {self.version} ({len(self.encoders)} encoders) at {path}")
+        return self.get_status()
+
+    @property
+    def available(self) -> bool:
+        self.probe()
+        return self.error is None
+
+    def has_encoder(self, encoder: str) -> bool:
+        self.probe()
+        return encoder in self.encoders
+
+    def pick_encoder(self, codec: str) -> str:
+        """
+        Encoder tốt nhất đang có cho `codec` (vd mp3 -> libmp3lame nếu có).
+        Không probe được (không có ffmpeg / output lạ) thì trả về tên codec để ffmpeg tự chọn encoder mặc định.
+        """
+        self.probe()
+        for encoder in ENCODER_PREFERENCES.get(codec, [codec]):
+            if encoder in self.encoders:
+                return encoder
+        return codec
+
+    def encoder_args(self, codec: str) -> List[str]:
+        """["-acodec", <encoder>] kèm -strict -2 nếu encoder native còn experimental"""
+        encoder = self.pick_encoder(codec)
+        args = ["-acodec", encoder]
+        if encoder in EXPERIMENTAL_ENCODERS:
+            args += ["-strict", "-2"]
+        return args
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "ffmpeg_path": self._paths.get("ffmpeg"),
+            "ffprobe_path": self._paths.get("ffprobe"),
+            "version": self.version,
+            "encoders": len(self.encoders),
+            "selected_encoders": {codec: self._selected(codec) for codec in ENCODER_PREFERENCES},
+            "error": self.error
+        }
+
+    def _selected(self, codec: str) -> Optional[str]:
+        return next((encoder for encoder in ENCODER_PREFERENCES[codec] if encoder in self.encoders), None)
+
+
+def _is_executable(path: str) -> bool:
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+# Global instance
+ffmpeg_locator = FFmpegLocator()
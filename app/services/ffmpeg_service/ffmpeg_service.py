@@ -1,29 +1,324 @@
 import subprocess
+import threading
+import time
 import os
+from collections import deque
+from typing import Optional, Callable, Dict, Any, List
+
+from app.config.logging_config import get_logger
+from . import metrics
+from .ffmpeg_locator import ffmpeg_locator
+
+logger = get_logger(__name__)
+
+# Các key FFmpeg ghi ra khi chạy với -progress (mỗi block kết thúc bằng progress=continue|end)
+PROGRESS_KEYS = {
+    "frame", "fps", "bitrate", "total_size", "out_time_us", "out_time_ms", "out_time",
+    "dup_frames", "drop_frames", "speed", "progress"
+}
+PROGRESS_KEYS.update(f"stream_{i}_{j}_q" for i in range(4) for j in range(4))
+
+
+class FFmpegError(Exception):
+    """FFmpeg exited with a non-zero return code"""
+
+    def __init__(self, message: str, returncode: Optional[int] = None, stderr: str = ""):
+        super().__init__(message)
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class FFmpegTimeoutError(FFmpegError):
+    """FFmpeg ran longer than the allowed timeout and was killed"""
+
+
+def _parse_progress(block: Dict[str, str]) -> Dict[str, Any]:
+    progress: Dict[str, Any] = {"progress": block.get("progress")}
+    out_time_us = block.get("out_time_us") or block.get("out_time_ms")  # out_time_ms thực ra cũng là micro giây
+    if out_time_us and out_time_us.lstrip("-").isdigit():
+        progress["out_time"] = max(0, int(out_time_us)) / 1_000_000
+    speed = (block.get("speed") or "").rstrip("x").strip()
+    try:
+        progress["speed"] = float(speed)
+    except ValueError:
+        progress["speed"] = None
+    for key in ("frame", "total_size"):
+        if (block.get(key) or "").isdigit():
+            progress[key] = int(block[key])
+    try:
+        progress["fps"] = float(block.get("fps", ""))
+    except ValueError:
+        pass
+    progress["bitrate"] = block.get("bitrate")
+    return progress
+
+
+class FFmpegProcess:
+    """
+    Một process FFmpeg đang chạy (đã giữ một slot của FFmpegService):
+    - stderr được đọc bởi thread nền: dòng -progress được parse và báo qua `on_progress`,
+      các dòng log còn lại chỉ giữ `stderr_lines` dòng cuối (ring buffer)
+    - wait(timeout) kill process khi quá hạn; slot được trả khi process kết thúc
+    """
+
+    def __init__(self, service: "FFmpegService", cmd: List[str], stdin=None, stdout=None,
+                 on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 duration: Optional[float] = None, stderr_lines: int = 100):
+        self._service = service
+        self.cmd = cmd
+        self.on_progress = on_progress
+        self.duration = duration  # độ dài media (giây) nếu biết -> progress có percent
+        self.stderr_tail: deque = deque(maxlen=stderr_lines)
+        self.last_progress: Optional[Dict[str, Any]] = None
+        self.started = time.perf_counter()
+        self.killed = False
+        self._released = False
+        # wait() (timeout) và kill() có thể chạy đồng thời trên hai thread -> chỉ trả slot một lần
+        self._finish_lock = threading.Lock()
+        self._media_seconds = 0.0
+        self.process = subprocess.Popen(cmd, stdin=stdin, stdout=stdout, stderr=subprocess.PIPE)
+        self._reader = threading.Thread(target=self._read_stderr, name="ffmpeg-stderr", daemon=True)
+        self._reader.start()
+
+    @property
+    def stdin(self):
+        return self.process.stdin
+
+    @property
+    def stdout(self):
+        return self.process.stdout
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.process.returncode
+
+    @property
+    def stderr(self) -> str:
+        return "\n".join(self.stderr_tail)
+
+    def _read_stderr(self) -> None:
+        block: Dict[str, str] = {}
+        for raw in iter(self.process.stderr.readline, b""):
+            line = raw.decode("utf-8", errors="replace").rstrip()
+            key, sep, value = line.partition("=")
+            if sep and key in PROGRESS_KEYS:
+                block[key] = value.strip()
+                if key == "progress":
+                    self._emit_progress(block)
+                    block = {}
+            elif line:
+                self.stderr_tail.append(line)
+        self.process.stderr.close()
+
+    def _emit_progress(self, block: Dict[str, str]) -> None:
+        progress = _parse_progress(block)
+        out_time = progress.get("out_time")
+        if out_time is not None:
+            metrics.increment_media_seconds(out_time - self._media_seconds)
+            self._media_seconds = max(self._media_seconds, out_time)
+            if self.duration:
+                progress["percent"] = min(100.0, round(out_time * 100.0 / self.duration, 2))
+        if progress.get("speed"):
+            metrics.update_speed(progress["speed"])
+        self.last_progress = progress
+        if self.on_progress is not None:
+            try:
+                self.on_progress(progress)
+            except Exception as e:
+                logger.debug(f"FFmpeg progress callback failed: {e}")
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """Chờ FFmpeg kết thúc; quá `timeout` giây thì kill và raise FFmpegTimeoutError"""
+        try:
+            returncode = self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._kill_process()
+            self._finish("timeout")
+            raise FFmpegTimeoutError(f"FFmpeg timed out after {timeout}s and was killed",
+                                     returncode=self.process.returncode, stderr=self.stderr)
+        self._reader.join(timeout=5)
+        if self.killed:
+            self._finish("killed")
+        else:
+            self._finish("success" if returncode == 0 else "failed")
+        return returncode
+
+    def kill(self) -> None:
+        self._kill_process()
+        self._finish("killed")
+
+    def _kill_process(self) -> None:
+        if self.process.poll() is None:
+            self.killed = True
+            self.process.kill()
+        self.process.wait()
+        self._reader.join(timeout=5)
+
+    def check(self, timeout: Optional[float] = None) -> None:
+        returncode = self.wait(timeout)
+        if returncode != 0:
+            raise FFmpegError(f"FFmpeg command failed with return code {returncode}: {self.stderr}",
+                              returncode=returncode, stderr=self.stderr)
+
+    def _finish(self, status: str) -> None:
+        with self._finish_lock:
+            if self._released:
+                return
+            self._released = True
+        metrics.increment_runs(status)
+        metrics.observe_run_duration(time.perf_counter() - self.started)
+        self._service._release()
+
 
 class FFmpegService:
-    def __init__(self):
-        # Base is the directory of this file: app/services/ffmpeg_service/
-        base = os.path.dirname(os.path.abspath(__file__))
-        # Go up two levels to get to app/ then go to ffmpeg/bin/
-        # So app/services/ffmpeg_service/ -> app/services/ -> app/ -> app/ffmpeg/bin/
-        self.ffmpeg_path = os.path.abspath(os.path.join(base, "..", "..", "..", "ffmpeg", "bin", "ffmpeg.exe"))
-        self.ffprobe_path = os.path.abspath(os.path.join(base, "..", "..", "..", "ffmpeg", "bin", "ffprobe.exe"))
+    """
+    Chạy FFmpeg với:
+    - Giới hạn số process chạy cùng lúc (`max_concurrent`, mặc định theo số core); job vượt quá
+      thì chờ slot. API là đồng bộ: caller chạy trên thread worker (job download, to_thread)
+    - Timeout cho mỗi job (kill khi quá hạn), stderr giới hạn trong ring buffer
+    - Progress từ `-progress pipe:2` báo qua callback và metrics Prometheus
+    Dùng subprocess.Popen + thread (không dùng asyncio subprocess) vì trên Windows app chạy
+    WindowsSelectorEventLoopPolicy, loop này không hỗ trợ subprocess.
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None, default_timeout: Optional[float] = 1800.0):
+        # Binary được tìm ở lần dùng đầu tiên (không tìm/ghi log lúc import module)
+        self._ffmpeg_path: Optional[str] = None
+        self._ffprobe_path: Optional[str] = None
+
+        self.max_concurrent = max_concurrent or max(1, (os.cpu_count() or 2) // 2)
+        self.default_timeout = default_timeout
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._state_lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+
+    # --- Binary ---
+    # Tìm theo env / ffmpeg/bin trong repo / PATH (không hardcode ffmpeg.exe)
+    # Không tìm thấy thì để tên trần -> lỗi rõ ràng khi chạy thay vì đường dẫn Windows sai
+    @property
+    def ffmpeg_path(self) -> str:
+        if self._ffmpeg_path is None:
+            self._ffmpeg_path = ffmpeg_locator.ffmpeg_path or "ffmpeg"
+        return self._ffmpeg_path
+
+    @ffmpeg_path.setter
+    def ffmpeg_path(self, path: str) -> None:
+        self._ffmpeg_path = path
+
+    @property
+    def ffprobe_path(self) -> str:
+        if self._ffprobe_path is None:
+            self._ffprobe_path = ffmpeg_locator.ffprobe_path or "ffprobe"
+        return self._ffprobe_path
+
+    @ffprobe_path.setter
+    def ffprobe_path(self, path: str) -> None:
+        self._ffprobe_path = path
+
+    # --- Slot ---
+    def _acquire(self) -> None:
+        with self._state_lock:
+            self.waiting += 1
+            metrics.update_waiting(self.waiting)
+        acquired = False
+        try:
+            self._slots.acquire()
+            acquired = True
+        finally:
+            with self._state_lock:
+                self.waiting -= 1
+                if acquired:
+                    self.active += 1
+                metrics.update_waiting(self.waiting)
+                metrics.update_active_processes(self.active)
+
+    def _release(self) -> None:
+        with self._state_lock:
+            self.active -= 1
+            metrics.update_active_processes(self.active)
+        self._slots.release()
+
+    def _command(self, args: list, progress: bool = True) -> List[str]:
+        cmd = [self.ffmpeg_path, "-hide_banner", "-nostats"]
+        if progress:
+            cmd += ["-progress", "pipe:2"]
+        return cmd + list(args)
+
+    # --- Sync API (gọi từ thread worker, không gọi trực tiếp trên event loop) ---
+    def popen(self, args: list, stdin=None, stdout=None,
+              on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+              duration: Optional[float] = None, stderr_lines: int = 100) -> FFmpegProcess:
+        """
+        Start FFmpeg without waiting (for piping data through stdin/stdout).
+        Chờ tới khi có slot; slot được trả khi gọi wait()/check()/kill().
+        """
+        self._acquire()
+        try:
+            return FFmpegProcess(self, self._command(args), stdin=stdin, stdout=stdout, on_progress=on_progress,
+                                 duration=duration, stderr_lines=stderr_lines)
+        except BaseException:
+            self._release()
+            raise
+
+    def run(self, args: list, timeout: Optional[float] = None,
+            on_progress: Optional[Callable[[Dict[str, Any]], None]] = None, duration: Optional[float] = None):
+        process = self.popen(args, stdout=subprocess.PIPE, on_progress=on_progress, duration=duration)
+        # stdout đọc trên thread riêng, tránh deadlock khi stdout đầy trong lúc wait()
+        stdout_chunks: List[bytes] = []
+        reader = threading.Thread(target=lambda: stdout_chunks.append(process.stdout.read()), daemon=True)
+        reader.start()
+        try:
+            process.wait(self._timeout(timeout))
+        finally:
+            reader.join(timeout=5)
+        return b"".join(stdout_chunks).decode("utf-8", errors="replace"), process.stderr
 
-    def run(self, args: list):
-        cmd = [self.ffmpeg_path] + args
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return result.stdout, result.stderr
+    def run_with_check(self, args: list, timeout: Optional[float] = None,
+                       on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                       duration: Optional[float] = None):
+        """Run FFmpeg command and raise FFmpegError if it fails"""
+        process = self.popen(args, stdout=subprocess.DEVNULL, on_progress=on_progress, duration=duration)
+        process.check(self._timeout(timeout))
+        return "", process.stderr
 
-    def run_with_check(self, args: list):
-        """Run FFmpeg command and raise exception if it fails"""
-        cmd = [self.ffmpeg_path] + args
-        result = subprocess.run(cmd, capture_output=True, text=True)
+    def probe(self, args: list, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        """
+        Chạy ffprobe (capture stdout/stderr) trong cùng giới hạn slot và metrics với FFmpeg:
+        probe file lớn/hỏng cũng tốn CPU/IO, không được chạy vượt `max_concurrent`.
+        Quá `timeout` thì ffprobe bị kill và subprocess.TimeoutExpired được raise.
+        """
+        self._acquire()
+        started = time.perf_counter()
+        status = "failed"
+        try:
+            result = subprocess.run([self.ffprobe_path] + list(args), capture_output=True,
+                                    timeout=self._timeout(timeout))
+            status = "success" if result.returncode == 0 else "failed"
+            return result
+        except subprocess.TimeoutExpired:
+            status = "timeout"
+            raise
+        finally:
+            metrics.increment_runs(status)
+            metrics.observe_run_duration(time.perf_counter() - started)
+            self._release()
 
-        if result.returncode != 0:
-            raise Exception(f"FFmpeg command failed with return code {result.returncode}: {result.stderr}")
+    def _timeout(self, timeout: Optional[float]) -> Optional[float]:
+        return timeout if timeout is not None else self.default_timeout
 
-        return result.stdout, result.stderr
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            **ffmpeg_locator.get_status(),
+            "ffmpeg_path": self.ffmpeg_path,
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "waiting": self.waiting,
+            "default_timeout": self.default_timeout
+        }
 
 
-ffmpeg_service = FFmpegService()
+ffmpeg_service = FFmpegService(
+    max_concurrent=int(os.getenv("FFMPEG_MAX_CONCURRENT", "0")) or None,
+    default_timeout=float(os.getenv("FFMPEG_TIMEOUT", "1800")) or None
+)
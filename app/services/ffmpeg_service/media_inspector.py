@@ -0,0 +1,141 @@
+import os
+import json
+import threading
+import subprocess
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+from app.config.logging_config import get_logger
+from .ffmpeg_locator import ffmpeg_locator
+from .ffmpeg_service import ffmpeg_service
+
+logger = get_logger(__name__)
+
+
+class MediaInspectionError(Exception):
+    """ffprobe could not read the file as media (corrupt / truncated / not media)"""
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _frame_rate(value: Optional[str]) -> Optional[float]:
+    # r_frame_rate dạng "30000/1001"
+    if not value or "/" not in value:
+        return _to_float(value)
+    num, den = value.split("/", 1)
+    num, den = _to_float(num), _to_float(den)
+    return round(num / den, 3) if num and den else None
+
+
+def summarize_probe(probe: Dict[str, Any]) -> Dict[str, Any]:
+    """Rút gọn output JSON của ffprobe thành các trường cần dùng"""
+    fmt = probe.get("format") or {}
+    streams = []
+    for stream in probe.get("streams") or []:
+        codec_type = stream.get("codec_type")
+        item = {
+            "index": stream.get("index"),
+            "type": codec_type,
+            "codec": stream.get("codec_name"),
+            "bit_rate": _to_int(stream.get("bit_rate")),
+            "duration": _to_float(stream.get("duration")),
+        }
+        if codec_type == "video":
+            item.update({
+                "width": stream.get("width"),
+                "height": stream.get("height"),
+                "fps": _frame_rate(stream.get("avg_frame_rate") or stream.get("r_frame_rate")),
+                "pix_fmt": stream.get("pix_fmt"),
+            })
+        elif codec_type == "audio":
+            item.update({
+                "sample_rate": _to_int(stream.get("sample_rate")),
+                "channels": stream.get("channels"),
+            })
+        streams.append(item)
+
+    video = next((s for s in streams if s["type"] == "video"), None)
+    audio = next((s for s in streams if s["type"] == "audio"), None)
+    return {
+        "format": fmt.get("format_name"),
+        "duration": _to_float(fmt.get("duration")),
+        "size": _to_int(fmt.get("size")),
+        "bit_rate": _to_int(fmt.get("bit_rate")),
+        "video_codec": video["codec"] if video else None,
+        "audio_codec": audio["codec"] if audio else None,
+        "width": video.get("width") if video else None,
+        "height": video.get("height") if video else None,
+        "streams": streams
+    }
+
+
+class MediaInspector:
+    """
+    Đọc thông tin media (duration, codec, bitrate, kích thước...) bằng ffprobe:
+    - Kết quả cache theo (path, size, mtime) -> file không đổi thì không probe lại
+    - File ffprobe không đọc được -> MediaInspectionError (dùng để phát hiện file download hỏng)
+    - Không có ffprobe thì inspect() trả về None (không chặn download)
+    - ffprobe chạy qua ffmpeg_service.probe(): chung slot `max_concurrent` và metrics với FFmpeg
+    """
+
+    def __init__(self, timeout: float = 30.0, max_entries: int = 1024):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, int, int], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return ffmpeg_locator.ffprobe_path is not None
+
+    def inspect(self, path: str) -> Optional[Dict[str, Any]]:
+        """Thông tin media của `path` (blocking, chạy trong thread worker/executor)"""
+        if ffmpeg_locator.ffprobe_path is None:
+            return None
+
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, int(stat.st_mtime_ns))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        args = ["-v", "error", "-print_format", "json", "-show_format", "-show_streams", path]
+        try:
+            result = ffmpeg_service.probe(args, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise MediaInspectionError(f"ffprobe timed out after {self.timeout}s on {path}")
+        if result.returncode != 0:
+            stderr = result.stderr.decode("utf-8", errors="replace").strip()
+            raise MediaInspectionError(f"ffprobe failed on {path}: {stderr[-500:]}")
+        try:
+            probe = json.loads(result.stdout.decode("utf-8", errors="replace") or "{}")
+        except ValueError as e:
+            raise MediaInspectionError(f"Invalid ffprobe output for {path}: {e}")
+
+        summary = summarize_probe(probe)
+        if not summary["streams"]:
+            raise MediaInspectionError(f"No media streams found in {path}")
+
+        with self._lock:
+            self._cache[key] = summary
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return summary
+
+
+# Global instance
+media_inspector = MediaInspector()
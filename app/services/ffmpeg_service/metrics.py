@@ -0,0 +1,53 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+FFMPEG_ACTIVE_PROCESSES = Gauge(
+    'ffmpeg_active_processes',
+    'Number of FFmpeg processes currently running'
+)
+
+FFMPEG_WAITING = Gauge(
+    'ffmpeg_waiting_jobs',
+    'Number of FFmpeg jobs waiting for a free process slot'
+)
+
+FFMPEG_RUNS_TOTAL = Counter(
+    'ffmpeg_runs_total',
+    'Total number of FFmpeg runs',
+    ['status']  # success|failed|timeout|killed
+)
+
+FFMPEG_RUN_DURATION = Histogram(
+    'ffmpeg_run_duration_seconds',
+    'Wall time of FFmpeg runs',
+    buckets=[0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0]
+)
+
+FFMPEG_MEDIA_SECONDS = Counter(
+    'ffmpeg_media_seconds_total',
+    'Seconds of media processed by FFmpeg (from -progress out_time)'
+)
+
+FFMPEG_SPEED = Gauge(
+    'ffmpeg_speed_ratio',
+    'Last reported FFmpeg processing speed (x realtime)'
+)
+
+
+def update_active_processes(count: int):
+    FFMPEG_ACTIVE_PROCESSES.set(count)
+
+def update_waiting(count: int):
+    FFMPEG_WAITING.set(count)
+
+def increment_runs(status: str):
+    FFMPEG_RUNS_TOTAL.labels(status=status).inc()
+
+def observe_run_duration(duration: float):
+    FFMPEG_RUN_DURATION.observe(duration)
+
+def increment_media_seconds(seconds: float):
+    if seconds > 0:
+        FFMPEG_MEDIA_SECONDS.inc(seconds)
+
+def update_speed(speed: float):
+    FFMPEG_SPEED.set(speed)
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from collections import Counter
+from typing import Optional, Dict, Any, List
+
+from app.config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+META_FILE = "meta.json"
+STAGING_DIR = ".tmp"
+
+
+class DownloadStore:
+    """
+    Kho file download theo nội dung (video ID + loại + format/quality):
+    - Mỗi artifact là một thư mục `root/<sha1(key)>/` chứa file (tên theo title) + meta.json
+    - Download ghi vào thư mục staging `root/.tmp/<key>.<uuid>/`, xong thì os.replace sang thư mục
+      đích (atomic); hai worker cùng ghi một key thì bản đến sau bị bỏ, không ai đọc thấy file dở
+    - Tổng dung lượng giới hạn bởi `max_bytes`, vượt thì xóa artifact dùng lâu nhất (LRU)
+    - Index giữ trong bộ nhớ, dựng lại từ meta.json khi khởi động; process khác ghi thì đọc từ đĩa
+    - meta.json là sidecar index của artifact: tên file, size, và thông tin media (ffprobe) nếu có
+    """
+
+    def __init__(self, root: str = "downloads/store", max_bytes: int = 10 * 1024 ** 3,
+                 staging_max_age: int = 24 * 3600):
+        self.root = Path(root)
+        self.staging_root = self.root / STAGING_DIR
+        self.max_bytes = max_bytes
+        self.staging_max_age = staging_max_age
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self._pins: Counter = Counter()  # key -> số response đang đọc file, không evict
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    # --- Key ---
+    @staticmethod
+    def make_key(video_id: str, kind: str, variant: str) -> str:
+        return hashlib.sha1(f"{video_id}|{kind}|{variant}".encode("utf-8")).hexdigest()[:24]
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    # --- Index ---
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            self.staging_root.mkdir(parents=True, exist_ok=True)
+            for entry_dir in self.root.iterdir():
+                if entry_dir.name == STAGING_DIR or not entry_dir.is_dir():
+                    continue
+                entry = self._read_entry(entry_dir.name)
+                if entry is not None:
+                    self._entries[entry_dir.name] = entry
+            self._cleanup_staging()
+            self._loaded = True
+            logger.info(f"Download store loaded: {len(self._entries)} artifacts, "
+                        f"{self._total_bytes() / 1024 ** 2:.1f}MB in {self.root}")
+
+    def _read_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        entry_dir = self._entry_dir(key)
+        meta_path = entry_dir / META_FILE
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not (entry_dir / meta.get("filename", "")).is_file():
+            return None
+        # last_access lưu bằng mtime của meta.json (touch mỗi lần hit)
+        meta["last_access"] = meta_path.stat().st_mtime
+        return meta
+
+    def _cleanup_staging(self) -> None:
+        """Xóa staging bị bỏ dở (process chết giữa chừng); chỉ xóa thư mục cũ vì process khác có thể đang ghi"""
+        now = time.time()
+        for staging in self.staging_root.iterdir():
+            try:
+                if now - staging.stat().st_mtime > self.staging_max_age:
+                    shutil.rmtree(staging, ignore_errors=True)
+            except OSError:
+                pass
+
+    def _total_bytes(self) -> int:
+        return sum(entry.get("size", 0) for entry in self._entries.values())
+
+    # --- Public API ---
+    def get(self, key: str) -> Optional[str]:
+        """Đường dẫn file đã có trong store (và đánh dấu vừa dùng), None nếu chưa có"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # Có thể do process khác ghi
+                entry = self._read_entry(key)
+                if entry is not None:
+                    self._entries[key] = entry
+            if entry is not None:
+                path = self._entry_dir(key) / entry["filename"]
+                if not path.is_file():
+                    del self._entries[key]
+                    entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            entry["last_access"] = time.time()
+        try:
+            os.utime(self._entry_dir(key) / META_FILE)
+        except OSError:
+            pass
+        return str(path)
+
+    def get_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry is not None else None
+
+    def key_for_path(self, path: str) -> Optional[str]:
+        """Key của artifact chứa `path` (None nếu file không nằm trong store)"""
+        entry_dir = Path(path).resolve().parent
+        if entry_dir.parent != self.root.resolve():
+            return None
+        return entry_dir.name
+
+    def update_meta(self, key: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Ghi thêm `fields` vào meta.json của artifact (atomic), None nếu artifact không còn"""
+        self._ensure_loaded()
+        meta_path = self._entry_dir(key) / META_FILE
+        with self._lock:
+            entry = self._entries.get(key) or self._read_entry(key)
+            if entry is None:
+                return None
+            entry.update(fields)
+            stored = {name: value for name, value in entry.items() if name != "last_access"}
+            meta_tmp = meta_path.with_name(f"{META_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+            try:
+                meta_tmp.write_text(json.dumps(stored, ensure_ascii=False), encoding="utf-8")
+                os.replace(meta_tmp, meta_path)
+            except OSError as e:
+                meta_tmp.unlink(missing_ok=True)
+                logger.warning(f"Failed to update metadata of {key}: {e}")
+            self._entries[key] = entry
+            return dict(entry)
+
+    def pin(self, key: str) -> None:
+        with self._lock:
+            self._pins[key] += 1
+
+    def unpin(self, key: str) -> None:
+        with self._lock:
+            self._pins[key] -= 1
+            if self._pins[key] <= 0:
+                del self._pins[key]
+
+    def staging_dir(self, key: str) -> str:
+        """Thư mục tạm riêng cho một lần download của `key`"""
+        self._ensure_loaded()
+        path = self.staging_root / f"{key}.{uuid.uuid4().hex[:8]}"
+        path.mkdir(parents=True, exist_ok=True)
+        return str(path)
+
+    def discard(self, staging: str) -> None:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def commit(self, key: str, staging: str, file_path: str, meta: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Đưa file đã download xong trong `staging` vào store và trả về đường dẫn cuối cùng.
+        Các file phụ trong staging (fragment, bản trước khi merge...) bị xóa.
+        """
+        self._ensure_loaded()
+        staging_path = Path(staging)
+        source = Path(file_path)
+        if source.parent.resolve() != staging_path.resolve():
+            raise ValueError(f"{file_path} is not inside staging directory {staging}")
+
+        for leftover in staging_path.iterdir():
+            if leftover.name != source.name:
+                if leftover.is_dir():
+                    shutil.rmtree(leftover, ignore_errors=True)
+                else:
+                    leftover.unlink(missing_ok=True)
+
+        entry = dict(meta or {})
+        entry.update({
+            "key": key,
+            "filename": source.name,
+            "size": source.stat().st_size,
+            "created_at": time.time()
+        })
+        meta_tmp = staging_path / f"{META_FILE}.tmp"
+        meta_tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(meta_tmp, staging_path / META_FILE)
+
+        target = self._entry_dir(key)
+        try:
+            os.replace(staging_path, target)
+        except OSError:
+            # Worker khác đã commit cùng key trước (thư mục đích không rỗng) -> dùng bản đó
+            existing = self.get(key)
+            self.discard(staging)
+            if existing is not None:
+                logger.info(f"Download store key {key} already committed, discarding duplicate")
+                return existing
+            raise
+
+        entry["last_access"] = time.time()
+        with self._lock:
+            self._entries[key] = entry
+            self._evict(protect=key)
+        logger.info(f"Stored {entry['filename']} ({entry['size'] / 1024 ** 2:.1f}MB) as {key}")
+        return str(target / source.name)
+
+    def _evict(self, protect: Optional[str] = None) -> None:
+        """Gọi khi đang giữ lock; không xóa artifact vừa commit kể cả khi một mình nó vượt quota"""
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1].get("last_access", 0)):
+            if total <= self.max_bytes:
+                break
+            if key == protect or key in self._pins:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            del self._entries[key]
+            total -= entry.get("size", 0)
+            self.stats["evictions"] += 1
+            logger.info(f"Evicted {entry.get('filename')} ({key}) from download store")
+
+    def remove(self, key: str) -> bool:
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        return entry is not None
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        self._ensure_loaded()
+        with self._lock:
+            return sorted((dict(entry) for entry in self._entries.values()),
+                          key=lambda entry: entry.get("last_access", 0), reverse=True)
+
+    def get_status(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                "root": str(self.root),
+                "artifacts": len(self._entries),
+                "total_bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+                **self.stats
+            }
+
+
+# Global instance
+download_store = DownloadStore(
+    root=os.getenv("YOUTUBE_STORE_DIR", "downloads/store"),
+    max_bytes=int(os.getenv("YOUTUBE_STORE_MAX_BYTES", str(10 * 1024 ** 3)))
+)
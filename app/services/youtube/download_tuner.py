@@ -0,0 +1,200 @@
+import os
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator
+
+from app.config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MB = 1024 * 1024
+
+
+class DownloadSession:
+    """
+    Thông số của một lần download (chọn lúc bắt đầu) + đo throughput thực tế từ progress hook.
+    `ratelimit` được chia lại khi có download khác bắt đầu / kết thúc (qua params của YoutubeDL đã bind).
+    """
+
+    def __init__(self, fragments: int, chunk_size: int, ffmpeg_threads: int, ratelimit: Optional[int]):
+        self.fragments = fragments
+        self.chunk_size = chunk_size
+        self.ffmpeg_threads = ffmpeg_threads
+        self.ratelimit = ratelimit
+        self._params: Optional[dict] = None
+        self._files: Dict[str, int] = {}
+        self._first_at: Optional[float] = None
+        self._last_at: Optional[float] = None
+        self.fragmented = False  # format HLS/DASH theo fragment (https thường chỉ dùng một kết nối)
+
+    def apply(self, opts: dict) -> dict:
+        """
+        Ghi thông số vào options yt-dlp. Tuner là nguồn duy nhất của các key: concurrent_fragment_downloads,
+        http_chunk_size, ratelimit và postprocessor_args["ffmpeg"] (yt-dlp nối thêm vào args riêng
+        của từng postprocessor, vd. "ffmpegextractaudio"; các key riêng đó được giữ nguyên)
+        """
+        opts["concurrent_fragment_downloads"] = self.fragments
+        opts["http_chunk_size"] = self.chunk_size
+        postprocessor_args = dict(opts.get("postprocessor_args") or {})
+        postprocessor_args["ffmpeg"] = self.ffmpeg_args()
+        opts["postprocessor_args"] = postprocessor_args
+        if self.ratelimit:
+            opts["ratelimit"] = self.ratelimit
+        return opts
+
+    def ffmpeg_args(self) -> list:
+        """Args giới hạn thread cho FFmpeg gọi trực tiếp (không qua postprocessor của yt-dlp)"""
+        return ["-threads", str(self.ffmpeg_threads)]
+
+    def bind(self, params: dict) -> None:
+        """params của YoutubeDL đang chạy: downloader đọc `ratelimit` từ đây ở mỗi block"""
+        self._params = params
+
+    def _set_ratelimit(self, ratelimit: Optional[int]) -> None:
+        self.ratelimit = ratelimit
+        if self._params is not None:
+            if ratelimit:
+                self._params["ratelimit"] = ratelimit
+            else:
+                self._params.pop("ratelimit", None)
+
+    def progress_hook(self, d: Dict[str, Any]) -> None:
+        if d.get("status") not in ("downloading", "finished") or "postprocessor" in d:
+            return
+        now = time.monotonic()
+        if self._first_at is None:
+            self._first_at = now
+        self._last_at = now
+        if d.get("fragment_count"):
+            self.fragmented = True
+        filename = d.get("filename") or d.get("tmpfilename") or ""
+        self._files[filename] = d.get("downloaded_bytes") or d.get("total_bytes") or 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fragments": self.fragments,
+            "chunk_size": self.chunk_size,
+            "ffmpeg_threads": self.ffmpeg_threads,
+            "ratelimit": self.ratelimit
+        }
+
+    @property
+    def downloaded_bytes(self) -> int:
+        return sum(self._files.values())
+
+    def throughput(self) -> Optional[float]:
+        """Bytes/giây trong lúc tải (không tính thời gian merge/convert); None nếu mẫu quá nhỏ"""
+        if self._first_at is None or self._last_at is None:
+            return None
+        elapsed = self._last_at - self._first_at
+        if elapsed < 1.0 or self.downloaded_bytes < MB:
+            return None
+        return self.downloaded_bytes / elapsed
+
+
+class DownloadTuner:
+    """
+    Chọn số fragment song song, http_chunk_size và số thread FFmpeg cho mỗi download dựa trên:
+    - Throughput đo được của các download trước (EWMA, tính theo mỗi kết nối)
+    - Số download đang chạy cùng lúc (chia `max_connections` và CPU cho FFmpeg)
+    - Băng thông tổng `bandwidth_limit` (bytes/s, 0 = không giới hạn) chia đều cho các download đang chạy
+    """
+
+    def __init__(self, bandwidth_limit: int = 0, max_connections: int = 16, max_fragments: int = 8,
+                 default_fragments: int = 3, default_chunk_size: int = 10 * MB, min_chunk_size: int = 2 * MB,
+                 max_chunk_size: int = 32 * MB, chunk_seconds: float = 5.0, smoothing: float = 0.3):
+        self.bandwidth_limit = bandwidth_limit
+        self.max_connections = max_connections
+        self.max_fragments = max_fragments
+        self.default_fragments = default_fragments
+        self.default_chunk_size = default_chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.chunk_seconds = chunk_seconds  # mỗi request Range nên mất khoảng chừng này giây
+        self.smoothing = smoothing
+        self.connection_throughput: Optional[float] = None  # EWMA bytes/s của một kết nối
+        self.completed = 0
+        self._sessions = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self) -> Iterator[DownloadSession]:
+        session = self._open()
+        try:
+            yield session
+        finally:
+            self._close(session)
+
+    def _share(self, active: int) -> Optional[int]:
+        return self.bandwidth_limit // active if self.bandwidth_limit else None
+
+    def _profile(self, active: int) -> DownloadSession:
+        """Gọi khi đang giữ lock; `active` đã tính cả download sắp bắt đầu"""
+        share = self._share(active)
+        connection_cap = max(1, min(self.max_fragments, self.max_connections // active))
+        per_connection = self.connection_throughput
+
+        if per_connection is None:
+            fragments = min(self.default_fragments, connection_cap)
+            chunk_size = self.default_chunk_size
+        else:
+            # Có giới hạn băng thông: chỉ mở đủ kết nối để dùng hết phần được chia
+            fragments = connection_cap if share is None else math.ceil(share / per_connection)
+            fragments = max(1, min(fragments, connection_cap))
+            expected = per_connection if share is None else min(per_connection, share / fragments)
+            chunk_size = int(expected * self.chunk_seconds) // MB * MB
+            chunk_size = max(self.min_chunk_size, min(self.max_chunk_size, chunk_size))
+
+        ffmpeg_threads = max(1, min(8, (os.cpu_count() or 2) // active))
+        return DownloadSession(fragments, chunk_size, ffmpeg_threads, share)
+
+    def _open(self) -> DownloadSession:
+        with self._lock:
+            session = self._profile(len(self._sessions) + 1)
+            self._sessions.add(session)
+            self._rebalance()
+        logger.debug(f"Download profile: {session.fragments} fragments, {session.chunk_size // MB}MB chunks, "
+                     f"{session.ffmpeg_threads} ffmpeg threads, ratelimit {session.ratelimit}")
+        return session
+
+    def _close(self, session: DownloadSession) -> None:
+        measured = session.throughput()
+        with self._lock:
+            self._sessions.discard(session)
+            self._rebalance()
+            if measured is not None:
+                # Download bị giới hạn bởi ratelimit thì throughput mỗi kết nối bị đánh giá thấp
+                # -> chỉ học từ download không chạm ratelimit
+                if not session.ratelimit or measured < session.ratelimit * 0.9:
+                    connections = session.fragments if session.fragmented else 1
+                    sample = measured / max(1, connections)
+                    self.connection_throughput = sample if self.connection_throughput is None else (
+                        self.smoothing * sample + (1 - self.smoothing) * self.connection_throughput)
+                self.completed += 1
+
+    def _rebalance(self) -> None:
+        """Chia lại băng thông cho các download đang chạy (gọi khi đang giữ lock)"""
+        share = self._share(len(self._sessions)) if self._sessions else None
+        for session in self._sessions:
+            session._set_ratelimit(share)
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            active = len(self._sessions)
+            return {
+                "active_downloads": active,
+                "bandwidth_limit": self.bandwidth_limit or None,
+                "bandwidth_share": self._share(active) if active else None,
+                "connection_throughput": round(self.connection_throughput) if self.connection_throughput else None,
+                "completed_samples": self.completed,
+                "next_profile": self._profile(active + 1).to_dict()
+            }
+
+
+# Global instance
+download_tuner = DownloadTuner(
+    bandwidth_limit=int(os.getenv("YOUTUBE_BANDWIDTH_LIMIT", "0")),
+    max_connections=int(os.getenv("YOUTUBE_MAX_CONNECTIONS", "16"))
+)
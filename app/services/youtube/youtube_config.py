@@ -3,6 +3,9 @@ Enhanced configuration for yt-dlp to avoid JavaScript runtime warnings,
 reduce SABR-related issues, and improve overall YouTube download stability.
 """
 
+from app.services.ffmpeg_service.ffmpeg_locator import ffmpeg_locator
+
+
 class YouTubeConfig:
 
     @staticmethod
@@ -34,7 +37,7 @@ class YouTubeConfig:
             }
         }
 
-        return {
+        opts = {
             "extractor_args": extractor_args,
             "quiet": True,
             "no_warnings": False,  # Keep warnings to identify potential issues
@@ -50,19 +53,18 @@ class YouTubeConfig:
             "fragment_retries": 20,
             "file_access_retries": 15,
             "buffersize": 1024 * 1024,  # 1MB buffer
-            "http_chunk_size": 10485760,  # 10MB chunk size for better performance
+            # http_chunk_size, concurrent_fragment_downloads, ratelimit và thread FFmpeg
+            # (postprocessor_args["ffmpeg"]) do download_tuner đặt cho từng download
             "extractor_retries": 5,
-            "sleep_interval_requests": 1,  # Small delay between requests
-            "max_sleep_interval": 3,
-            "concurrent_fragment_downloads": 3,  # Download multiple fragments concurrently
             # Additional performance options
             "skip_unavailable_fragments": True,
             "keep_fragments": False,
-            "postprocessor_args": {
-                'ffmpeg': ['-threads', '2']  # Use 2 threads for ffmpeg processing
-            },
             "compat_opts": ["no-live-chat"],  # Skip live chat for faster processing
         }
+        # ffmpeg cho merge / extract audio (không phụ thuộc PATH của process)
+        if ffmpeg_locator.ffmpeg_dir:
+            opts["ffmpeg_location"] = ffmpeg_locator.ffmpeg_dir
+        return opts
 
     # ---------------------------------------------------------
     # VIDEO ONLY
@@ -147,8 +149,10 @@ class YouTubeConfig:
                     "preferredquality": YouTubeConfig._get_audio_quality(audio_format),
                 }
             ],
+            # Key phải viết thường; yt-dlp nối args của "ffmpegextractaudio" với "ffmpeg"
+            # (-threads do download_tuner thêm vào) cho FFmpegExtractAudio
             "postprocessor_args": {
-                'FFmpegExtractAudio': YouTubeConfig._get_audio_encoder_args(audio_format)
+                'ffmpegextractaudio': YouTubeConfig._get_audio_encoder_args(audio_format)
             },
             # Skip video download when possible
             "extractaudio": True,  # This forces audio extraction
@@ -204,6 +208,26 @@ class YouTubeConfig:
         })
         return base_opts
 
+    # ---------------------------------------------------------
+    # PIPE AUDIO SOURCE (audio extraction fallback, không ghi video tạm)
+    # ---------------------------------------------------------
+    @staticmethod
+    def get_pipe_audio_source_options():
+        """
+        Chọn một format duy nhất (không merge) nhỏ nhất có audio để pipe thẳng vào FFmpeg.
+        Ưu tiên format tải bằng HTTP thường; HLS/DASH để FFmpeg tự đọc URL.
+        """
+        base_opts = YouTubeConfig.get_base_options()
+        base_opts.update({
+            "format": (
+                "worst[acodec!=none][protocol=https]/"
+                "worst[acodec!=none][protocol=http]/"
+                "worst[acodec!=none]/"
+                "worst"
+            ),
+        })
+        return base_opts
+
     # ---------------------------------------------------------
     # CUSTOM FORMAT OPTIONS
     # ---------------------------------------------------------
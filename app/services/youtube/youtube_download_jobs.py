@@ -0,0 +1,400 @@
+import os
+import re
+import time
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, AsyncGenerator
+
+import yt_dlp
+from app.services.youtube.youtube_download_service import YouTubeDownloadService
+from app.utils.youtube_parser import extract_youtube_id
+from app.config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+KIND_VIDEO = "video"
+KIND_AUDIO = "audio"
+
+# File thành phần khi merge video + audio: "<title>.f137.mp4", "<title>.f251-drc.webm"
+_FORMAT_COMPONENT = re.compile(r"\.f\d+(-\w+)?\.\w+$")
+
+
+class DownloadQueueFullError(Exception):
+    """Số job đang chờ + đang chạy đã chạm giới hạn"""
+
+
+class DownloadJob:
+    """
+    Một lần download YouTube chạy nền.
+    Progress được cập nhật từ progress hook của yt-dlp (chạy trên thread worker).
+    """
+
+    def __init__(self, url: str, key: Tuple, kind: str, quality: Optional[str] = None,
+                 mode: Optional[str] = None, audio_format: Optional[str] = None):
+        self.id = str(uuid.uuid4())
+        self.url = url
+        self.key = key
+        self.video_id = key[0]
+        self.kind = kind
+        self.quality = quality
+        self.mode = mode
+        self.audio_format = audio_format
+        self.status = JOB_QUEUED
+        self.phase: Optional[str] = None  # downloading|postprocessing
+        self.error: Optional[str] = None
+        self.file_path: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # filename -> (downloaded_bytes, total_bytes); merged = video + audio là 2 file
+        self.files: Dict[str, Tuple[int, Optional[int]]] = {}
+        self.speed: Optional[float] = None
+        self.eta: Optional[float] = None
+        self.postprocessor: Optional[str] = None
+        self.current_file: Optional[str] = None     # file yt-dlp đang tải (tên sau khi xong)
+        self.current_tmpfile: Optional[str] = None  # file .part tương ứng
+        self.cancel_event = threading.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    # --- Chạy trên thread worker ---
+    def progress_hook(self, d: Dict[str, Any]) -> None:
+        if self.cancel_event.is_set():
+            # yt-dlp dừng download/postprocess ở lần gọi hook kế tiếp
+            raise yt_dlp.utils.DownloadCancelled(f"Download job {self.id} cancelled")
+
+        if "postprocessor" in d:
+            self.phase = "postprocessing"
+            self.postprocessor = d.get("postprocessor")
+            return
+
+        filename = d.get("filename") or d.get("tmpfilename") or ""
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        if d.get("status") == "downloading":
+            self.phase = "downloading"
+            self.current_file = d.get("filename")
+            self.current_tmpfile = d.get("tmpfilename")
+            self.files[filename] = (d.get("downloaded_bytes") or 0, total)
+            self.speed = d.get("speed")
+            self.eta = d.get("eta")
+        elif d.get("status") == "finished":
+            downloaded = d.get("downloaded_bytes") or d.get("total_bytes") or 0
+            self.files[filename] = (downloaded, total or downloaded)
+
+    @property
+    def expected_ext(self) -> Optional[str]:
+        if self.kind == KIND_AUDIO:
+            return (self.audio_format or "mp3").lower()
+        return "mp4" if self.mode == "merged" else None
+
+    def progressive_source(self) -> Optional[Tuple[str, str]]:
+        """
+        (file .part, file cuối cùng) nếu file đang tải chính là kết quả cuối cùng,
+        tức là không phải một thành phần để merge và không cần convert -> stream được khi đang tải
+        """
+        filename = self.current_file
+        if not filename or _FORMAT_COMPONENT.search(filename):
+            return None
+        expected = self.expected_ext
+        if expected and not filename.lower().endswith("." + expected):
+            return None
+        return self.current_tmpfile or filename, filename
+
+    @property
+    def downloaded_bytes(self) -> int:
+        return sum(downloaded for downloaded, _ in self.files.values())
+
+    @property
+    def total_bytes(self) -> Optional[int]:
+        totals = [total for _, total in self.files.values()]
+        if not totals or any(total is None for total in totals):
+            return None
+        return sum(totals)
+
+    @property
+    def progress(self) -> float:
+        if self.status == JOB_COMPLETED:
+            return 1.0
+        total = self.total_bytes
+        if not total:
+            return 0.0
+        # Chưa tới 1.0 trước khi merge/postprocess xong
+        return min(0.99, self.downloaded_bytes / total)
+
+    def to_status(self, queue_position: Optional[int] = None) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "phase": self.phase,
+            "url": self.url,
+            "video_id": self.video_id,
+            "kind": self.kind,
+            "quality": self.quality,
+            "mode": self.mode,
+            "audio_format": self.audio_format,
+            "progress": round(self.progress, 4),
+            "downloaded_bytes": self.downloaded_bytes,
+            "total_bytes": self.total_bytes,
+            "speed": self.speed,
+            "eta_seconds": self.eta,
+            "postprocessor": self.postprocessor,
+            "queue_position": queue_position,
+            "file_path": self.file_path,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed": elapsed,
+            "error": self.error
+        }
+
+
+class YouTubeDownloadJobManager:
+    """
+    Hàng đợi download YouTube:
+    - Thread pool riêng `max_workers` thread (không tranh default executor với các tác vụ khác)
+    - Job vượt quá số worker nằm ở trạng thái queued; quá `max_pending` job thì từ chối
+    - Cùng (video, kind, quality/format, mode) đang chạy hoặc đã xong (file còn tồn tại) -> trả về job cũ
+    - Hủy job: job đang chờ bị bỏ khỏi hàng đợi, job đang chạy dừng ở progress hook kế tiếp
+    - Job đã xong bị xóa sau `job_ttl` giây (dọn định kỳ mỗi `cleanup_interval` giây và khi đọc)
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 50, job_ttl: int = 3600,
+                 cleanup_interval: float = 300.0):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self.cleanup_interval = cleanup_interval
+        self.jobs: Dict[str, DownloadJob] = {}
+        self._by_key: Dict[Tuple, DownloadJob] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="yt-download")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._cleanup_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def make_key(url: str, kind: str, quality: Optional[str] = None, mode: Optional[str] = None,
+                 audio_format: Optional[str] = None) -> Tuple:
+        video_id = extract_youtube_id(url) or url
+        if kind == KIND_AUDIO:
+            return (video_id, kind, (audio_format or "mp3").lower())
+        return (video_id, kind, quality, mode)
+
+    def submit(self, url: str, kind: str = KIND_VIDEO, quality: Optional[str] = "720p",
+               mode: Optional[str] = "merged", audio_format: Optional[str] = "mp3") -> DownloadJob:
+        self._cleanup_expired()
+        if kind == KIND_AUDIO:
+            quality = mode = None
+        else:
+            audio_format = None
+        key = self.make_key(url, kind, quality, mode, audio_format)
+
+        existing = self._by_key.get(key)
+        if existing is not None and self._reusable(existing):
+            logger.info(f"Reusing download job {existing.id} for {key}")
+            return existing
+
+        active = sum(1 for job in self.jobs.values() if job.status not in FINISHED_STATUSES)
+        if active >= self.max_pending:
+            raise DownloadQueueFullError(f"Too many download jobs in progress ({active})")
+
+        job = DownloadJob(url, key, kind, quality=quality, mode=mode, audio_format=audio_format)
+        self.jobs[job.id] = job
+        self._by_key[key] = job
+        job.task = asyncio.create_task(self._run(job))
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+        logger.info(f"Submitted download job {job.id} ({kind}) for {url}")
+        return job
+
+    def _reusable(self, job: DownloadJob) -> bool:
+        if job.status in (JOB_QUEUED, JOB_RUNNING):
+            return True
+        return job.status == JOB_COMPLETED and bool(job.file_path) and Path(job.file_path).exists()
+
+    def get(self, job_id: str) -> Optional[DownloadJob]:
+        self._cleanup_expired()
+        return self.jobs.get(job_id)
+
+    def status(self, job: DownloadJob) -> Dict[str, Any]:
+        return job.to_status(self.queue_position(job))
+
+    def queue_position(self, job: DownloadJob) -> Optional[int]:
+        if job.status != JOB_QUEUED:
+            return None
+        queued = [j for j in self.jobs.values() if j.status == JOB_QUEUED]
+        queued.sort(key=lambda j: j.created_at)
+        return queued.index(job)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        self._cleanup_expired()
+        return [self.status(job) for job in self.jobs.values()]
+
+    async def wait(self, job: DownloadJob) -> str:
+        """
+        Chờ job xong và trả về file_path.
+        Dùng shield: client ngắt kết nối không hủy job (có thể còn request khác đang chờ cùng job).
+        """
+        if job.task is not None and not job.task.done():
+            try:
+                await asyncio.shield(job.task)
+            except asyncio.CancelledError:
+                if job.status != JOB_CANCELLED:
+                    raise
+        if job.status == JOB_COMPLETED:
+            return job.file_path
+        if job.status == JOB_CANCELLED:
+            raise RuntimeError(f"Download job {job.id} was cancelled")
+        raise RuntimeError(job.error or f"Download job {job.id} failed")
+
+    async def wait_for_source(self, job: DownloadJob, poll_interval: float = 0.25) -> Optional[Tuple[str, str]]:
+        """
+        Chờ tới khi biết có stream được trong lúc tải hay không:
+        trả về progressive_source() khi yt-dlp bắt đầu ghi file, None khi phải chờ job xong
+        """
+        while job.status not in FINISHED_STATUSES:
+            if job.phase == "postprocessing":
+                return None
+            if job.current_file:
+                return job.progressive_source()
+            await asyncio.sleep(poll_interval)
+        return None
+
+    async def iter_progressive(self, job: DownloadJob, chunk_size: int = 1024 * 1024,
+                               poll_interval: float = 0.25) -> AsyncGenerator[bytes, None]:
+        """
+        Stream file khi đang tải: đọc tiếp phần .part đã ghi, hết dữ liệu thì chờ thêm.
+        Mỗi lần đọc mở lại file theo offset (file .part bị rename khi xong, rồi được
+        chuyển vào download store) -> không giữ handle chặn rename trên Windows.
+        """
+        source = job.progressive_source()
+        if source is None:
+            raise RuntimeError(f"Download job {job.id} cannot be streamed while downloading")
+        tmpfile, filename = source
+        offset = 0
+        while True:
+            candidates = [path for path in (job.file_path, tmpfile, filename) if path]
+            chunk = await asyncio.to_thread(_read_chunk, candidates, offset, chunk_size)
+            if chunk:
+                offset += len(chunk)
+                yield chunk
+                continue
+            if job.status == JOB_COMPLETED and job.file_path:
+                if offset >= os.path.getsize(job.file_path):
+                    return
+                continue
+            if job.status in (JOB_FAILED, JOB_CANCELLED):
+                # Ngắt stream giữa chừng -> client thấy response bị cắt, không nhận file hỏng như file đủ
+                raise RuntimeError(job.error or f"Download job {job.id} {job.status}")
+            await asyncio.sleep(poll_interval)
+
+    async def cancel(self, job_id: str) -> Optional[DownloadJob]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        if job.task and not job.task.done():
+            job.task.cancel()
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                pass
+        if job.status not in FINISHED_STATUSES:
+            job.status = JOB_CANCELLED
+            job.finished_at = time.time()
+        return job
+
+    async def shutdown(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+        for job_id in list(self.jobs.keys()):
+            await self.cancel(job_id)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, job: DownloadJob) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        loop = asyncio.get_running_loop()
+        future = None
+        try:
+            async with self._semaphore:
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+                if job.kind == KIND_AUDIO:
+                    future = loop.run_in_executor(self._executor, YouTubeDownloadService._download_audio_sync,
+                                                  job.url, job.audio_format, job.progress_hook)
+                else:
+                    future = loop.run_in_executor(self._executor, YouTubeDownloadService._download_video_sync,
+                                                  job.url, job.quality, job.mode, job.progress_hook)
+                # shield: cancel task không hủy luôn future của executor (vẫn cần chờ worker dừng bên dưới)
+                job.file_path = await asyncio.shield(future)
+                job.status = JOB_COMPLETED
+                logger.info(f"Download job {job.id} completed: {job.file_path}")
+        except asyncio.CancelledError:
+            job.cancel_event.set()
+            if future is not None:
+                # Giữ worker tới khi yt-dlp thực sự dừng ở progress hook (không chạy quá max_workers)
+                try:
+                    await asyncio.shield(future)
+                except BaseException:
+                    pass
+            job.status = JOB_CANCELLED
+            logger.info(f"Download job {job.id} cancelled")
+            raise
+        except yt_dlp.utils.DownloadCancelled:
+            job.status = JOB_CANCELLED
+            logger.info(f"Download job {job.id} cancelled")
+        except Exception as e:
+            logger.error(f"Download job {job.id} failed: {str(e)}")
+            job.status = JOB_FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    async def _cleanup_loop(self) -> None:
+        """Dọn job hết hạn định kỳ kể cả khi không có request nào; dừng khi không còn job"""
+        while self.jobs:
+            await asyncio.sleep(self.cleanup_interval)
+            self._cleanup_expired()
+
+    def _cleanup_expired(self) -> None:
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.status in FINISHED_STATUSES and job.finished_at
+                   and now - job.finished_at > self.job_ttl]
+        for job_id in expired:
+            job = self.jobs.pop(job_id)
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+        if expired:
+            logger.info(f"Removed {len(expired)} expired download jobs")
+
+
+def _read_chunk(paths: List[str], offset: int, size: int) -> bytes:
+    """Đọc từ file đầu tiên còn tồn tại trong `paths` (file có thể bị rename giữa các lần đọc)"""
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return f.read(size)
+        except FileNotFoundError:
+            continue
+    return b""
+
+
+# Global instance
+download_job_manager = YouTubeDownloadJobManager(
+    max_workers=int(os.getenv("YOUTUBE_DOWNLOAD_WORKERS", "2")),
+    max_pending=int(os.getenv("YOUTUBE_DOWNLOAD_MAX_PENDING", "50"))
+)
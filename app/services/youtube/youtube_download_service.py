@@ -1,72 +1,165 @@
-import os
 import re
-import asyncio
+import subprocess
 import yt_dlp
 from pathlib import Path
 from app.services.ffmpeg_service.ffmpeg_service import ffmpeg_service
+from app.services.ffmpeg_service.ffmpeg_locator import ffmpeg_locator
+from app.services.ffmpeg_service.media_inspector import media_inspector, MediaInspectionError
 from app.services.youtube.youtube_config import YouTubeConfig
+from app.services.youtube.youtube_info_cache import youtube_info_cache
+from app.services.youtube.download_store import download_store
+from app.services.youtube.download_tuner import download_tuner
+from app.utils.youtube_parser import extract_youtube_id
 from app.config.logging_config import get_logger
-import datetime
+from typing import Optional, Callable
 
 logger = get_logger(__name__)
 
 class YouTubeDownloadService:
-    # --- FFmpeg Portable ---
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    FFMPEG_DIR = os.path.join(BASE_DIR,"..","..","..", "ffmpeg", "bin")  # thư mục có ffmpeg.exe
-
     # --- Fix lỗi filename Windows ---
     @staticmethod
     def safe_filename(name: str) -> str:
         return re.sub(r'[\\/*?:"<>|]', "", name)
 
-    # ============================================================
-    # DOWNLOAD VIDEO PUBLIC API
-    # ============================================================
+    # --- Info dict dùng chung: extract một lần, mỗi lần download chỉ process lại ---
+    @staticmethod
+    def _extract_info(url: str) -> dict:
+        try:
+            return youtube_info_cache.extract(url)
+        except Exception as e:
+            logger.error(f"Failed to extract info for {url}: {str(e)}")
+            # Trả về lỗi nếu không lấy được thông tin
+            raise ValueError(f"Could not get video information for {url}") from e
+
     @staticmethod
-    async def download_video(url: str, quality: str = "720p", mode: str = "merged") -> str:
+    def _process_download(info: dict, opts: dict, progress_hook: Optional[Callable] = None) -> dict:
         """
-        mode:
-            - "video":   chỉ video, không audio
-            - "merged":  video + audio (có âm thanh)
+        Tải từ info đã extract (không gọi lại InnerTube/player).
+        Số fragment song song, chunk size, thread FFmpeg và ratelimit do download_tuner chọn theo
+        throughput đo được và số download đang chạy.
         """
-        return await asyncio.get_event_loop().run_in_executor(
-            None,
-            YouTubeDownloadService._download_video_sync,
-            url, quality, mode
-        )
+        with download_tuner.session() as tuning:
+            tuning.apply(opts)
+            opts["progress_hooks"] = [tuning.progress_hook]
+            if progress_hook is not None:
+                # Cùng một hook nhận cả progress download lẫn postprocessor (merge, extract audio)
+                opts["progress_hooks"].append(progress_hook)
+                opts["postprocessor_hooks"] = [progress_hook]
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                tuning.bind(ydl.params)
+                return ydl.process_ie_result(info, download=True)
 
-    # --- WORKER ---
     @staticmethod
-    def _download_video_sync(url: str, quality: str, mode: str) -> str:
-        logger.info(f"Starting video download: {url}, quality: {quality}, mode: {mode}")
-        Path("downloads").mkdir(exist_ok=True)
+    def _downloaded_path(info: dict, expected_path: str) -> str:
+        """Đường dẫn file cuối cùng (sau merge/postprocess) do yt-dlp báo lại"""
+        for download in info.get("requested_downloads") or []:
+            filepath = download.get("filepath")
+            if filepath and Path(filepath).exists():
+                return filepath
+        return expected_path
 
-        # =========================================================
-        # 1. TRÍCH XUẤT THÔNG TIN VIDEO ĐỂ LẤY TÊN (TITLE)
-        # =========================================================
+    @staticmethod
+    def _stored_download(url: str, kind: str, variant: str, download_fn: Callable[[dict, str], str]) -> str:
+        """
+        File đã có trong download store (video ID + kind + variant) thì trả về ngay,
+        chưa có thì download_fn(info, staging_dir) tải vào thư mục staging rồi commit vào store
+        """
+        video_id = extract_youtube_id(url)
+        info = None
+        if video_id is None:
+            info = YouTubeDownloadService._extract_info(url)
+            video_id = info.get("id") or url
+
+        key = download_store.make_key(video_id, kind, variant)
+        cached = download_store.get(key)
+        if cached is not None:
+            logger.info(f"Serving {url} ({kind}, {variant}) from download store: {cached}")
+            return cached
+
+        if info is None:
+            info = YouTubeDownloadService._extract_info(url)
+        staging = download_store.staging_dir(key)
         try:
-            temp_opts = {"quiet": True}  # Dùng tùy chọn cơ bản để lấy info
-            with yt_dlp.YoutubeDL(temp_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-        except Exception as e:
-            logger.error(f"Failed to extract info for {url}: {str(e)}")
-            # Trả về lỗi nếu không lấy được thông tin
-            raise ValueError(f"Could not get video information for {url}") from e
+            file_path = download_fn(info, staging)
+            # Kiểm tra file trước khi commit (file hỏng không vào store), thông tin media lưu vào meta.json
+            media = YouTubeDownloadService._inspect_output(file_path, kind)
+            return download_store.commit(key, staging, file_path, {
+                "video_id": video_id,
+                "kind": kind,
+                "variant": variant,
+                "title": info.get("title"),
+                "url": url,
+                "media": media
+            })
+        finally:
+            # Commit thành công thì staging đã được rename, lỗi thì dọn file dở
+            download_store.discard(staging)
+
+    @staticmethod
+    def _inspect_output(file_path: str, kind: str) -> Optional[dict]:
+        """ffprobe file vừa tải: không đọc được / thiếu stream cần thiết thì raise; không có ffprobe thì None"""
+        if not Path(file_path).is_file():
+            raise FileNotFoundError(f"Downloaded file not found: {file_path}")
+        try:
+            media = media_inspector.inspect(file_path)
+        except MediaInspectionError as e:
+            raise ValueError(f"Downloaded file is not valid media: {e}") from e
+        if media is None:
+            return None
+        required = "audio_codec" if kind == "audio" else "video_codec"
+        if not media.get(required):
+            raise ValueError(f"Downloaded file has no {kind} stream: {file_path}")
+        return media
 
-        datetime_opts = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    @staticmethod
+    def media_info(file_path: str) -> Optional[dict]:
+        """
+        Thông tin media của file đã tải: đọc từ meta.json của store (không probe lại),
+        artifact cũ chưa có thì probe một lần rồi ghi bổ sung vào meta.json
+        """
+        key = download_store.key_for_path(file_path)
+        meta = download_store.get_meta(key) if key is not None else None
+        if meta is not None and meta.get("media"):
+            return meta["media"]
+        try:
+            media = media_inspector.inspect(file_path)
+        except MediaInspectionError as e:
+            logger.warning(f"Failed to inspect {file_path}: {str(e)}")
+            return None
+        if media is not None and meta is not None:
+            download_store.update_meta(key, {"media": media})
+        return media
+
+    # ============================================================
+    # DOWNLOAD VIDEO
+    # Gọi từ thread worker của download_job_manager (hàng đợi, gộp request trùng, hủy được)
+    # ============================================================
+    @staticmethod
+    def _download_video_sync(url: str, quality: str, mode: str, progress_hook: Optional[Callable] = None) -> str:
+        logger.info(f"Starting video download: {url}, quality: {quality}, mode: {mode}")
+        return YouTubeDownloadService._stored_download(
+            url, "video", f"{mode}-{quality}",
+            lambda info, out_dir: YouTubeDownloadService._download_video_to(
+                info, url, quality, mode, out_dir, progress_hook)
+        )
 
-        # Lấy tên file an toàn
-        safe_title = datetime_opts +"_"+ YouTubeDownloadService.safe_filename(info.get("title", url.split("v=")[-1]))
+    @staticmethod
+    def _download_video_to(info: dict, url: str, quality: str, mode: str, out_dir: str,
+                           progress_hook: Optional[Callable] = None) -> str:
+        # =========================================================
+        # 1. INFO ĐÃ TRÍCH XUẤT (một lần, cache theo video ID) -> LẤY TÊN (TITLE)
+        # =========================================================
+        # Lấy tên file an toàn (thư mục staging đã riêng cho mỗi lần tải, không cần timestamp)
+        safe_title = YouTubeDownloadService.safe_filename(info.get("title", url.split("v=")[-1]))
 
         if mode == "video":
             # 🎯 Chỉ video
             logger.info(f"Downloading video only for: {url}")
             opts = YouTubeConfig.get_video_options(quality)
-            opts["outtmpl"] = f"downloads/{safe_title}_video_only.%(ext)s"
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-            video_path = f"downloads/{safe_title}_video_only.{info.get('ext','mp4')}"
+            opts["outtmpl"] = f"{out_dir}/{safe_title}_video_only.%(ext)s"
+            info = YouTubeDownloadService._process_download(info, opts, progress_hook)
+            video_path = YouTubeDownloadService._downloaded_path(
+                info, f"{out_dir}/{safe_title}_video_only.{info.get('ext','mp4')}")
             logger.info(f"Video download completed: {video_path}")
             return video_path
 
@@ -74,10 +167,10 @@ class YouTubeDownloadService:
             # Download a merged video file (video + audio combined)
             logger.info(f"Downloading merged video for: {url}")
             opts = YouTubeConfig.get_merged_video_options(quality)
-            opts["outtmpl"] = f"downloads/{safe_title}_FULL.%(ext)s"
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-            merged_path = f"downloads/{safe_title}_FULL.{info.get('ext','mp4')}"
+            opts["outtmpl"] = f"{out_dir}/{safe_title}_FULL.%(ext)s"
+            info = YouTubeDownloadService._process_download(info, opts, progress_hook)
+            merged_path = YouTubeDownloadService._downloaded_path(
+                info, f"{out_dir}/{safe_title}_FULL.{info.get('ext','mp4')}")
             logger.info(f"Merged video download completed: {merged_path}")
             return merged_path
 
@@ -88,144 +181,159 @@ class YouTubeDownloadService:
 
 
     # ============================================================
-    # DOWNLOAD AUDIO MP3
+    # DOWNLOAD AUDIO MP3 (cũng chạy qua download_job_manager)
     # ============================================================
     @staticmethod
-    async def download_audio(url: str, audio_format: str = "mp3") -> str:
-        logger.info(f"Received request to download audio: {url}, format: {audio_format}")
-        try:
-            result = await asyncio.get_event_loop().run_in_executor(
-                None,
-                YouTubeDownloadService._download_audio_sync,
-                url, audio_format
-            )
-            logger.info(f"Audio download completed successfully: {result}")
-            return result
-        except Exception as e:
-            logger.error(f"Error in async audio download for {url}: {str(e)}")
-            raise
-
-    @staticmethod
-    def _download_audio_sync(url: str, audio_format: str) -> str:
+    def _download_audio_sync(url: str, audio_format: str, progress_hook: Optional[Callable] = None) -> str:
         logger.info(f"Starting audio download: {url}, format: {audio_format}")
-        Path("downloads").mkdir(exist_ok=True)
-
-        # First extract video info to get the title
-        try:
-            temp_opts = {"quiet": True}  # Dùng tùy chọn cơ bản để lấy info
-            with yt_dlp.YoutubeDL(temp_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-        except Exception as e:
-            logger.error(f"Failed to extract info for {url}: {str(e)}")
-            raise ValueError(f"Could not get video information for {url}") from e
+        return YouTubeDownloadService._stored_download(
+            url, "audio", audio_format.lower(),
+            lambda info, out_dir: YouTubeDownloadService._download_audio_to(
+                info, url, audio_format, out_dir, progress_hook)
+        )
 
-        datetime_opts = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        # Create a safe title with timestamp
-        safe_title = datetime_opts + "_" + YouTubeDownloadService.safe_filename(info.get("title", url.split("v=")[-1]))
+    @staticmethod
+    def _download_audio_to(info: dict, url: str, audio_format: str, out_dir: str,
+                           progress_hook: Optional[Callable] = None) -> str:
+        # Info đã extract (một lần, cache theo video ID) -> lấy title làm tên file
+        safe_title = YouTubeDownloadService.safe_filename(info.get("title", url.split("v=")[-1]))
 
         # Try audio-only download first
         opts = YouTubeConfig.get_audio_extraction_options(audio_format)
-        opts["outtmpl"] = f"downloads/{safe_title}.%(ext)s"
-        opts["ffmpeg_location"] = YouTubeDownloadService.FFMPEG_DIR
+        opts["outtmpl"] = f"{out_dir}/{safe_title}.%(ext)s"
 
         try:
             logger.info(f"Attempting audio-only download for {url}")
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                logger.debug(f"Audio-only download info: {info.get('title', 'Unknown')} - {info.get('id', 'Unknown ID')}")
+            info = YouTubeDownloadService._process_download(info, opts, progress_hook)
+            logger.debug(f"Audio-only download info: {info.get('title', 'Unknown')} - {info.get('id', 'Unknown ID')}")
+        except yt_dlp.utils.DownloadCancelled:
+            # Job bị hủy (progress hook) -> không chạy fallback
+            raise
         except Exception as e:
             logger.warning(f"Audio-only download failed for {url}, attempting fallback: {str(e)}")
             # Fallback: download lowest quality video and extract audio
-            return YouTubeDownloadService._download_audio_from_lowest_quality_video(url, audio_format, safe_title)
+            return YouTubeDownloadService._download_audio_from_lowest_quality_video(url, audio_format, safe_title,
+                                                                                   out_dir, progress_hook)
 
-        # The file should be created with the expected name
-        expected_audio_path = f"downloads/{safe_title}.{audio_format}"
-
-        # Check if the expected file exists
-        if Path(expected_audio_path).exists():
-            audio_path = expected_audio_path
-        else:
-            # If not found, find the most recently created file with the correct extension
-            audio_files = [f for f in Path("downloads").iterdir() if f.suffix[1:] == audio_format]
-            if audio_files:
-                # Get the most recently created file
-                audio_path = str(max(audio_files, key=lambda f: f.stat().st_mtime))
-            else:
-                raise FileNotFoundError(f"Audio file not found after download: {expected_audio_path}")
+        # Đường dẫn yt-dlp báo lại (sau FFmpegExtractAudio), không có thì dùng tên theo outtmpl
+        expected_audio_path = f"{out_dir}/{safe_title}.{audio_format}"
+        audio_path = YouTubeDownloadService._downloaded_path(info, expected_audio_path)
+        if not Path(audio_path).exists():
+            raise FileNotFoundError(f"Audio file not found after download: {expected_audio_path}")
 
         logger.info(f"Audio download completed: {audio_path}")
         return audio_path
 
     @staticmethod
-    def _download_audio_from_lowest_quality_video(url: str, audio_format: str, safe_title: str) -> str:
+    def _download_audio_from_lowest_quality_video(url: str, audio_format: str, safe_title: str,
+                                                  out_dir: str,
+                                                  progress_hook: Optional[Callable] = None) -> str:
         """
-        Fallback method: Download lowest quality video and extract audio from it
+        Fallback method: lấy format nhỏ nhất có audio và pipe thẳng vào stdin của FFmpeg để encode audio
+        (không ghi video tạm ra đĩa). Format không tải được bằng HTTP thường (HLS/DASH) thì FFmpeg tự đọc URL.
         """
-        logger.info(f"Using fallback: downloading lowest quality video to extract audio from {url}")
+        logger.info(f"Using fallback: piping lowest quality stream into FFmpeg to extract audio from {url}")
 
-        # Get options for lowest quality video download
-        opts = YouTubeConfig.get_lowest_quality_video_options()
-        temp_video_path = f"downloads/{safe_title}_temp_video.%(ext)s"
-        opts["outtmpl"] = temp_video_path
-        opts["ffmpeg_location"] = YouTubeDownloadService.FFMPEG_DIR
+        output_audio_path = f"{out_dir}/{safe_title}.{audio_format}"
 
-        # Download the lowest quality video
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+        # Cùng thông số download_tuner như _process_download: chunk size cho khúc Range, thread FFmpeg
+        with download_tuner.session() as tuning:
+            codec_args = YouTubeDownloadService._ffmpeg_audio_args(audio_format) + tuning.ffmpeg_args()
 
-        # Find the downloaded video file
-        temp_video_files = list(Path("downloads").glob(f"{safe_title}_temp_video.*"))
-        if not temp_video_files:
-            raise FileNotFoundError(f"Lowest quality video file not found after download for {url}")
+            # Chọn format (info lấy lại từ cache, không extract lần nữa), không download
+            opts = tuning.apply(YouTubeConfig.get_pipe_audio_source_options())
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                tuning.bind(ydl.params)
+                info = ydl.process_ie_result(YouTubeDownloadService._extract_info(url), download=False)
+                selected = (info.get("requested_downloads") or [info])[0]
+                media_url = selected.get("url")
+                if not media_url:
+                    raise ValueError(f"No downloadable format with audio found for {url}")
+                headers = selected.get("http_headers") or {}
 
-        temp_video_file = str(temp_video_files[0])
-        logger.info(f"Downloaded lowest quality video: {temp_video_file}")
+                if selected.get("protocol") in ("http", "https"):
+                    try:
+                        def hook(d):
+                            tuning.progress_hook(d)
+                            if progress_hook is not None:
+                                progress_hook(d)
 
-        # Now extract audio from the downloaded video using FFmpeg
-        output_audio_path = f"downloads/{safe_title}.{audio_format}"
-        try:
-            from app.services.ffmpeg_service.ffmpeg_service import ffmpeg_service
-            # Extract audio using FFmpeg with appropriate codec based on format
-            if audio_format.lower() == "mp3":
-                cmd_args = ["-i", temp_video_file, "-vn", "-acodec", "mp3", "-ab", "320k", "-y", output_audio_path]
-            elif audio_format.lower() == "m4a":
-                cmd_args = ["-i", temp_video_file, "-vn", "-acodec", "aac", "-ab", "320k", "-y", output_audio_path]
-            elif audio_format.lower() == "aac":
-                cmd_args = ["-i", temp_video_file, "-vn", "-acodec", "aac", "-ab", "320k", "-y", output_audio_path]
-            elif audio_format.lower() == "flac":
-                cmd_args = ["-i", temp_video_file, "-vn", "-acodec", "flac", "-y", output_audio_path]
-            elif audio_format.lower() == "opus":
-                cmd_args = ["-i", temp_video_file, "-vn", "-acodec", "libopus", "-ab", "320k", "-y", output_audio_path]
-            elif audio_format.lower() == "wav":
-                cmd_args = ["-i", temp_video_file, "-vn", "-acodec", "pcm_s16le", "-y", output_audio_path]
-            else:
-                # Default to MP3 if format is not recognized
-                cmd_args = ["-i", temp_video_file, "-vn", "-acodec", "mp3", "-ab", "320k", "-y", output_audio_path]
-            
-            ffmpeg_service.run_with_check(cmd_args)
-            logger.info(f"Successfully extracted audio from video: {output_audio_path}")
-        except Exception as e:
-            logger.error(f"Failed to extract audio using FFmpeg: {str(e)}")
-            # Fallback: try using yt-dlp's audio extraction on the downloaded video
-            try:
-                extract_opts = YouTubeConfig.get_audio_extraction_options(audio_format)
-                extract_opts["format"] = "bestaudio/best"  # Use best available audio from the video
-                extract_opts["outtmpl"] = output_audio_path
-                extract_opts["ffmpeg_location"] = YouTubeDownloadService.FFMPEG_DIR
-
-                with yt_dlp.YoutubeDL(extract_opts) as ydl:
-                    ydl.download([f"file://{temp_video_file}"])  # Download from local file
-
-                logger.info(f"Successfully extracted audio using yt-dlp fallback: {output_audio_path}")
-            except Exception as fallback_e:
-                logger.error(f"Both FFmpeg and yt-dlp fallbacks failed: {str(fallback_e)}")
-                raise
-
-        # Clean up the temporary video file
-        try:
-            Path(temp_video_file).unlink()
-            logger.debug(f"Cleaned up temporary video file: {temp_video_file}")
-        except Exception as e:
-            logger.warning(f"Could not clean up temporary video file {temp_video_file}: {str(e)}")
+                        YouTubeDownloadService._pipe_to_ffmpeg(
+                            ydl, media_url, headers, codec_args, output_audio_path, hook,
+                            expected_size=selected.get("filesize") or selected.get("filesize_approx"),
+                            chunk_size=tuning.chunk_size)
+                        logger.info(f"Successfully extracted audio from piped stream: {output_audio_path}")
+                        return output_audio_path
+                    except yt_dlp.utils.DownloadCancelled:
+                        raise
+                    except Exception as e:
+                        logger.warning(f"Piping stream into FFmpeg failed for {url}, "
+                                       f"letting FFmpeg read the URL directly: {str(e)}")
 
+            header_lines = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+            input_args = (["-headers", header_lines] if header_lines else []) + ["-i", media_url]
+            ffmpeg_service.run_with_check(input_args + codec_args + ["-y", output_audio_path])
+        logger.info(f"Successfully extracted audio with FFmpeg reading the stream URL: {output_audio_path}")
         return output_audio_path
+
+    @staticmethod
+    def _ffmpeg_audio_args(audio_format: str) -> list:
+        """Extract audio using FFmpeg with appropriate codec based on format (encoder theo bản build đang có)"""
+        codec_args = {
+            "mp3": ("mp3", ["-ab", "320k"]),
+            "m4a": ("aac", ["-ab", "320k"]),
+            "aac": ("aac", ["-ab", "320k"]),
+            "flac": ("flac", []),
+            "opus": ("opus", ["-ab", "320k"]),
+            "wav": ("pcm_s16le", []),
+        }
+        # Default to MP3 if format is not recognized
+        codec, extra_args = codec_args.get(audio_format.lower(), codec_args["mp3"])
+        return ["-vn"] + ffmpeg_locator.encoder_args(codec) + extra_args
+
+    @staticmethod
+    def _pipe_to_ffmpeg(ydl, media_url: str, headers: dict, codec_args: list, output_path: str,
+                        progress_hook: Optional[Callable] = None, expected_size: Optional[int] = None,
+                        chunk_size: int = 10 * 1024 * 1024) -> None:
+        """
+        Tải stream bằng session HTTP của yt-dlp (cookie, proxy, header) theo từng khúc Range
+        `chunk_size` byte (YouTube bóp băng thông request không có Range) và ghi thẳng vào stdin FFmpeg
+        """
+        process = ffmpeg_service.popen(["-i", "pipe:0"] + codec_args + ["-y", output_path],
+                                       stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        downloaded = 0
+        total = expected_size
+        try:
+            while True:
+                range_end = downloaded + chunk_size - 1
+                request = yt_dlp.networking.Request(
+                    media_url, headers={**headers, "Range": f"bytes={downloaded}-{range_end}"})
+                with ydl.urlopen(request) as response:
+                    # Server bỏ qua Range (200) -> toàn bộ file trong một response
+                    whole_file = response.status == 200
+                    content_range = response.headers.get("Content-Range") or ""
+                    if "/" in content_range and content_range.rsplit("/", 1)[1].isdigit():
+                        total = int(content_range.rsplit("/", 1)[1])
+                    received = 0
+                    while True:
+                        data = response.read(256 * 1024)
+                        if not data:
+                            break
+                        process.stdin.write(data)
+                        downloaded += len(data)
+                        received += len(data)
+                        if progress_hook is not None:
+                            progress_hook({"status": "downloading", "filename": output_path,
+                                           "downloaded_bytes": downloaded, "total_bytes": total})
+                if whole_file or received == 0 or (total is not None and downloaded >= total):
+                    break
+                if total is None and received < chunk_size:
+                    break
+
+            process.stdin.close()
+            # Input đã đọc hết, chỉ còn encode phần cuối
+            process.check(timeout=ffmpeg_service.default_timeout)
+        except BaseException:
+            # Hủy job / lỗi mạng / FFmpeg chết (BrokenPipe): dừng FFmpeg, file dở bị bỏ cùng staging
+            process.kill()
+            raise
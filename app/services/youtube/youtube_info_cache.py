@@ -0,0 +1,110 @@
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+import yt_dlp
+from app.services.youtube.youtube_config import YouTubeConfig
+from app.utils.youtube_parser import extract_youtube_id
+from app.config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class YouTubeInfoCache:
+    """
+    Cache info dict (chưa process) của yt-dlp theo video ID, dùng chung giữa các request:
+    - extract() gọi extract_info(process=False) một lần cho mỗi video trong `ttl` giây
+    - Người dùng nhận bản deepcopy và tự chạy ydl.process_ie_result(info, download=True)
+      với option của mình (format, outtmpl, postprocessor...) -> không gọi InnerTube/player lần hai
+    - Nhiều thread cùng extract một video thì chỉ một thread gọi yt-dlp, các thread khác chờ kết quả
+    TTL ngắn vì URL stream trong info dict sẽ hết hạn.
+    """
+
+    def __init__(self, ttl: int = 600, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # video_id -> (expires_at, info)
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, list] = {}  # key -> [lock, số thread đang dùng/chờ lock]
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """Bản copy của info đã cache (None nếu chưa có hoặc hết hạn)"""
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                return None
+            expires_at, info = entry
+            if expires_at < time.monotonic():
+                del self._entries[video_id]
+                return None
+            self._entries.move_to_end(video_id)
+        # process_ie_result sửa info tại chỗ -> mỗi người dùng một bản riêng
+        return copy.deepcopy(info)
+
+    def put(self, video_id: str, info: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[video_id] = (time.monotonic() + self.ttl, info)
+            self._entries.move_to_end(video_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _record(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def extract(self, url: str, opts: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Info dict chưa process của `url` (blocking, chạy trong executor).
+        `opts` mặc định là base options, phải cùng extractor_args với YoutubeDL sẽ process info.
+        """
+        video_id = extract_youtube_id(url)
+        if video_id:
+            cached = self.get(video_id)
+            if cached is not None:
+                self._record("hits")
+                return cached
+
+        key = video_id or url
+        with self._lock:
+            # Đếm số thread giữ tham chiếu: lock chỉ bị gỡ khi thread cuối cùng xong,
+            # tránh trường hợp thread đến sau tạo lock mới và extract song song
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+            key_lock = entry[0]
+        try:
+            with key_lock:
+                # Thread khác có thể vừa extract xong video này
+                if video_id:
+                    cached = self.get(video_id)
+                    if cached is not None:
+                        self._record("hits")
+                        return cached
+
+                self._record("misses")
+                with yt_dlp.YoutubeDL(opts or YouTubeConfig.get_base_options()) as ydl:
+                    info = ydl.extract_info(url, download=False, process=False)
+                self.put(info.get("id") or key, info)
+                logger.debug(f"Cached YouTube info for {info.get('id') or key}")
+                return copy.deepcopy(info)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "ttl": self.ttl, **self.stats}
+
+
+# Global instance
+youtube_info_cache = YouTubeInfoCache(ttl=int(os.getenv("YOUTUBE_INFO_CACHE_TTL", "600")))
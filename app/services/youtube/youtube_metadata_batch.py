@@ -0,0 +1,178 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, AsyncGenerator
+
+from app.models.youtube.youtube_metadata_model import YouTubeMetadata
+from app.services.youtube.youtube_service_og import YouTubeServiceOg
+from app.services.youtube.youtube_service_detail import YouTubeServiceDetail
+from app.utils.youtube_parser import extract_youtube_id
+from app.config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+KIND_OG = "og"
+KIND_FULL = "full"
+
+
+def canonical_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+class YouTubeMetadataBatch:
+    """
+    Lấy metadata cho nhiều URL YouTube trong một request:
+    - URL được chuẩn hóa về video ID (extract_youtube_id), URL trùng video chỉ lấy một lần
+    - Kết quả cache theo (kind, video ID) trong `ttl` giây: cache hit trả về ngay, trước các URL phải lấy
+    - URL chưa có trong cache lấy song song, tối đa `max_concurrent` video cùng lúc
+      (og: chung một httpx client; full: pool thread yt-metadata + youtube_info_cache)
+    - Kết quả trả về dần theo thứ tự hoàn thành (async generator các event start -> result -> summary)
+    """
+
+    def __init__(self, ttl: int = 600, max_entries: int = 4096, max_concurrent: int = 8):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_concurrent = max_concurrent
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()  # -> (expires_at, metadata)
+        self.stats = {"hits": 0, "misses": 0}
+
+    # --- Cache (chỉ dùng trên event loop, không cần lock) ---
+    def get(self, kind: str, video_id: str) -> Optional[YouTubeMetadata]:
+        entry = self._entries.get((kind, video_id))
+        if entry is None:
+            return None
+        expires_at, metadata = entry
+        if expires_at < time.monotonic():
+            del self._entries[(kind, video_id)]
+            return None
+        self._entries.move_to_end((kind, video_id))
+        return metadata
+
+    def put(self, kind: str, video_id: str, metadata: YouTubeMetadata) -> None:
+        self._entries[(kind, video_id)] = (time.monotonic() + self.ttl, metadata)
+        self._entries.move_to_end((kind, video_id))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # --- Batch ---
+    @staticmethod
+    def normalize(urls: List[str]) -> Tuple["OrderedDict[str, List[str]]", List[str]]:
+        """(video ID -> các URL trỏ tới video đó, giữ thứ tự gặp đầu tiên), danh sách URL không hợp lệ"""
+        groups: "OrderedDict[str, List[str]]" = OrderedDict()
+        invalid = []
+        for url in urls:
+            video_id = extract_youtube_id(url.strip())
+            if video_id:
+                groups.setdefault(video_id, []).append(url)
+            else:
+                invalid.append(url)
+        return groups, invalid
+
+    async def stream(self, urls: List[str], kind: str = KIND_OG,
+                     max_concurrent: Optional[int] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        start_time = time.time()
+        groups, invalid = self.normalize(urls)
+        hits: Dict[str, YouTubeMetadata] = {}
+        misses: List[str] = []
+        for video_id in groups:
+            metadata = self.get(kind, video_id)
+            if metadata is not None:
+                hits[video_id] = metadata
+            else:
+                misses.append(video_id)
+        self.stats["hits"] += len(hits)
+        self.stats["misses"] += len(misses)
+        processed = 0
+        successful_count = 0
+
+        yield {
+            "event": "start",
+            "kind": kind,
+            "total_urls": len(urls),
+            "unique_videos": len(groups),
+            "invalid_urls": len(invalid),
+            "cache_hits": len(hits),
+            "start_time": start_time
+        }
+
+        for url in invalid:
+            processed += 1
+            yield {"event": "result", "index": processed, "video_id": None, "urls": [url], "success": False,
+                   "error": f"Invalid YouTube URL: {url}", "processed_at": time.time()}
+
+        for video_id, metadata in hits.items():
+            processed += 1
+            successful_count += 1
+            yield self._result_event(processed, video_id, groups[video_id], metadata, from_cache=True)
+
+        if misses:
+            semaphore = asyncio.Semaphore(max(1, min(max_concurrent or self.max_concurrent, len(misses))))
+            client = YouTubeServiceOg.create_client() if kind == KIND_OG else None
+
+            async def fetch(video_id: str):
+                async with semaphore:
+                    try:
+                        if kind == KIND_OG:
+                            metadata = await YouTubeServiceOg.fetch_metadata(canonical_url(video_id), client)
+                        else:
+                            metadata = await YouTubeServiceDetail.fetch_metadata(canonical_url(video_id))
+                    except Exception as e:
+                        return video_id, None, e
+                    self.put(kind, video_id, metadata)
+                    return video_id, metadata, None
+
+            tasks = [asyncio.create_task(fetch(video_id)) for video_id in misses]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    video_id, metadata, error = await next_done
+                    processed += 1
+                    if error is None:
+                        successful_count += 1
+                        yield self._result_event(processed, video_id, groups[video_id], metadata, from_cache=False)
+                    else:
+                        yield {"event": "result", "index": processed, "video_id": video_id,
+                               "urls": groups[video_id], "success": False,
+                               "error": getattr(error, "message", None) or str(error), "processed_at": time.time()}
+            finally:
+                # Client ngắt kết nối (generator bị đóng) -> hủy các video chưa lấy xong
+                for task in tasks:
+                    task.cancel()
+                if client is not None:
+                    await client.aclose()
+
+        end_time = time.time()
+        yield {
+            "event": "summary",
+            "total_urls": len(urls),
+            "processed": processed,
+            "successful_count": successful_count,
+            "failed_count": processed - successful_count,
+            "cache_hits": len(hits),
+            "end_time": end_time,
+            "total_time": end_time - start_time
+        }
+
+    @staticmethod
+    def _result_event(index: int, video_id: str, urls: List[str], metadata: YouTubeMetadata,
+                      from_cache: bool) -> Dict[str, Any]:
+        return {
+            "event": "result",
+            "index": index,
+            "video_id": video_id,
+            "urls": urls,
+            "success": True,
+            "from_cache": from_cache,
+            "data": metadata.model_dump(),
+            "processed_at": time.time()
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "ttl": self.ttl, "max_concurrent": self.max_concurrent, **self.stats}
+
+
+# Global instance
+youtube_metadata_batch = YouTubeMetadataBatch(
+    ttl=int(os.getenv("YOUTUBE_METADATA_CACHE_TTL", "600")),
+    max_concurrent=int(os.getenv("YOUTUBE_BATCH_CONCURRENCY", "8"))
+)
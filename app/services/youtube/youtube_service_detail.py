@@ -1,31 +1,40 @@
-import yt_dlp
-from pathlib import Path
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from app.models.youtube.youtube_metadata_model import YouTubeMetadata
-from app.services.youtube.youtube_config import YouTubeConfig
+from app.services.youtube.youtube_info_cache import youtube_info_cache
 from app.config.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# extract_info của yt-dlp là blocking -> chạy trên pool riêng (không chặn event loop, không chiếm default executor)
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("YOUTUBE_METADATA_WORKERS", "4")),
+                               thread_name_prefix="yt-metadata")
+
+
 class YouTubeServiceDetail:
 
     @staticmethod
     async def fetch_metadata(url: str) -> YouTubeMetadata:
         logger.info(f"Fetching detailed metadata for URL: {url}")
         try:
-            opts = YouTubeConfig.get_metadata_options()
-
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-
-            result = YouTubeMetadata(
-                video_id=info.get("id"),
-                title=info.get("title"),
-                description=info.get("description"),  # FULL DESCRIPTION
-                image=info.get("thumbnail"),
-                url=info.get("webpage_url"),
-            )
+            # Info dùng chung với download (youtube_info_cache): video vừa xem metadata thì tải không extract lại
+            info = await asyncio.get_running_loop().run_in_executor(_executor, youtube_info_cache.extract, url)
+            result = YouTubeServiceDetail.to_metadata(info)
             logger.info(f"Successfully fetched detailed metadata for video ID: {info.get('id', 'unknown')}")
             return result
         except Exception as e:
             logger.error(f"Error fetching detailed metadata for {url}: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    @staticmethod
+    def to_metadata(info: dict) -> YouTubeMetadata:
+        # Info chưa process (process=False) -> chưa có "thumbnail", lấy ảnh cuối (lớn nhất) trong "thumbnails"
+        thumbnails = info.get("thumbnails") or []
+        return YouTubeMetadata(
+            video_id=info.get("id"),
+            title=info.get("title"),
+            description=info.get("description"),  # FULL DESCRIPTION
+            image=info.get("thumbnail") or (thumbnails[-1].get("url") if thumbnails else None),
+            url=info.get("webpage_url"),
+        )
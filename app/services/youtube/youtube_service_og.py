@@ -1,6 +1,7 @@
 import httpx
 import trafilatura
 import re
+from typing import Optional
 from app.utils.youtube_parser import extract_youtube_id
 from app.models.youtube.youtube_metadata_model import YouTubeMetadata
 from app.config.logging_config import get_logger
@@ -8,30 +9,38 @@ from app.exceptions.video import InvalidVideoURLException, VideoFetchFailedExcep
 
 logger = get_logger(__name__)
 
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64"
+        ") AppleWebKit/537.36 (KHTML, like Gecko)"
+        " Chrome/120.0.0.0 Safari/537.36"
+    )
+}
+
 
 class YouTubeServiceOg:
 
     @staticmethod
-    async def fetch_metadata(url: str) -> YouTubeMetadata:
+    def create_client() -> httpx.AsyncClient:
+        return httpx.AsyncClient(timeout=10, headers=HEADERS)
+
+    @staticmethod
+    async def fetch_metadata(url: str, client: Optional[httpx.AsyncClient] = None) -> YouTubeMetadata:
+        """`client`: dùng chung một client (connection pool) khi lấy nhiều video, vd batch"""
         logger.info(f"Fetching OG metadata for URL: {url}")
         video_id = extract_youtube_id(url)
         if not video_id:
             raise InvalidVideoURLException(url)
 
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64"
-                ") AppleWebKit/537.36 (KHTML, like Gecko)"
-                " Chrome/120.0.0.0 Safari/537.36"
-            )
-        }
-
         # ---- Fetch HTML ----
         try:
-            async with httpx.AsyncClient(timeout=10, headers=headers) as client:
+            if client is None:
+                async with YouTubeServiceOg.create_client() as own_client:
+                    res = await own_client.get(url)
+            else:
                 res = await client.get(url)
-                html = res.text
-                logger.info(f"Successfully fetched HTML for video ID: {video_id}")
+            html = res.text
+            logger.info(f"Successfully fetched HTML for video ID: {video_id}")
         except Exception as e:
             logger.error(f"Error fetching HTML for {url}: {str(e)}")
             raise VideoFetchFailedException(url, str(e))
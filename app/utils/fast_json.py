@@ -0,0 +1,44 @@
+import json
+from typing import Any
+from fastapi.responses import JSONResponse
+
+# orjson là optional: không có thì dùng json của stdlib
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def json_default(obj: Any) -> Any:
+    """Fallback cho kiểu không serialize được (object có to_dict(), còn lại chuyển thành str)"""
+    to_dict = getattr(obj, "to_dict", None)
+    if callable(to_dict):
+        return to_dict()
+    return str(obj)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        # PASSTHROUGH_DATACLASS: dataclass (ScrapeResult...) đi qua json_default -> to_dict()
+        return orjson.dumps(obj, default=json_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS)
+    return json.dumps(obj, ensure_ascii=False, default=json_default, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encode một lần bằng orjson (fallback json), không cần jsonable_encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
@@ -0,0 +1,80 @@
+import os
+import mimetypes
+from typing import Optional, Dict
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+# File media: client/CDN được cache lâu, revalidate bằng ETag
+MEDIA_CACHE_CONTROL = "public, max-age=86400"
+
+
+def file_etag(path: str, tag: Optional[str] = None) -> str:
+    """ETag mạnh từ `tag` (vd: key content-addressed) + size + mtime"""
+    stat = os.stat(path)
+    base = f"{tag}-" if tag else ""
+    return f'"{base}{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # So sánh yếu (bỏ W/) theo RFC 9110 cho If-None-Match
+    candidates = [value.strip().removeprefix("W/") for value in if_none_match.split(",")]
+    return etag in candidates
+
+
+class _MediaFileResponse(FileResponse):
+    """
+    FileResponse với If-Range so theo ETag/Last-Modified của response này.
+    Starlette tự tính ETag riêng (md5) để so If-Range, khác ETag đã gửi cho client
+    -> client resume download luôn nhận lại cả file (200) thay vì 206.
+    """
+
+    def __init__(self, *args, etag: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.etag = etag
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if_range = Headers(scope=scope).get("if-range")
+        if if_range is not None:
+            # So sánh mạnh: khớp -> phục vụ Range (bỏ If-Range), lệch -> bỏ Range, trả cả file
+            matches = if_range.strip() in (self.etag, self.headers.get("last-modified"))
+            drop = b"if-range" if matches else b"range"
+            scope = {**scope, "headers": [(name, value) for name, value in scope["headers"] if name != drop]}
+        await super().__call__(scope, receive, send)
+
+
+def media_type_for_file(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def conditional_file_response(request: Request, path: str, filename: Optional[str] = None,
+                              tag: Optional[str] = None, headers: Optional[Dict[str, str]] = None,
+                              background: Optional[BackgroundTask] = None) -> Response:
+    """
+    Trả file với If-None-Match (304), Range/If-Range (206, FileResponse của Starlette xử lý)
+    và sendfile khi server hỗ trợ extension zerocopysend.
+    """
+    stat_result = os.stat(path)
+    etag = file_etag(path, tag)
+    response_headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": MEDIA_CACHE_CONTROL}
+    response_headers.update(headers or {})
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=response_headers, background=background)
+
+    return _MediaFileResponse(
+        path,
+        media_type=media_type_for_file(filename or path),
+        filename=filename,
+        headers=response_headers,
+        background=background,
+        stat_result=stat_result,
+        etag=etag
+    )
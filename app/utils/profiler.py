@@ -0,0 +1,232 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import Counter, deque
+from typing import Optional, Dict, Any, List
+
+from app.config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # Theo hàm (dòng khai báo), không theo dòng đang chạy -> flamegraph gộp đúng theo hàm
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, max_depth: int = 128) -> List[str]:
+    stack = []
+    while frame is not None and len(stack) < max_depth:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class SamplingProfiler:
+    """
+    Sampling profiler cho server đang chạy (không cần cài thêm gì):
+    - Một thread riêng đọc sys._current_frames() mỗi `interval` giây
+    - Lấy mẫu event loop thread và các thread executor (yt_dlp, subprocess...)
+    - Kết quả ở dạng collapsed stack ("thread;frame;frame count") cho flamegraph.pl / speedscope
+    Mỗi lần chỉ chạy một phiên profile.
+    """
+
+    MAX_DURATION = 120.0
+    MIN_INTERVAL = 0.001
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def sample(self, duration: float, interval: float = 0.01, loop_thread_id: Optional[int] = None,
+               loop_only: bool = False) -> Dict[str, Any]:
+        """Chạy đồng bộ trong thread gọi (không gọi trực tiếp từ event loop)"""
+        duration = max(0.1, min(duration, self.MAX_DURATION))
+        interval = max(self.MIN_INTERVAL, interval)
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profiling session is already running")
+
+        own_id = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        started = time.perf_counter()
+        try:
+            deadline = started + duration
+            while time.perf_counter() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    if loop_only and thread_id != loop_thread_id:
+                        continue
+                    thread_name = "event-loop" if thread_id == loop_thread_id else names.get(thread_id, str(thread_id))
+                    stacks[";".join([thread_name] + _collapse(frame))] += 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            self._lock.release()
+
+        return {
+            "duration": time.perf_counter() - started,
+            "interval": interval,
+            "samples": samples,
+            "stacks": stacks
+        }
+
+    async def profile(self, duration: float, interval: float = 0.01, loop_only: bool = False) -> Dict[str, Any]:
+        """
+        Profile từ event loop: chạy sampler trên thread riêng (không dùng default executor,
+        vì executor có thể đang bị chính các job blocking chiếm hết)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        loop_thread_id = threading.get_ident()
+
+        def run():
+            try:
+                result = self.sample(duration, interval, loop_thread_id, loop_only)
+            except BaseException as e:
+                loop.call_soon_threadsafe(_set_future, future, None, e)
+            else:
+                loop.call_soon_threadsafe(_set_future, future, result, None)
+
+        threading.Thread(target=run, name="sampling-profiler", daemon=True).start()
+        return await future
+
+
+def _set_future(future: asyncio.Future, result: Any, error: Optional[BaseException]) -> None:
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def to_collapsed(stacks: Counter) -> str:
+    """Định dạng collapsed stack (Brendan Gregg): mỗi dòng "frame;frame;frame count" """
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+def top_functions(stacks: Counter, limit: int = 30) -> List[Dict[str, Any]]:
+    """Hàm tốn nhiều mẫu nhất: self (ở đỉnh stack) và total (xuất hiện trong stack)"""
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    total = sum(stacks.values()) or 1
+    for stack, count in stacks.items():
+        frames = stack.split(";")[1:]  # bỏ tên thread
+        if not frames:
+            continue
+        self_counts[frames[-1]] += count
+        for frame in set(frames):
+            total_counts[frame] += count
+    return [
+        {
+            "function": frame,
+            "self_samples": count,
+            "self_percent": round(count * 100.0 / total, 2),
+            "total_percent": round(total_counts[frame] * 100.0 / total, 2)
+        }
+        for frame, count in self_counts.most_common(limit)
+    ]
+
+
+class LoopStallWatchdog:
+    """
+    Phát hiện event loop bị block (callback chạy quá `threshold` giây):
+    - Task heartbeat trên loop cập nhật mốc thời gian mỗi threshold/4 giây
+    - Thread watchdog thấy heartbeat trễ quá threshold thì chụp stack của loop thread
+      ngay lúc đang bị block và log lại (kèm tổng thời gian block khi loop chạy lại)
+    Không dùng asyncio debug mode (overhead lớn, chỉ báo sau khi callback đã xong, không có stack).
+    """
+
+    def __init__(self, threshold: float = 0.25, history_size: int = 50):
+        self.threshold = threshold
+        self.check_interval = max(0.005, threshold / 4)
+        self.stalls: deque = deque(maxlen=history_size)
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._current_stall: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Event loop stall watchdog started (threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.check_interval)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            lag = time.monotonic() - self._last_beat - self.check_interval
+            stall = self._current_stall
+            if lag > self.threshold:
+                if stall is None:
+                    self._record_stall(lag)
+                else:
+                    stall["duration"] = lag
+            elif stall is not None:
+                # Loop đã chạy lại
+                self._current_stall = None
+                logger.warning(f"Event loop was blocked for {stall['duration'] * 1000:.0f}ms "
+                               f"(stack logged at detection)")
+
+    def _record_stall(self, lag: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        stall = {
+            "detected_at": time.time(),
+            "duration": lag,
+            "stack": [line.rstrip() for line in stack]
+        }
+        self._current_stall = stall
+        self.stalls.append(stall)
+        logger.warning(f"Event loop blocked for more than {lag * 1000:.0f}ms, loop thread stack:\n"
+                       + "".join(stack))
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "threshold": self.threshold,
+            "stall_count": len(self.stalls),
+            "stalls": list(self.stalls)
+        }
+
+
+# Global instances
+profiler = SamplingProfiler()
+loop_watchdog = LoopStallWatchdog(threshold=float(os.getenv("LOOP_STALL_THRESHOLD", "0.25") or 0.25))
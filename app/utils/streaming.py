@@ -0,0 +1,58 @@
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
+from fastapi import Request
+from app.config.logging_config import get_logger
+from app.utils.fast_json import dumps_bytes
+
+logger = get_logger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# Header để proxy (nginx...) không buffer response stream
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def encode_ndjson(obj: Any) -> bytes:
+    return dumps_bytes(obj) + b"\n"
+
+
+def encode_sse(obj: Any, event: Optional[str] = None) -> bytes:
+    prefix = f"event: {event}\n".encode("utf-8") if event else b""
+    return prefix + b"data: " + dumps_bytes(obj) + b"\n\n"
+
+
+def choose_stream_format(format_param: Optional[str] = None, accept: Optional[str] = None) -> str:
+    """'sse' nếu client yêu cầu (query ?format=sse hoặc Accept: text/event-stream), mặc định 'ndjson'"""
+    if format_param:
+        return "sse" if format_param.lower() == "sse" else "ndjson"
+    if accept and SSE_MEDIA_TYPE in accept:
+        return "sse"
+    return "ndjson"
+
+
+def media_type_for(stream_format: str) -> str:
+    return SSE_MEDIA_TYPE if stream_format == "sse" else NDJSON_MEDIA_TYPE
+
+
+async def encode_event_stream(events: AsyncIterator[Dict[str, Any]], request: Request,
+                              stream_format: str = "ndjson") -> AsyncGenerator[bytes, None]:
+    """
+    Encode từng event (dict có key "event") thành NDJSON/SSE.
+    Dừng và đóng generator nguồn khi client ngắt kết nối để hủy phần việc còn lại.
+    """
+    try:
+        async for event in events:
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected from {request.url.path}, cancelling remaining work")
+                break
+            if stream_format == "sse":
+                yield encode_sse(event, event.get("event"))
+            else:
+                yield encode_ndjson(event)
+    finally:
+        aclose = getattr(events, "aclose", None)
+        if aclose:
+            await aclose()
@@ -2,6 +2,11 @@ import os
 import sys
 import uvicorn
 import asyncio
+
+# Set up logging first: module import bên dưới (router, service...) có thể ghi log ngay khi import
+from app.config.logging_config import setup_logging
+setup_logging()
+
 from fastapi import FastAPI
 from app.routers import router
 from app.config.cors import cors_origins
@@ -21,22 +26,23 @@ from app.exceptions.handlers import (
 from app.exceptions.base import AppException
 from pydantic import ValidationError
 
-setup_event_loop()
+# FFmpeg: env FFMPEG_PATH/FFMPEG_DIR, portable ffmpeg/bin trong repo, hoặc PATH hệ thống
+from app.services.ffmpeg_service.ffmpeg_locator import ffmpeg_locator
+# Watchdog phát hiện event loop bị block (LOOP_STALL_THRESHOLD giây, 0 = tắt)
+from app.utils.profiler import loop_watchdog
+from app.services.youtube.youtube_download_jobs import download_job_manager
 
-# Set up logging first
-from app.config.logging_config import setup_logging
-setup_logging()
+setup_event_loop()
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 NODE_PATH = os.path.join(BASE_DIR, "nodejs")
-FFMPEG_PATH = os.path.join(BASE_DIR,"..","ffmpeg", "bin")
 
-# Đưa portable NodeJS + FFmpeg vào PATH
-os.environ["PATH"] = (
-    NODE_PATH + os.pathsep +
-    FFMPEG_PATH + os.pathsep +
-    os.environ["PATH"]
+FFMPEG_PATH = ffmpeg_locator.ffmpeg_dir
+
+# Đưa portable NodeJS + FFmpeg vào PATH (yt-dlp postprocessor tìm ffmpeg qua PATH)
+os.environ["PATH"] = os.pathsep.join(
+    [NODE_PATH] + ([FFMPEG_PATH] if FFMPEG_PATH else []) + [os.environ["PATH"]]
 )
 
 
@@ -78,6 +84,30 @@ app.include_router(router, prefix="/api")
 metrics_app = make_asgi_app()
 app.mount("/metrics", metrics_app)
 
+
+# Startup / shutdown hooks
+@app.on_event("startup")
+async def start_loop_watchdog():
+    if loop_watchdog.threshold > 0:
+        loop_watchdog.start()
+
+
+@app.on_event("startup")
+async def probe_ffmpeg():
+    # Kiểm tra version + encoder một lần lúc khởi động (kết quả cache cho các request)
+    await asyncio.to_thread(ffmpeg_locator.probe)
+
+
+@app.on_event("shutdown")
+async def stop_loop_watchdog():
+    await loop_watchdog.stop()
+
+
+@app.on_event("shutdown")
+async def stop_download_jobs():
+    await download_job_manager.shutdown()
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+import pytest
+
+from app.services.youtube.download_store import DownloadStore
+
+
+def _store_file(store, key, size, name="video.mp4", meta=None):
+    staging = store.staging_dir(key)
+    path = os.path.join(staging, name)
+    with open(path, "wb") as f:
+        f.write(b"\x00" * size)
+    # File phụ của yt-dlp (fragment, bản trước khi merge) phải bị bỏ khi commit
+    with open(os.path.join(staging, name + ".part-Frag1"), "wb") as f:
+        f.write(b"\x00")
+    stored = store.commit(key, staging, path, meta)
+    time.sleep(0.01)  # last_access khác nhau -> thứ tự LRU xác định
+    return stored
+
+
+def test_commit_moves_file_and_writes_meta(tmp_path):
+    store = DownloadStore(root=str(tmp_path))
+    key = store.make_key("dQw4w9WgXcQ", "audio", "mp3")
+    path = _store_file(store, key, 100, name="Song.mp3", meta={"title": "Song"})
+
+    assert path == str(tmp_path / key / "Song.mp3")
+    assert sorted(os.listdir(tmp_path / key)) == ["Song.mp3", "meta.json"]
+    assert os.listdir(tmp_path / ".tmp") == []
+    assert store.get(key) == path
+    assert store.get(store.make_key("dQw4w9WgXcQ", "audio", "m4a")) is None
+    assert store.get_meta(key)["title"] == "Song" and store.get_meta(key)["size"] == 100
+    assert store.key_for_path(path) == key
+    assert store.key_for_path(str(tmp_path / "elsewhere.mp3")) is None
+
+    store.update_meta(key, {"media": {"duration": 3.5}})
+    on_disk = json.loads((tmp_path / key / "meta.json").read_text(encoding="utf-8"))
+    assert on_disk["media"] == {"duration": 3.5} and "last_access" not in on_disk
+
+
+def test_lru_eviction_over_quota(tmp_path):
+    store = DownloadStore(root=str(tmp_path), max_bytes=250)
+    _store_file(store, "a", 100)
+    _store_file(store, "b", 100)
+    store.get("a")  # a mới dùng -> b là artifact dùng lâu nhất
+    time.sleep(0.01)
+    _store_file(store, "c", 100)
+
+    assert store.get("b") is None
+    assert not (tmp_path / "b").exists()
+    assert store.get("a") is not None and store.get("c") is not None
+    status = store.get_status()
+    assert status["evictions"] == 1
+    assert status["total_bytes"] == 200
+
+
+def test_pinned_artifacts_are_not_evicted(tmp_path):
+    store = DownloadStore(root=str(tmp_path), max_bytes=250)
+    _store_file(store, "a", 100)
+    _store_file(store, "b", 100)
+    store.pin("a")
+    store.pin("a")
+    _store_file(store, "c", 100)
+    # a đang được đọc (pinned) dù dùng lâu nhất -> b bị evict thay (get_meta không đổi thứ tự LRU)
+    assert store.get_meta("a") is not None
+    assert store.get_meta("b") is None
+
+    store.unpin("a")
+    _store_file(store, "d", 100)
+    assert store.get_meta("a") is not None  # vẫn còn một pin
+
+    store.unpin("a")
+    _store_file(store, "e", 100)
+    assert store.get_meta("a") is None
+
+
+def test_new_artifact_kept_even_if_larger_than_quota(tmp_path):
+    store = DownloadStore(root=str(tmp_path), max_bytes=50)
+    path = _store_file(store, "big", 100)
+    assert store.get("big") == path
+
+
+def test_duplicate_commit_keeps_first_copy(tmp_path):
+    store = DownloadStore(root=str(tmp_path))
+    first = _store_file(store, "k", 10, name="first.mp4")
+    second = _store_file(store, "k", 20, name="second.mp4")
+    assert second == first
+    assert os.listdir(tmp_path / ".tmp") == []
+
+
+def test_index_rebuilt_from_disk_and_stale_staging_removed(tmp_path):
+    store = DownloadStore(root=str(tmp_path))
+    path = _store_file(store, "k", 10)
+    stale = tmp_path / ".tmp" / "old.1234"
+    stale.mkdir()
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+
+    reopened = DownloadStore(root=str(tmp_path), staging_max_age=60)
+    assert reopened.get("k") == path
+    assert not stale.exists()
+
+    reopened.remove("k")
+    assert reopened.get("k") is None
+    assert not (tmp_path / "k").exists()
+
+
+def test_commit_rejects_file_outside_staging(tmp_path):
+    store = DownloadStore(root=str(tmp_path / "store"))
+    staging = store.staging_dir("k")
+    outside = tmp_path / "outside.mp4"
+    outside.write_bytes(b"x")
+    with pytest.raises(ValueError):
+        store.commit("k", staging, str(outside))
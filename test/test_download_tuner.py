@@ -0,0 +1,90 @@
+import pytest
+
+from app.services.youtube.download_tuner import DownloadTuner, DownloadSession, MB
+
+
+def _finish(session, downloaded, seconds, fragmented=False):
+    """Giả lập progress hook: `downloaded` byte trong `seconds` giây"""
+    hook = {"status": "downloading", "filename": "video.mp4", "downloaded_bytes": downloaded}
+    if fragmented:
+        hook["fragment_count"] = 100
+    session.progress_hook(hook)
+    session._first_at -= seconds
+
+
+def test_default_profile_before_any_measurement():
+    tuner = DownloadTuner(default_fragments=3, default_chunk_size=10 * MB)
+    session = tuner._profile(1)
+    assert (session.fragments, session.chunk_size, session.ratelimit) == (3, 10 * MB, None)
+    # Nhiều download cùng lúc -> chia số kết nối tối đa
+    assert tuner._profile(8).fragments == 2
+    assert tuner._profile(32).fragments == 1
+
+
+def test_profile_sizes_chunks_from_measured_throughput():
+    tuner = DownloadTuner(max_fragments=8, max_connections=16, chunk_seconds=5.0)
+    tuner.connection_throughput = 2 * MB
+    session = tuner._profile(1)
+    assert session.fragments == 8
+    assert session.chunk_size == 10 * MB  # ~5 giây mỗi request Range
+
+    tuner.connection_throughput = 100 * MB
+    assert tuner._profile(1).chunk_size == tuner.max_chunk_size
+    tuner.connection_throughput = 100 * 1024
+    assert tuner._profile(1).chunk_size == tuner.min_chunk_size
+
+
+def test_bandwidth_limit_opens_only_needed_connections():
+    tuner = DownloadTuner(bandwidth_limit=8 * MB)
+    tuner.connection_throughput = 1 * MB
+    session = tuner._profile(2)
+    assert session.ratelimit == 4 * MB
+    assert session.fragments == 4
+
+
+def test_close_learns_per_connection_throughput():
+    tuner = DownloadTuner(smoothing=0.5)
+    with tuner.session() as session:
+        session.fragments = 4
+        _finish(session, 40 * MB, 10, fragmented=True)
+    assert tuner.connection_throughput == pytest.approx(1 * MB, rel=0.01)  # 4MB/s chia 4 kết nối
+
+    with tuner.session() as session:
+        _finish(session, 30 * MB, 10)  # https thường: một kết nối
+    assert tuner.connection_throughput == pytest.approx(2 * MB, rel=0.01)  # EWMA của 1MB/s và 3MB/s
+    assert tuner.completed == 2
+
+
+def test_close_ignores_small_or_ratelimited_samples():
+    tuner = DownloadTuner(bandwidth_limit=2 * MB)
+    with tuner.session() as session:
+        _finish(session, 100 * 1024, 10)  # < 1MB: không đủ mẫu
+    assert tuner.connection_throughput is None and tuner.completed == 0
+
+    with tuner.session() as session:
+        _finish(session, 20 * MB, 10)  # chạm ratelimit 2MB/s -> không phản ánh tốc độ kết nối
+    assert tuner.connection_throughput is None
+    assert tuner.completed == 1
+
+
+def test_ratelimit_rebalanced_between_active_downloads():
+    tuner = DownloadTuner(bandwidth_limit=12 * MB)
+    with tuner.session() as first:
+        params = {}
+        first.bind(params)
+        assert params == {} and first.ratelimit == 12 * MB
+        with tuner.session() as second:
+            assert first.ratelimit == second.ratelimit == 6 * MB
+            assert params["ratelimit"] == 6 * MB  # downloader đang chạy đọc lại từ params
+            assert tuner.get_status()["active_downloads"] == 2
+        assert params["ratelimit"] == 12 * MB
+    assert tuner.get_status()["active_downloads"] == 0
+
+
+def test_session_apply_keeps_postprocessor_specific_args():
+    session = DownloadSession(fragments=4, chunk_size=8 * MB, ffmpeg_threads=2, ratelimit=None)
+    opts = session.apply({"postprocessor_args": {"ffmpegextractaudio": ["-ar", "44100"]}})
+    assert opts["concurrent_fragment_downloads"] == 4
+    assert opts["http_chunk_size"] == 8 * MB
+    assert opts["postprocessor_args"] == {"ffmpegextractaudio": ["-ar", "44100"], "ffmpeg": ["-threads", "2"]}
+    assert "ratelimit" not in opts
@@ -0,0 +1,35 @@
+import json
+import datetime
+
+from app.utils.fast_json import dumps_bytes, dumps, loads, FastJSONResponse
+
+
+class _Record:
+    def __init__(self, value):
+        self.value = value
+
+    def to_dict(self):
+        return {"value": self.value}
+
+
+def test_round_trip_keeps_unicode():
+    payload = {"title": "Bài viết trên Facebook", "count": 3, "ratio": 0.5, "tags": ["a", None]}
+    encoded = dumps_bytes(payload)
+    assert isinstance(encoded, bytes)
+    assert "Bài viết".encode("utf-8") in encoded
+    assert loads(encoded) == payload
+    assert json.loads(dumps(payload)) == payload
+
+
+def test_objects_with_to_dict_and_unknown_types():
+    when = datetime.date(2024, 1, 2)
+    decoded = loads(dumps_bytes({"record": _Record(7), "other": {1: "int key"}, "when": when}))
+    assert decoded["record"] == {"value": 7}
+    assert decoded["other"] == {"1": "int key"}
+    assert decoded["when"] == str(when)
+
+
+def test_response_renders_once_with_json_media_type():
+    response = FastJSONResponse(content={"results": [_Record("x")]})
+    assert response.media_type == "application/json"
+    assert loads(response.body) == {"results": [{"value": "x"}]}
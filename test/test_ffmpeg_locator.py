@@ -0,0 +1,96 @@
+import sys
+
+import pytest
+
+from app.services.ffmpeg_service.ffmpeg_locator import FFmpegLocator
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="fake binaries are shell scripts")
+
+FAKE_FFMPEG = """#!/bin/sh
+case "$2" in
+  -version) echo "ffmpeg version 6.1.1-static Copyright (c) 2000-2023 the FFmpeg developers" ;;
+  -encoders)
+    echo "Encoders:"
+    echo " A....D aac                  AAC (Advanced Audio Coding)"
+    echo " A....D libmp3lame           libmp3lame MP3 (MPEG audio layer 3)"
+    echo " A....D opus                 Opus"
+    echo " A....D flac                 FLAC (Free Lossless Audio Codec)"
+    echo " V....D libx264              libx264 H.264"
+    ;;
+esac
+"""
+
+
+def _install(directory, name, script=FAKE_FFMPEG):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    path.write_text(script)
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ("FFMPEG_PATH", "FFPROBE_PATH", "FFMPEG_DIR"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("PATH", "")
+
+
+def test_search_order_env_then_dirs(tmp_path, monkeypatch):
+    in_dir = _install(tmp_path / "bin", "ffmpeg")
+    locator = FFmpegLocator(search_dirs=[str(tmp_path / "bin")])
+    assert locator.ffmpeg_path == in_dir
+    assert locator.ffmpeg_dir == str(tmp_path / "bin")
+    assert locator.ffprobe_path is None
+
+    configured = _install(tmp_path / "custom", "ffmpeg")
+    monkeypatch.setenv("FFMPEG_PATH", str(tmp_path / "custom"))  # thư mục cũng được
+    assert FFmpegLocator(search_dirs=[str(tmp_path / "bin")]).ffmpeg_path == configured
+
+    # FFMPEG_PATH sai -> tìm tiếp ở thư mục khác
+    monkeypatch.setenv("FFMPEG_PATH", str(tmp_path / "missing" / "ffmpeg"))
+    assert FFmpegLocator(search_dirs=[str(tmp_path / "bin")]).ffmpeg_path == in_dir
+
+
+def test_not_executable_is_skipped(tmp_path):
+    path = tmp_path / "bin" / "ffmpeg"
+    path.parent.mkdir()
+    path.write_text(FAKE_FFMPEG)
+    path.chmod(0o644)
+    assert FFmpegLocator(search_dirs=[str(tmp_path / "bin")]).ffmpeg_path is None
+
+
+def test_probe_reads_version_and_picks_encoders(tmp_path):
+    _install(tmp_path, "ffmpeg")
+    locator = FFmpegLocator(search_dirs=[str(tmp_path)])
+    status = locator.probe()
+    assert status["version"] == "6.1.1-static"
+    assert status["encoders"] == 5
+    assert status["error"] is None and locator.available
+
+    assert locator.pick_encoder("mp3") == "libmp3lame"
+    assert locator.pick_encoder("aac") == "aac"
+    assert locator.pick_encoder("vorbis") == "vorbis"  # không có encoder -> để ffmpeg tự chọn
+    assert locator.encoder_args("opus") == ["-acodec", "opus", "-strict", "-2"]
+    assert locator.encoder_args("mp3") == ["-acodec", "libmp3lame"]
+    assert status["selected_encoders"]["mp3"] == "libmp3lame"
+    assert status["selected_encoders"]["vorbis"] is None
+
+
+def test_probe_runs_once(tmp_path):
+    counter = tmp_path / "calls"
+    script = f'#!/bin/sh\necho x >> "{counter}"\necho "ffmpeg version 7.0"\n'
+    _install(tmp_path, "ffmpeg", script)
+    locator = FFmpegLocator(search_dirs=[str(tmp_path)])
+    locator.probe()
+    locator.probe()
+    locator.has_encoder("aac")
+    assert len(counter.read_text().splitlines()) == 2  # -version + -encoders
+
+
+def test_missing_ffmpeg_falls_back_to_codec_name(tmp_path):
+    locator = FFmpegLocator(search_dirs=[str(tmp_path)])
+    assert locator.probe()["error"] == "ffmpeg not found"
+    assert not locator.available
+    assert locator.encoder_args("mp3") == ["-acodec", "mp3"]
+    assert locator.ffmpeg_dir is None
@@ -0,0 +1,128 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from app.services.ffmpeg_service.ffmpeg_service import (
+    FFmpegService, FFmpegError, FFmpegTimeoutError, _parse_progress
+)
+
+# Thay binary ffmpeg bằng python: in block -progress ra stderr rồi ngủ/thoát theo tham số
+FAKE_FFMPEG = """
+import sys, time
+sys.stderr.write("frame=10\\nfps=25.0\\nout_time_us=2000000\\nspeed=1.5x\\nprogress=continue\\n")
+sys.stderr.write("some log line\\n")
+sys.stderr.write("frame=20\\nout_time_us=4000000\\nspeed=2x\\nprogress=end\\n")
+sys.stderr.flush()
+time.sleep(float(sys.argv[1]))
+sys.exit(int(sys.argv[2]))
+"""
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = FFmpegService(max_concurrent=2, default_timeout=10)
+    monkeypatch.setattr(service, "_command",
+                        lambda args, progress=True: [sys.executable, "-c", FAKE_FFMPEG] + list(args))
+    return service
+
+
+def test_parse_progress_block():
+    progress = _parse_progress({
+        "frame": "120", "fps": "29.97", "out_time_us": "5500000", "speed": "1.25x",
+        "total_size": "1048576", "bitrate": "1411.2kbits/s", "progress": "continue"
+    })
+    assert progress["out_time"] == 5.5
+    assert progress["speed"] == 1.25
+    assert progress["frame"] == 120
+    assert progress["total_size"] == 1048576
+    assert progress["fps"] == pytest.approx(29.97)
+    assert progress["progress"] == "continue"
+
+
+def test_parse_progress_missing_values():
+    # Đầu job FFmpeg ghi speed=N/A, out_time_us=N/A hoặc âm
+    progress = _parse_progress({"speed": "N/A", "out_time_us": "N/A", "fps": "", "progress": "continue"})
+    assert progress["speed"] is None
+    assert "out_time" not in progress and "fps" not in progress
+    assert _parse_progress({"out_time_ms": "-500"})["out_time"] == 0
+
+
+def test_progress_callback_and_stderr_tail(service):
+    events = []
+    service.run_with_check(["0", "0"], on_progress=events.append, duration=8.0)
+    assert [event["percent"] for event in events] == [25.0, 50.0]
+    assert events[-1]["progress"] == "end"
+    assert service.active == 0
+
+
+def test_failure_raises_with_returncode(service):
+    with pytest.raises(FFmpegError) as exc:
+        service.run_with_check(["0", "3"])
+    assert exc.value.returncode == 3
+    assert "some log line" in exc.value.stderr
+    assert service.active == 0
+
+
+def test_timeout_kills_process_and_releases_slot(service):
+    started = time.perf_counter()
+    with pytest.raises(FFmpegTimeoutError):
+        service.run_with_check(["30", "0"], timeout=0.5)
+    assert time.perf_counter() - started < 10
+    assert service.active == 0
+    # Slot đã trả: chạy lại đủ max_concurrent process cùng lúc
+    processes = [service.popen(["0", "0"]) for _ in range(service.max_concurrent)]
+    for process in processes:
+        process.wait()
+    assert service.active == 0
+
+
+def test_concurrency_bounded_by_slots(service):
+    first = service.popen(["1", "0"])
+    second = service.popen(["1", "0"])
+    assert service.active == 2
+
+    started = threading.Event()
+    waited = []
+
+    def third():
+        started.set()
+        begin = time.perf_counter()
+        service.run_with_check(["0", "0"])
+        waited.append(time.perf_counter() - begin)
+
+    thread = threading.Thread(target=third)
+    thread.start()
+    started.wait()
+    time.sleep(0.2)
+    assert service.waiting == 1
+    first.wait()
+    second.wait()
+    thread.join()
+    assert waited[0] >= 0.5
+    assert service.active == 0 and service.waiting == 0
+
+
+def test_concurrent_wait_and_kill_release_once(service):
+    process = service.popen(["30", "0"])
+    racers = [threading.Thread(target=process.kill) for _ in range(4)]
+    for racer in racers:
+        racer.start()
+    process.wait()
+    for racer in racers:
+        racer.join()
+    # Slot chỉ được trả một lần: BoundedSemaphore không raise, active không âm
+    assert service.active == 0
+    assert service._slots._value == service.max_concurrent
+
+
+def test_import_does_not_search_for_binaries():
+    # Tìm ffmpeg (và ghi log) chỉ khi dùng lần đầu, không phải lúc import -> log chưa được cấu hình
+    code = ("import app.services.youtube.youtube_download_service\n"
+            "from app.services.ffmpeg_service.ffmpeg_locator import ffmpeg_locator\n"
+            "print(sorted(ffmpeg_locator._paths))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+    assert "not found" not in output.stderr and "Using ffmpeg" not in output.stderr
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app.services.facebook.product.host_limiter import AIMDLimit, HostConcurrencyLimiter
+
+
+def test_additive_increase_on_steady_latency():
+    limit = AIMDLimit("www.facebook.com", initial_limit=2, max_limit=4)
+    for _ in range(40):
+        limit.in_flight += 1
+        limit.release(latency=1.0)
+    assert limit.limit == pytest.approx(4.0)  # chạm max_limit, không vượt
+
+
+def test_rate_limit_halves_and_pauses_increase():
+    limit = AIMDLimit("www.facebook.com", initial_limit=8, cooldown=60)
+    limit.in_flight = 1
+    limit.release(latency=1.0, rate_limited=True)
+    assert limit.limit == pytest.approx(4.0)
+    for _ in range(10):
+        limit.in_flight += 1
+        limit.release(latency=1.0)
+    assert limit.limit == pytest.approx(4.0)  # đang cooldown
+
+
+def test_latency_spike_decreases_multiplicatively():
+    limit = AIMDLimit("www.facebook.com", initial_limit=8, max_limit=8)
+    for _ in range(5):
+        limit.in_flight += 1
+        limit.release(latency=1.0)
+    before = limit.limit
+    for _ in range(3):
+        limit.in_flight += 1
+        limit.release(latency=10.0)
+    assert limit.limit < before
+    assert limit.stats["decreases"] >= 1
+
+
+def test_limit_never_below_min():
+    limit = AIMDLimit("www.facebook.com", initial_limit=2, min_limit=1)
+    for _ in range(10):
+        limit.on_rate_limit()
+    assert limit.limit == 1
+
+
+def test_slot_bounds_concurrency_per_host():
+    async def scenario():
+        limiter = HostConcurrencyLimiter(initial_limit=2)
+        running = {"www.facebook.com": 0, "example.com": 0}
+        peak = dict(running)
+
+        async def navigate(url):
+            host = limiter.host_of(url)
+            async with limiter.slot(url):
+                running[host] += 1
+                peak[host] = max(peak[host], running[host])
+                await asyncio.sleep(0.01)
+                running[host] -= 1
+
+        urls = (["https://www.facebook.com/p", "https://m.facebook.com/p", "https://mbasic.facebook.com/p"] * 2
+                + ["https://example.com/p"] * 2)
+        await asyncio.gather(*(navigate(url) for url in urls))
+        assert peak == {"www.facebook.com": 2, "example.com": 2}
+        assert limiter.get_status()["www.facebook.com"]["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_rate_limit_exception_and_cancel():
+    async def scenario():
+        limiter = HostConcurrencyLimiter(initial_limit=4)
+        with pytest.raises(RuntimeError):
+            async with limiter.slot("https://www.facebook.com/a"):
+                raise RuntimeError("HTTP 429 Too Many Requests")
+        limit = limiter.get_limit("www.facebook.com")
+        assert limit.stats["rate_limited"] == 1
+        assert limit.limit == pytest.approx(2.0)
+
+        # Cancel chỉ trả slot, không tính là tín hiệu về host
+        async def hold():
+            async with limiter.slot("https://www.facebook.com/b"):
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert limit.in_flight == 0
+        assert limit.stats["completed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_facebook_aliases_share_one_limit():
+    limiter = HostConcurrencyLimiter()
+    hosts = {limiter.host_of(url) for url in (
+        "https://www.facebook.com/a", "https://m.facebook.com/a", "https://mbasic.facebook.com/a",
+        "https://vi-vn.facebook.com/a", "https://FACEBOOK.com/a", "https://web.facebook.com/a")}
+    assert hosts == {"www.facebook.com"}
+    assert limiter.host_of("https://fb.watch/abc") == "fb.watch"
+    assert limiter.host_of("not a url") == "unknown"
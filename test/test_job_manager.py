@@ -0,0 +1,157 @@
+import asyncio
+import os
+import time
+
+from app.services.facebook.product.job_manager import (
+    ScrapeJob, ScrapeJobManager, JOB_COMPLETED, JOB_RUNNING, JOB_CANCELLED
+)
+
+
+def _data(i):
+    return {"success": i % 3 != 0, "from_cache": i % 5 == 0, "title": f"Post {i}"}
+
+
+class _FakeScraper:
+    """Scraper giả: stream kết quả theo thứ tự URL, `gate` giữ stream lại ở giữa chừng"""
+
+    def __init__(self, gate_at=None):
+        self.gate_at = gate_at
+        self.gate = asyncio.Event()
+
+    async def get_multiple_metadata_streaming(self, urls, **kwargs):
+        for i, url in enumerate(urls):
+            if i == self.gate_at:
+                await self.gate.wait()
+            await asyncio.sleep(0)
+            yield {"url": url, "data": _data(i)}
+
+
+def _manager(tmp_path, scraper, **kwargs):
+    async def provider(config):
+        return scraper
+    return ScrapeJobManager(provider, spool_dir=str(tmp_path), **kwargs)
+
+
+async def _paginate(manager, job_id, limit):
+    pages, cursor = [], 0
+    while cursor is not None:
+        page = await manager.get_results(job_id, cursor=cursor, limit=limit)
+        pages.append(page)
+        cursor = page["next_cursor"]
+    return pages
+
+
+def test_reads_span_spool_file_and_buffer(tmp_path):
+    async def scenario():
+        job = ScrapeJob([], spool_dir=str(tmp_path), flush_bytes=300)
+        for i in range(39):
+            job.add_result(f"https://facebook.com/p/{i}", _data(i))
+            if job.needs_flush:
+                await job.flush()
+        job.add_result("https://facebook.com/p/39", _data(39))
+        # Một phần đã ghi xuống file, phần cuối còn trong buffer
+        assert 0 < job._written < job._spool_size
+        urls = [item["url"] for item in await job.read_results(0, 40)]
+        assert urls == [f"https://facebook.com/p/{i}" for i in range(40)]
+        middle = await job.read_results(5, 35)
+        assert [item["data"]["title"] for item in middle] == [f"Post {i}" for i in range(5, 35)]
+
+        await job.flush()
+        job.close()
+        assert job._written == job._spool_size == os.path.getsize(job.spool_path)
+        assert (await job.read_results(38, 100))[-1]["url"] == "https://facebook.com/p/39"
+        assert await job.read_results(40, 50) == []
+        job.close(remove=True)
+        assert not os.path.exists(job.spool_path)
+
+    asyncio.run(scenario())
+
+
+def test_cursor_pagination_after_completion(tmp_path):
+    async def scenario():
+        manager = _manager(tmp_path, _FakeScraper())
+        urls = [f"https://facebook.com/p/{i}" for i in range(25)]
+        job = manager.submit(urls)
+        await job.task
+        assert job.status == JOB_COMPLETED
+
+        pages = await _paginate(manager, job.id, limit=10)
+        assert [page["cursor"] for page in pages] == [0, 10, 20]
+        assert [page["count"] for page in pages] == [10, 10, 5]
+        assert pages[-1]["next_cursor"] is None
+        assert [item["url"] for page in pages for item in page["results"]] == urls
+
+        status = job.to_status()
+        assert status["processed"] == 25
+        assert status["successful"] == sum(1 for i in range(25) if i % 3 != 0)
+        assert status["cache_hits"] == 5
+        await manager.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_running_job_keeps_cursor_open(tmp_path):
+    async def scenario():
+        scraper = _FakeScraper(gate_at=4)
+        manager = _manager(tmp_path, scraper)
+        job = manager.submit([f"https://facebook.com/p/{i}" for i in range(8)])
+        while job.processed < 4:
+            await asyncio.sleep(0.01)
+
+        page = await manager.get_results(job.id, cursor=0, limit=100)
+        assert page["status"] == JOB_RUNNING
+        assert page["count"] == 4
+        # Hết kết quả hiện có nhưng job chưa xong -> vẫn trả next_cursor để poll tiếp
+        assert page["next_cursor"] == 4
+        empty = await manager.get_results(job.id, cursor=4)
+        assert empty["count"] == 0 and empty["next_cursor"] == 4
+
+        scraper.gate.set()
+        await job.task
+        rest = await manager.get_results(job.id, cursor=4)
+        assert rest["count"] == 4 and rest["next_cursor"] is None
+        await manager.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_job_keeps_partial_results(tmp_path):
+    async def scenario():
+        manager = _manager(tmp_path, _FakeScraper(gate_at=3))
+        job = manager.submit([f"https://facebook.com/p/{i}" for i in range(6)])
+        while job.processed < 3:
+            await asyncio.sleep(0.01)
+        await manager.cancel(job.id)
+        assert job.status == JOB_CANCELLED
+        page = await manager.get_results(job.id)
+        assert page["count"] == 3 and page["next_cursor"] is None
+        await manager.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_expired_jobs_and_spools_removed(tmp_path):
+    async def scenario():
+        manager = _manager(tmp_path, _FakeScraper(), job_ttl=3600, cleanup_interval=0.05)
+        job = manager.submit(["https://facebook.com/p/1"])
+        await job.task
+        assert os.path.exists(job.spool_path)
+        assert await manager.get_results("missing") is None
+
+        # Đọc được trước khi hết hạn; hết hạn thì get/get_results trả None và spool bị xóa
+        assert (await manager.get_results(job.id))["count"] == 1
+        manager.job_ttl = 0
+        time.sleep(0.01)
+        assert manager.get(job.id) is None
+        assert await manager.get_results(job.id) is None
+        assert not os.path.exists(job.spool_path)
+
+        # Vòng dọn định kỳ xóa job hết hạn kể cả khi không có request nào
+        other = manager.submit(["https://facebook.com/p/2"])
+        await other.task
+        await asyncio.wait_for(manager._cleanup_task, timeout=1)
+        assert manager.jobs == {}
+        assert not os.path.exists(other.spool_path)
+        await manager.shutdown()
+
+    asyncio.run(scenario())
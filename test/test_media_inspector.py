@@ -0,0 +1,117 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from app.services.ffmpeg_service import media_inspector as inspector_module
+from app.services.ffmpeg_service.ffmpeg_service import FFmpegService
+from app.services.ffmpeg_service.media_inspector import MediaInspector, MediaInspectionError, summarize_probe
+
+PROBE = {
+    "format": {"format_name": "mov,mp4,m4a", "duration": "212.5", "size": "1048576", "bit_rate": "39475"},
+    "streams": [
+        {"index": 0, "codec_type": "video", "codec_name": "h264", "width": 1280, "height": 720,
+         "avg_frame_rate": "30000/1001", "pix_fmt": "yuv420p", "bit_rate": "30000", "duration": "212.5"},
+        {"index": 1, "codec_type": "audio", "codec_name": "aac", "sample_rate": "44100", "channels": 2,
+         "bit_rate": "128000"},
+    ]
+}
+
+
+def test_summarize_probe():
+    summary = summarize_probe(PROBE)
+    assert summary["format"] == "mov,mp4,m4a"
+    assert summary["duration"] == 212.5
+    assert summary["size"] == 1048576
+    assert (summary["video_codec"], summary["audio_codec"]) == ("h264", "aac")
+    assert (summary["width"], summary["height"]) == (1280, 720)
+    video, audio = summary["streams"]
+    assert video["fps"] == 29.97
+    assert audio["sample_rate"] == 44100 and audio["channels"] == 2
+
+
+def test_summarize_probe_tolerates_missing_fields():
+    summary = summarize_probe({"streams": [{"codec_type": "audio", "codec_name": "opus", "bit_rate": "N/A"}]})
+    assert summary["duration"] is None
+    assert summary["video_codec"] is None and summary["width"] is None
+    assert summary["streams"][0]["bit_rate"] is None
+
+
+class _ProbeCalls(list):
+    """Các file đã probe; `outputs` đặt (stdout, returncode) riêng cho từng file"""
+
+    def __init__(self):
+        super().__init__()
+        self.outputs = {}
+
+
+@pytest.fixture
+def probe_calls(monkeypatch):
+    calls = _ProbeCalls()
+    outputs = calls.outputs
+
+    def fake_probe(args, timeout=None):
+        calls.append(args[-1])
+        stdout, returncode = outputs.get(args[-1], (json.dumps(PROBE), 0))
+        return subprocess.CompletedProcess(args, returncode, stdout.encode(), b"moov atom not found")
+
+    monkeypatch.setitem(inspector_module.ffmpeg_locator._paths, "ffprobe", "ffprobe")
+    monkeypatch.setattr(inspector_module.ffmpeg_service, "probe", fake_probe)
+    return calls
+
+
+@pytest.fixture
+def media_file(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"\x00" * 64)
+    return path
+
+
+def test_inspect_is_cached_until_file_changes(probe_calls, media_file):
+    inspector = MediaInspector()
+    assert inspector.inspect(str(media_file))["video_codec"] == "h264"
+    inspector.inspect(str(media_file))
+    assert len(probe_calls) == 1
+
+    media_file.write_bytes(b"\x00" * 128)
+    inspector.inspect(str(media_file))
+    assert len(probe_calls) == 2
+
+
+def test_unreadable_media_raises(probe_calls, media_file):
+    probe_calls.outputs[str(media_file)] = ("", 1)
+    with pytest.raises(MediaInspectionError, match="moov atom"):
+        MediaInspector().inspect(str(media_file))
+
+    probe_calls.outputs[str(media_file)] = (json.dumps({"format": {}, "streams": []}), 0)
+    with pytest.raises(MediaInspectionError, match="No media streams"):
+        MediaInspector().inspect(str(media_file))
+
+
+def test_missing_ffprobe_returns_none(monkeypatch, media_file):
+    monkeypatch.setitem(inspector_module.ffmpeg_locator._paths, "ffprobe", None)
+    inspector = MediaInspector()
+    assert inspector.available is False
+    assert inspector.inspect(str(media_file)) is None
+
+
+def test_service_probe_holds_a_slot_and_times_out():
+    service = FFmpegService(max_concurrent=1)
+    service.ffprobe_path = sys.executable
+    seen = []
+    result = service.probe(["-c", "print('ok')"])
+    assert result.returncode == 0 and result.stdout.strip() == b"ok"
+
+    original_release = service._release
+
+    def release():
+        seen.append(service.active)
+        original_release()
+
+    service._release = release
+    with pytest.raises(subprocess.TimeoutExpired):
+        service.probe(["-c", "import time; time.sleep(30)"], timeout=0.3)
+    assert seen == [1]  # ffprobe chạy trong slot của FFmpegService
+    assert service.active == 0
+    assert service._slots._value == 1
@@ -0,0 +1,91 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from starlette.background import BackgroundTask
+
+from app.utils.media_response import conditional_file_response, etag_matches, file_etag, media_type_for_file
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def media(tmp_path):
+    path = tmp_path / "Song.mp3"
+    path.write_bytes(CONTENT)
+    return path
+
+
+@pytest.fixture
+def client(media):
+    app = FastAPI()
+    app.state.finished = []
+
+    @app.get("/file")
+    async def get_file(request: Request):
+        return conditional_file_response(request, str(media), filename="Song.mp3", tag="abc",
+                                         background=BackgroundTask(app.state.finished.append, "done"))
+
+    client = TestClient(app)
+    client.finished = app.state.finished
+    return client
+
+
+def test_full_response_has_validators(client, media):
+    response = client.get("/file")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == file_etag(str(media), "abc")
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["cache-control"] == "public, max-age=86400"
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert "Song.mp3" in response.headers["content-disposition"]
+
+
+def test_if_none_match_returns_304_and_runs_background(client):
+    etag = client.get("/file").headers["etag"]
+    client.finished.clear()
+    for header in (etag, f'"other", W/{etag}', "*"):
+        response = client.get("/file", headers={"If-None-Match": header})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+    # Background (vd unpin file của store) vẫn chạy khi trả 304
+    assert client.finished == ["done"] * 3
+
+    assert client.get("/file", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_range_returns_206(client):
+    response = client.get("/file", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+
+    tail = client.get("/file", headers={"Range": "bytes=-24"})
+    assert tail.status_code == 206 and tail.content == CONTENT[-24:]
+
+
+def test_if_range_uses_sent_validators(client):
+    etag = client.get("/file").headers["etag"]
+    fresh = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert fresh.status_code == 206 and fresh.content == CONTENT[:10]
+
+    stale = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert stale.status_code == 200 and stale.content == CONTENT
+
+    last_modified = client.get("/file").headers["last-modified"]
+    by_date = client.get("/file", headers={"Range": "bytes=5-9", "If-Range": last_modified})
+    assert by_date.status_code == 206 and by_date.content == CONTENT[5:10]
+
+
+def test_unsatisfiable_range(client):
+    assert client.get("/file", headers={"Range": f"bytes={len(CONTENT) + 10}-"}).status_code == 416
+
+
+def test_etag_helpers(media):
+    etag = file_etag(str(media))
+    assert etag.startswith('"') and etag.endswith('"')
+    assert not etag_matches(None, etag)
+    assert etag_matches(f"W/{etag}", etag)
+    assert media_type_for_file("clip.mp4") == "video/mp4"
+    assert media_type_for_file("blob.unknownext") == "application/octet-stream"
@@ -0,0 +1,164 @@
+import io
+
+import pytest
+import yt_dlp
+
+from app.services.youtube import youtube_download_service as service_module
+from app.services.youtube.youtube_download_service import YouTubeDownloadService
+
+MEDIA = bytes(range(256)) * 40  # 10240 bytes
+MEDIA_URL = "https://rr1.googlevideo.com/videoplayback?itag=18"
+
+
+class _FakeResponse(io.BytesIO):
+    def __init__(self, body, status, headers):
+        super().__init__(body)
+        self.status = status
+        self.headers = headers
+
+
+class _FakeYDL:
+    """Session HTTP giả của yt-dlp: phục vụ Range (206) hoặc bỏ qua Range (200)"""
+
+    def __init__(self, honour_range=True, content_range=True, fail_after=None):
+        self.honour_range = honour_range
+        self.content_range = content_range
+        self.fail_after = fail_after
+        self.ranges = []
+
+    def urlopen(self, request):
+        byte_range = request.headers["Range"]
+        self.ranges.append(byte_range)
+        if self.fail_after is not None and len(self.ranges) > self.fail_after:
+            raise yt_dlp.networking.exceptions.TransportError("connection reset")
+        if not self.honour_range:
+            return _FakeResponse(MEDIA, 200, {})
+        start, end = (int(part) for part in byte_range.removeprefix("bytes=").split("-"))
+        body = MEDIA[start:end + 1]
+        headers = {"Content-Range": f"bytes {start}-{start + len(body) - 1}/{len(MEDIA)}"} if self.content_range else {}
+        return _FakeResponse(body, 206, headers)
+
+
+class _FakeProcess:
+    def __init__(self, args):
+        self.args = args
+        self.stdin = io.BytesIO()
+        self.stdin.close = lambda: setattr(self, "stdin_closed", True)
+        self.stdin_closed = False
+        self.checked = False
+        self.killed = False
+
+    def check(self, timeout=None):
+        self.checked = True
+
+    def kill(self):
+        self.killed = True
+
+
+class _FakeFFmpegService:
+    default_timeout = 10
+
+    def __init__(self):
+        self.processes = []
+        self.runs = []
+
+    def popen(self, args, stdin=None, stdout=None):
+        process = _FakeProcess(args)
+        self.processes.append(process)
+        return process
+
+    def run_with_check(self, args, timeout=None):
+        self.runs.append(args)
+        return "", ""
+
+
+@pytest.fixture
+def ffmpeg(monkeypatch):
+    fake = _FakeFFmpegService()
+    monkeypatch.setattr(service_module, "ffmpeg_service", fake)
+    return fake
+
+
+def _pipe(ydl, chunk_size=4096, progress=None, expected_size=None):
+    YouTubeDownloadService._pipe_to_ffmpeg(ydl, MEDIA_URL, {"User-Agent": "test"}, ["-vn", "-acodec", "mp3"],
+                                           "/tmp/out.mp3", progress, expected_size=expected_size,
+                                           chunk_size=chunk_size)
+
+
+def test_ranged_chunks_are_piped_in_order(ffmpeg):
+    ydl = _FakeYDL()
+    events = []
+    _pipe(ydl, progress=events.append)
+
+    process, = ffmpeg.processes
+    assert process.args[:2] == ["-i", "pipe:0"] and process.args[-2:] == ["-y", "/tmp/out.mp3"]
+    assert process.stdin.getvalue() == MEDIA
+    assert process.stdin_closed and process.checked and not process.killed
+    assert ydl.ranges == ["bytes=0-4095", "bytes=4096-8191", "bytes=8192-12287"]
+    assert events[-1]["downloaded_bytes"] == events[-1]["total_bytes"] == len(MEDIA)
+
+
+def test_server_ignoring_range_sends_whole_file_once(ffmpeg):
+    ydl = _FakeYDL(honour_range=False)
+    _pipe(ydl)
+    assert ydl.ranges == ["bytes=0-4095"]
+    assert ffmpeg.processes[0].stdin.getvalue() == MEDIA
+
+
+def test_unknown_size_stops_on_short_chunk(ffmpeg):
+    ydl = _FakeYDL(content_range=False)
+    _pipe(ydl)
+    assert len(ydl.ranges) == 3
+    assert ffmpeg.processes[0].stdin.getvalue() == MEDIA
+
+
+def test_network_error_kills_ffmpeg(ffmpeg):
+    with pytest.raises(yt_dlp.networking.exceptions.TransportError):
+        _pipe(_FakeYDL(fail_after=1))
+    process, = ffmpeg.processes
+    assert process.killed and not process.checked
+
+
+def test_cancel_from_progress_hook_kills_ffmpeg(ffmpeg):
+    def cancel(event):
+        raise yt_dlp.utils.DownloadCancelled("job cancelled")
+
+    with pytest.raises(yt_dlp.utils.DownloadCancelled):
+        _pipe(_FakeYDL(), progress=cancel)
+    assert ffmpeg.processes[0].killed
+
+
+class _FakeSelectingYDL(_FakeYDL):
+    """YoutubeDL giả cho fallback: chọn sẵn một format với `protocol`"""
+    protocol = "https"
+
+    def __init__(self, opts):
+        super().__init__(fail_after=0)
+        self.params = dict(opts)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def process_ie_result(self, info, download=False):
+        return {**info, "requested_downloads": [{"url": MEDIA_URL, "protocol": self.protocol,
+                                                 "http_headers": {"User-Agent": "test"}}]}
+
+
+@pytest.mark.parametrize("protocol", ["https", "m3u8_native"])
+def test_fallback_lets_ffmpeg_read_url_when_pipe_unavailable(monkeypatch, ffmpeg, tmp_path, protocol):
+    # https: pipe lỗi mạng -> FFmpeg tự đọc URL; HLS: FFmpeg đọc URL ngay
+    monkeypatch.setattr(_FakeSelectingYDL, "protocol", protocol)
+    monkeypatch.setattr(service_module.yt_dlp, "YoutubeDL", _FakeSelectingYDL)
+    monkeypatch.setattr(YouTubeDownloadService, "_extract_info", lambda url: {"id": "dQw4w9WgXcQ", "title": "Song"})
+
+    path = YouTubeDownloadService._download_audio_from_lowest_quality_video(
+        "https://youtu.be/dQw4w9WgXcQ", "mp3", "Song", str(tmp_path))
+
+    assert path == f"{tmp_path}/Song.mp3"
+    assert len(ffmpeg.processes) == (1 if protocol == "https" else 0)
+    args, = ffmpeg.runs
+    assert args[:3] == ["-headers", "User-Agent: test\r\n", "-i"] and args[3] == MEDIA_URL
+    assert args[-2:] == ["-y", path]
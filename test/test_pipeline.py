@@ -0,0 +1,69 @@
+import asyncio
+
+from app.services.facebook.product.pipeline import BoundedTaskWindow
+
+
+def test_window_bounds_tasks_in_flight():
+    async def scenario():
+        running = 0
+        peak = 0
+
+        async def worker(item):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.001 * (item % 3))
+            running -= 1
+            return item * 2
+
+        window = BoundedTaskWindow(worker, window=4)
+        results = []
+        async for result in window.stream(range(50)):
+            assert window.in_flight <= 4
+            results.append(result)
+
+        assert peak == 4
+        assert sorted(results) == [i * 2 for i in range(50)]
+        assert window.submitted == window.completed == 50
+
+    asyncio.run(scenario())
+
+
+def test_slow_consumer_applies_backpressure():
+    async def scenario():
+        async def worker(item):
+            return item
+
+        window = BoundedTaskWindow(worker, window=2)
+        stream = window.stream(range(100))
+        await stream.__anext__()
+        await asyncio.sleep(0.01)  # consumer chậm: không nạp thêm việc khi chưa lấy kết quả
+        assert window.submitted == 2
+        await stream.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_closing_stream_cancels_running_tasks():
+    async def scenario():
+        cancelled = []
+
+        async def worker(item):
+            try:
+                if item == 0:
+                    return item
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(item)
+                raise
+
+        window = BoundedTaskWindow(worker, window=3)
+        stream = window.stream(range(1000))
+        assert await stream.__anext__() == 0
+        await stream.aclose()
+
+        assert window.in_flight == 0
+        assert sorted(cancelled) == [1, 2]
+        assert window.submitted == 3  # phần việc chưa bắt đầu bị bỏ qua
+
+    asyncio.run(scenario())
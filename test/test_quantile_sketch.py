@@ -0,0 +1,162 @@
+import asyncio
+import random
+
+import pytest
+
+from app.services.facebook.product.quantile_sketch import DDSketch, WindowedSketch, RedisSketchStore
+
+QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1.0)
+
+
+def _exact(sorted_values, q):
+    return sorted_values[int(q * (len(sorted_values) - 1))]
+
+
+@pytest.mark.parametrize("distribution", ["lognormal", "uniform", "exponential"])
+def test_quantile_relative_error_within_accuracy(distribution):
+    rng = random.Random(7)
+    generate = {
+        "lognormal": lambda: rng.lognormvariate(0, 1.5),
+        "uniform": lambda: rng.uniform(0.01, 60.0),
+        "exponential": lambda: rng.expovariate(0.5),
+    }[distribution]
+    values = [generate() for _ in range(20000)]
+
+    sketch = DDSketch(relative_accuracy=0.02)
+    for value in values:
+        sketch.add(value)
+
+    values.sort()
+    for q in QUANTILES:
+        exact = _exact(values, q)
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+    # Số bucket không phụ thuộc số mẫu
+    assert len(sketch.bins) < 1000
+
+
+def test_zero_values_and_empty_sketch():
+    sketch = DDSketch()
+    assert sketch.quantile(0.5) is None
+    for value in (0.0, 0.0, 0.0, 5.0):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(5.0, rel=0.02)
+
+
+def test_merge_equals_single_sketch_and_subtract_restores():
+    rng = random.Random(3)
+    first, second, combined = DDSketch(), DDSketch(), DDSketch()
+    for i in range(5000):
+        value = rng.expovariate(1.0)
+        (first if i % 2 else second).add(value)
+        combined.add(value)
+
+    merged = first.copy()
+    merged.merge(second)
+    assert merged.bins == combined.bins
+    assert merged.count == combined.count
+
+    merged.subtract(second)
+    assert merged.bins == first.bins
+    assert merged.count == first.count
+
+
+def test_counts_round_trip():
+    sketch = DDSketch()
+    for value in (0.0, 0.5, 1.0, 2.0, 2.0, 300.0):
+        sketch.add(value)
+    restored = DDSketch.from_counts({key.encode(): str(count) for key, count in sketch.to_counts().items()})
+    assert restored.bins == sketch.bins
+    assert restored.zero_count == sketch.zero_count
+    assert restored.count == sketch.count
+
+
+def test_combining_different_accuracy_fails():
+    with pytest.raises(ValueError):
+        DDSketch(0.01).merge(DDSketch(0.02))
+
+
+def test_windowed_sketch_expires_old_slices():
+    window = WindowedSketch(window_seconds=100, slices=10)
+    for _ in range(100):
+        window.add(50.0, now=1000.0)
+    for _ in range(10):
+        window.add(1.5, now=1050.0)
+    assert window.sketch(now=1050.0).count == 110
+    assert window.sketch(now=1050.0).quantile(0.5) == pytest.approx(50.0, rel=0.02)
+
+    # Lát ở t=1000 ra khỏi cửa sổ 100 giây
+    assert window.sketch(now=1101.0).count == 10
+    assert window.sketch(now=1101.0).quantile(0.5) == pytest.approx(1.5, rel=0.02)
+    assert window.sketch(now=1200.0).count == 0
+
+
+def test_sorted_keys_cache_follows_new_and_removed_buckets():
+    sketch = DDSketch()
+    for value in (10.0, 20.0, 30.0):
+        sketch.add(value)
+    assert sketch.quantile(0.0) == pytest.approx(10.0, rel=0.02)
+    cached = sketch._sorted_keys
+    sketch.add(20.0)  # bucket cũ: không sort lại
+    assert sketch._sorted_keys is cached
+
+    sketch.add(1.5)  # bucket mới nhỏ hơn mọi bucket cũ
+    assert sketch.quantile(0.0) == pytest.approx(1.5, rel=0.02)
+    low = DDSketch()
+    low.add(1.5)
+    sketch.subtract(low)  # bucket bị xóa
+    assert sketch.quantile(0.0) == pytest.approx(10.0, rel=0.02)
+    assert sketch.quantile(1.0) == pytest.approx(30.0, rel=0.02)
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def hincrby(self, key, field, count):
+        self.ops.append((key, field, count))
+
+    def expire(self, key, ttl):
+        pass
+
+    def sadd(self, key, member):
+        pass
+
+    async def execute(self):
+        if self.redis.fail:
+            raise ConnectionError("redis down")
+        for key, field, count in self.ops:
+            fields = self.redis.hashes.setdefault(key, {})
+            fields[field] = fields.get(field, 0) + count
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.fail = False
+        self.hashes = {}
+
+    def pipeline(self, transaction=False):
+        return _FakePipeline(self)
+
+
+def test_failed_flush_keeps_pending_counts():
+    async def scenario():
+        store = RedisSketchStore("redis://localhost:6379")
+        store._redis = _FakeRedis()
+        store._redis.fail = True
+        for value in (1.5, 2.0, 0.0):
+            store.record("simple", value)
+        with pytest.raises(ConnectionError):
+            await store.flush()
+        store.record("simple", 3.0)  # ghi thêm trong lúc Redis lỗi
+
+        store._redis.fail = False
+        await store.flush()
+        assert store._pending == {}
+        hashes = store._redis.hashes
+        assert all(key.startswith("fb_scaler:queue_wait:simple:") for key in hashes)
+        assert sum(count for fields in hashes.values() for count in fields.values()) == 4
+        assert sum(fields.get("z", 0) for fields in hashes.values()) == 1
+
+    asyncio.run(scenario())
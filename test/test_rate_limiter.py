@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from app.services.facebook.product.rate_limiter import TokenBucket, RateLimiter
+
+
+def test_bucket_burst_then_wait():
+    bucket = TokenBucket(rate=10.0, capacity=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    # Token thứ 3 phải chờ ~1/rate giây, thứ 4 ~2/rate
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_refund_returns_reserved_token():
+    bucket = TokenBucket(rate=1.0, capacity=1)
+    bucket.reserve()
+    waiting = bucket.reserve()
+    assert waiting == pytest.approx(1.0, abs=0.01)
+    bucket.refund()
+    # Reservation bị hủy được trả lại: người sau không phải chờ thay
+    assert bucket.reserve() == pytest.approx(waiting, abs=0.01)
+
+
+def test_refund_never_exceeds_capacity():
+    bucket = TokenBucket(rate=1.0, capacity=3)
+    bucket.refund(5)
+    assert bucket.available == pytest.approx(3.0)
+
+
+def test_cancelled_waiter_refunds_token():
+    async def scenario():
+        limiter = RateLimiter(max_requests_per_minute=60, burst_size=1)
+        await limiter.wait_for_token()
+        tokens_before = limiter._bucket.available
+
+        waiter = asyncio.create_task(limiter.wait_for_token())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert limiter._bucket.available == pytest.approx(tokens_before + 0.01, abs=0.02)
+        assert limiter.stats["acquired"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_permit_released_on_success_and_error():
+    async def scenario():
+        limiter = RateLimiter(max_requests_per_minute=6000, burst_size=10)
+        async with limiter.permit():
+            assert limiter.permits_in_use == 1
+        assert limiter.permits_in_use == 0
+
+        with pytest.raises(RuntimeError):
+            async with limiter.permit():
+                raise RuntimeError("scrape failed")
+        assert limiter.permits_in_use == 0
+
+        # Release thừa không làm counter âm
+        limiter.release()
+        assert limiter.permits_in_use == 0
+
+    asyncio.run(scenario())
+
+
+class _FakeGlobalBucket:
+    """Script Redis giả: ghi lại số token được reserve/trả, chờ `delay` giây trước khi trả lời"""
+
+    def __init__(self, wait=0.0, delay=0.0):
+        self.wait = wait
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, keys, args):
+        await asyncio.sleep(self.delay)
+        self.calls.append(args[2])
+        return str(self.wait)
+
+
+def _global_limiter(bucket):
+    limiter = RateLimiter(max_requests_per_minute=6000, burst_size=10, global_requests_per_minute=60)
+    limiter._global_bucket = bucket
+    return limiter
+
+
+def test_cancel_during_global_wait_refunds_both_buckets():
+    async def scenario():
+        bucket = _FakeGlobalBucket(wait=5.0)
+        limiter = _global_limiter(bucket)
+        tokens_before = limiter._bucket.available
+
+        waiter = asyncio.create_task(limiter.wait_for_token())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.gather(*limiter._refund_tasks)
+
+        assert bucket.calls == [1, -1.0]
+        assert limiter._bucket.available == pytest.approx(tokens_before, abs=0.01)
+
+    asyncio.run(scenario())
+
+
+def test_cancel_during_global_reservation_refunds_local_only():
+    async def scenario():
+        bucket = _FakeGlobalBucket(delay=5.0)
+        limiter = _global_limiter(bucket)
+        tokens_before = limiter._bucket.available
+
+        waiter = asyncio.create_task(limiter.wait_for_token())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        # Không biết script Redis đã chạy chưa -> không trả token global
+        assert limiter._refund_tasks == set()
+        assert limiter._bucket.available == pytest.approx(tokens_before, abs=0.01)
+
+    asyncio.run(scenario())
+
+
+def test_global_bucket_failure_falls_back_to_local():
+    async def scenario():
+        async def broken(keys, args):
+            raise ConnectionError("redis down")
+
+        limiter = _global_limiter(broken)
+        assert await limiter.wait_for_token() == 0.0
+        assert limiter.stats["global_fallbacks"] == 1
+        assert limiter.stats["acquired"] == 1
+
+    asyncio.run(scenario())
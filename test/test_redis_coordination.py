@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.facebook.product.task_engine import RedisCoordination
+
+
+class _FakePubSub:
+    def __init__(self):
+        self.subscribed = []
+
+    async def subscribe(self, channel):
+        self.subscribed.append(channel)
+
+    async def unsubscribe(self, channel):
+        self.subscribed.remove(channel)
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=1.0):
+        await asyncio.sleep(0.01)
+        return None
+
+
+class _FakeRedis:
+    """Redis giả: lock do `holder` giữ sẵn (process khác) hoặc để trống"""
+
+    def __init__(self, holder=None):
+        self.locks = {} if holder is None else {"*": holder}
+        self.published = []
+
+    async def set(self, key, value, nx=False, ex=None):
+        if "*" in self.locks or key in self.locks:
+            return None
+        self.locks[key] = value
+        return True
+
+    async def expire(self, key, ttl):
+        return key in self.locks
+
+    async def delete(self, key):
+        self.locks.pop(key, None)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+
+
+def _coordination(redis):
+    coordination = RedisCoordination(wait_timeout=0.1)
+    coordination._redis = redis
+    coordination._pubsub = _FakePubSub()
+    return coordination
+
+
+def test_leader_error_reports_original_url():
+    async def scenario():
+        redis = _FakeRedis()
+        coordination = _coordination(redis)
+
+        async def failing(cache_key, url):
+            raise RuntimeError("page crashed")
+
+        with pytest.raises(RuntimeError):
+            await coordination.execute_with_coordination(
+                "facebook.com/story.php?id=1", failing, "facebook.com/story.php?id=1",
+                "https://m.facebook.com/story.php?id=1&ref=share",
+                source_url="https://m.facebook.com/story.php?id=1&ref=share")
+        _, payload = redis.published[0]
+        assert payload["url"] == "https://m.facebook.com/story.php?id=1&ref=share"
+        assert payload["error_type"] == "coordination_error"
+        assert redis.locks == {}  # leader trả lock
+
+    asyncio.run(scenario())
+
+
+def test_follower_wait_uses_configured_timeout():
+    async def scenario():
+        coordination = _coordination(_FakeRedis(holder="proc_other"))
+
+        async def never_called():
+            raise AssertionError("follower must not scrape")
+
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(TimeoutError):
+            await coordination.execute_with_coordination("key", never_called)
+        assert asyncio.get_running_loop().time() - started < 1.0
+        assert coordination._pubsub.subscribed == []
+
+    asyncio.run(scenario())
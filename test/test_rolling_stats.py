@@ -0,0 +1,54 @@
+import random
+import statistics
+
+import pytest
+
+from app.services.facebook.product.rolling_stats import EWMA, RollingWindow
+
+
+def test_window_matches_statistics_over_last_n():
+    rng = random.Random(42)
+    window = RollingWindow(50)
+    values = []
+    for _ in range(1000):
+        value = rng.lognormvariate(0, 1) * 100
+        window.add(value)
+        values.append(value)
+        last = values[-50:]
+        assert window.count == len(last)
+        assert window.mean == pytest.approx(statistics.fmean(last), rel=1e-9)
+        if len(last) > 1:
+            assert window.variance == pytest.approx(statistics.variance(last), rel=1e-6, abs=1e-9)
+
+
+def test_window_order_and_last():
+    window = RollingWindow(3)
+    assert window.last() is None
+    assert window.mean == 0.0 and window.stdev == 0.0
+    for value in (1, 2, 3, 4, 5):
+        window.add(value)
+    assert window.values() == [3.0, 4.0, 5.0]
+    assert window.last() == 5.0
+    assert len(window) == 3
+    assert window.stdev == pytest.approx(1.0)
+
+
+def test_window_of_one():
+    window = RollingWindow(1)
+    for value in (10, 20, 30):
+        window.add(value)
+    assert window.mean == 30.0
+    assert window.variance == 0.0
+
+
+def test_window_rejects_invalid_size():
+    with pytest.raises(ValueError):
+        RollingWindow(0)
+
+
+def test_ewma():
+    ewma = EWMA(alpha=0.5)
+    assert ewma.get_value() is None
+    assert ewma.update(10) == 10
+    assert ewma.update(20) == 15
+    assert ewma.update(20) == 17.5
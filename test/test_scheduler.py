@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app.services.facebook.product.scheduler import (
+    ScrapeScheduler, SchedulerRejectedError, SchedulerDeadlineError,
+    PRIORITY_INTERACTIVE, PRIORITY_BATCH
+)
+
+
+async def _dispatch_order(scheduler, requests):
+    """
+    Giữ slot duy nhất, xếp hàng `requests` (label, mode, client_id, priority) theo thứ tự,
+    rồi nhả slot và trả về thứ tự được cấp slot
+    """
+    blocker = await scheduler.acquire()
+    order = []
+
+    async def worker(label, mode, client_id, priority):
+        ticket = await scheduler.acquire(mode, client_id, priority)
+        order.append(label)
+        scheduler.release(ticket)
+
+    tasks = []
+    for request in requests:
+        tasks.append(asyncio.create_task(worker(*request)))
+        await asyncio.sleep(0)  # enqueue theo đúng thứ tự
+    assert scheduler.total_queued() == len(requests)
+
+    scheduler.release(blocker)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_fair_queuing_between_clients():
+    scheduler = ScrapeScheduler(max_concurrent=1)
+    requests = [(f"a{i}", "simple", "client-a", PRIORITY_BATCH) for i in range(4)]
+    requests += [(f"b{i}", "simple", "client-b", PRIORITY_BATCH) for i in range(2)]
+
+    order = asyncio.run(_dispatch_order(scheduler, requests))
+
+    # client-b đến sau 4 request của client-a nhưng không phải chờ cả batch
+    assert order == ["a0", "b0", "a1", "b1", "a2", "a3"]
+    assert scheduler.total_queued() == 0
+
+
+def test_interactive_priority_goes_first():
+    scheduler = ScrapeScheduler(max_concurrent=1)
+    requests = [(f"batch{i}", "simple", "bulk", PRIORITY_BATCH) for i in range(3)]
+    requests.append(("single", "simple", "user", PRIORITY_INTERACTIVE))
+
+    order = asyncio.run(_dispatch_order(scheduler, requests))
+
+    assert order[0] == "single"
+
+
+def test_stride_shares_slots_by_mode_weight():
+    scheduler = ScrapeScheduler(max_concurrent=1, mode_weights={"simple": 3.0, "super": 1.0})
+    requests = [(f"simple{i}", "simple", "c", PRIORITY_BATCH) for i in range(12)]
+    requests += [(f"super{i}", "super", "c", PRIORITY_BATCH) for i in range(12)]
+
+    order = asyncio.run(_dispatch_order(scheduler, requests))
+
+    first = order[:8]
+    assert sum(label.startswith("simple") for label in first) == 6
+    assert sum(label.startswith("super") for label in first) == 2
+
+
+def test_admission_control_rejects_when_wait_exceeds_budget():
+    async def scenario():
+        scheduler = ScrapeScheduler(max_concurrent=1, default_service_time=10.0)
+        ticket = await scheduler.acquire()
+        with pytest.raises(SchedulerRejectedError) as exc_info:
+            await scheduler.acquire(budget=1.0)
+        assert exc_info.value.estimated_wait == pytest.approx(10.0)
+        assert scheduler.stats["rejected"] == 1
+        scheduler.release(ticket)
+
+    asyncio.run(scenario())
+
+
+def test_deadline_expires_while_queued():
+    async def scenario():
+        scheduler = ScrapeScheduler(max_concurrent=1, default_service_time=0.01)
+        ticket = await scheduler.acquire()
+        with pytest.raises(SchedulerDeadlineError):
+            await scheduler.acquire(budget=0.05)
+        # Ticket hết hạn được bỏ khỏi hàng đợi, slot vẫn dùng được
+        assert scheduler.total_queued() == 0
+        scheduler.release(ticket)
+        async with scheduler.slot():
+            assert scheduler.get_status()["in_use"] == 1
+        assert scheduler.get_status()["in_use"] == 0
+
+    asyncio.run(scenario())
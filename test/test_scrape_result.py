@@ -0,0 +1,74 @@
+import dataclasses
+
+import pytest
+
+from app.services.facebook.product.scrape_result import ScrapeResult
+from app.utils.fast_json import dumps_bytes, loads
+
+
+def _result():
+    fetch = {"url": "https://www.facebook.com/a", "final_url": "https://www.facebook.com/a/",
+             "navigation_time": 1.5, "timestamp": 100.0}
+    extracted = {"title": "Title", "description": "Desc", "extraction_time": 0.2}
+    return ScrapeResult.from_scrape(fetch, extracted, scrape_time=2.0)
+
+
+def test_from_scrape_flattens_to_legacy_dict_shape():
+    result = _result()
+    assert result.to_dict() == {
+        "url": "https://www.facebook.com/a",
+        "success": True,
+        "from_cache": False,
+        "scrape_time": 2.0,
+        "final_url": "https://www.facebook.com/a/",
+        "navigation_time": 1.5,
+        "extraction_time": 0.2,
+        "timestamp": 100.0,
+        "title": "Title",
+        "description": "Desc",
+    }
+    # Đọc như dict
+    assert result["title"] == "Title"
+    assert result.get("error") is None
+    assert "description" in result
+
+
+def test_immutable_and_slotted():
+    result = _result()
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        result.success = False
+    assert not hasattr(result, "__dict__")
+
+
+def test_dict_round_trip():
+    result = _result()
+    restored = ScrapeResult.from_dict(loads(dumps_bytes(result)))
+    assert restored == result
+    assert restored.data == {"title": "Title", "description": "Desc"}
+
+
+def test_as_cached_does_not_touch_original():
+    result = _result()
+    result.to_dict()
+    cached = result.as_cached()
+    assert cached.from_cache is True
+    assert cached["from_cache"] is True
+    assert result["from_cache"] is False
+    assert cached.data is result.data
+    assert cached.as_cached() is cached
+
+
+def test_failure_and_coerce():
+    failure = ScrapeResult.failure("https://www.facebook.com/b", "boom", "scraping_error", estimated_wait=3.0)
+    assert failure["success"] is False
+    assert failure["error_type"] == "scraping_error"
+    assert failure["estimated_wait"] == 3.0
+    assert ScrapeResult.coerce(failure) is failure
+    assert ScrapeResult.coerce(None).url == ""
+
+
+def test_timings_only_on_copy():
+    result = _result()
+    traced = result.with_timings({"navigation": 1.5})
+    assert traced["timings"] == {"navigation": 1.5}
+    assert "timings" not in result
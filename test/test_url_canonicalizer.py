@@ -0,0 +1,70 @@
+import pytest
+
+from app.services.facebook.product.url_canonicalizer import (
+    FacebookUrlCanonicalizer, normalize_facebook_url
+)
+
+
+@pytest.mark.parametrize("url", [
+    "https://m.facebook.com/groups/123/posts/456/?fbclid=abc&__cft__[0]=x",
+    "http://vi-vn.facebook.com/photo.php?fbid=1&set=a.2&locale=vi_VN",
+    "https://web.facebook.com/watch/?v=789&mibextid=Zx&utm_source=share#comments",
+    "https://www.facebook.com:443/page/",
+    "https://fb.watch/abcDEF/",
+])
+def test_normalize_is_idempotent(url):
+    once = normalize_facebook_url(url)
+    assert normalize_facebook_url(once) == once
+
+
+def test_equivalent_urls_share_one_key():
+    canonicalizer = FacebookUrlCanonicalizer()
+    urls = [
+        "https://m.facebook.com/groups/123/posts/456/?fbclid=abc",
+        "http://mbasic.facebook.com/groups/123/posts/456",
+        "https://www.facebook.com/groups/123/posts/456/?utm_source=x#top",
+        "https://en-gb.facebook.com/groups/123/posts/456?locale=en_GB",
+    ]
+    assert {canonicalizer.canonicalize(url) for url in urls} == {
+        "https://www.facebook.com/groups/123/posts/456"
+    }
+
+
+def test_query_params_sorted_and_content_params_kept():
+    assert (normalize_facebook_url("https://facebook.com/photo.php?set=a.2&fbid=1&ref=share")
+            == "https://www.facebook.com/photo.php?fbid=1&set=a.2")
+
+
+def test_non_facebook_host_keeps_host():
+    assert normalize_facebook_url("https://example.com/a/?fbclid=1") == "https://example.com/a"
+
+
+def test_short_link_resolution_collapses_to_target():
+    canonicalizer = FacebookUrlCanonicalizer()
+    short = "https://www.facebook.com/share/p/1Akpqhq1p6/"
+    assert canonicalizer.is_short_link(canonicalizer.canonicalize(short))
+
+    target = canonicalizer.record_resolution(short, "https://m.facebook.com/story.php?story_fbid=9&id=1&mibextid=x")
+    assert target == "https://www.facebook.com/story.php?id=1&story_fbid=9"
+    assert canonicalizer.canonicalize(short) == target
+    # Canonical key đã resolve cũng idempotent
+    assert canonicalizer.canonicalize(target) == target
+
+
+def test_unresolved_redirect_is_not_recorded():
+    canonicalizer = FacebookUrlCanonicalizer()
+    short = "https://fb.watch/abcDEF/"
+    assert canonicalizer.record_resolution(short, "https://www.facebook.com/login/?next=x") is None
+    assert canonicalizer.canonicalize(short) == normalize_facebook_url(short)
+
+
+def test_group_urls_keeps_first_seen_order():
+    canonicalizer = FacebookUrlCanonicalizer()
+    groups = canonicalizer.group_urls([
+        "https://m.facebook.com/a",
+        "https://www.facebook.com/b",
+        "https://www.facebook.com/a/?fbclid=1",
+        "https://m.facebook.com/a",
+    ])
+    assert list(groups) == ["https://www.facebook.com/a", "https://www.facebook.com/b"]
+    assert groups["https://www.facebook.com/a"] == ["https://m.facebook.com/a", "https://www.facebook.com/a/?fbclid=1"]
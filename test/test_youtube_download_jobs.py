@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.youtube import youtube_download_jobs as jobs_module
+from app.services.youtube.youtube_download_jobs import (
+    YouTubeDownloadJobManager, DownloadQueueFullError,
+    KIND_VIDEO, KIND_AUDIO, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED
+)
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+class _FakeDownloads:
+    """Thay YouTubeDownloadService: tải giả gọi progress hook vài lần rồi trả về đường dẫn file"""
+
+    def __init__(self, tmp_path, steps=5, delay=0.02, fail=False):
+        self.tmp_path = tmp_path
+        self.steps = steps
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _download(self, name, progress_hook):
+        with self._lock:
+            self.calls.append(name)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            path = self.tmp_path / name
+            for i in range(self.steps):
+                time.sleep(self.delay)
+                if progress_hook is not None:
+                    progress_hook({"status": "downloading", "filename": str(path),
+                                   "tmpfilename": f"{path}.part", "downloaded_bytes": (i + 1) * 10,
+                                   "total_bytes": self.steps * 10})
+            if self.fail:
+                raise RuntimeError("HTTP Error 403: Forbidden")
+            path.write_bytes(b"x" * self.steps * 10)
+            return str(path)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def video(self, url, quality, mode, progress_hook=None):
+        return self._download(f"{url[-11:]}-{mode}-{quality}.mp4", progress_hook)
+
+    def audio(self, url, audio_format, progress_hook=None):
+        return self._download(f"{url[-11:]}.{audio_format}", progress_hook)
+
+
+@pytest.fixture
+def downloads(monkeypatch, tmp_path):
+    fake = _FakeDownloads(tmp_path)
+    monkeypatch.setattr(jobs_module.YouTubeDownloadService, "_download_video_sync", fake.video)
+    monkeypatch.setattr(jobs_module.YouTubeDownloadService, "_download_audio_sync", fake.audio)
+    return fake
+
+
+def test_duplicate_requests_share_one_job(downloads):
+    async def scenario():
+        manager = YouTubeDownloadJobManager(max_workers=2)
+        first = manager.submit(URL, KIND_VIDEO, quality="720p", mode="merged")
+        second = manager.submit(f"https://youtu.be/{URL[-11:]}", KIND_VIDEO, quality="720p", mode="merged")
+        assert second is first
+        path = await manager.wait(first)
+        assert first.status == JOB_COMPLETED and first.progress == 1.0
+        # Job đã xong và file còn -> request sau dùng lại, không tải lại
+        assert manager.submit(URL, KIND_VIDEO, quality="720p", mode="merged") is first
+        # Khác quality -> job mới
+        other = manager.submit(URL, KIND_VIDEO, quality="1080p", mode="merged")
+        assert other is not first
+        await manager.wait(other)
+        assert downloads.calls == [path.rsplit("/", 1)[-1], other.file_path.rsplit("/", 1)[-1]]
+        await manager.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_workers_bound_and_queue_position(downloads):
+    async def scenario():
+        manager = YouTubeDownloadJobManager(max_workers=2)
+        jobs = [manager.submit(URL, KIND_AUDIO, audio_format=fmt) for fmt in ("mp3", "m4a", "wav", "flac")]
+        await asyncio.sleep(0.01)
+        positions = [manager.status(job)["queue_position"] for job in jobs]
+        assert positions[:2] == [None, None]
+        assert positions[2:] == [0, 1]
+        for job in jobs:
+            await manager.wait(job)
+        assert downloads.peak == 2
+        await manager.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_queue_full_is_rejected(downloads):
+    async def scenario():
+        manager = YouTubeDownloadJobManager(max_workers=1, max_pending=2)
+        manager.submit(URL, KIND_AUDIO, audio_format="mp3")
+        manager.submit(URL, KIND_AUDIO, audio_format="m4a")
+        with pytest.raises(DownloadQueueFullError):
+            manager.submit(URL, KIND_AUDIO, audio_format="wav")
+        await manager.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_failed_download_reports_error(downloads):
+    downloads.fail = True
+
+    async def scenario():
+        manager = YouTubeDownloadJobManager()
+        job = manager.submit(URL, KIND_AUDIO, audio_format="mp3")
+        with pytest.raises(RuntimeError, match="403"):
+            await manager.wait(job)
+        assert job.status == JOB_FAILED
+        # Job lỗi không được dùng lại
+        assert manager.submit(URL, KIND_AUDIO, audio_format="mp3") is not job
+        await manager.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_cancel_running_job_stops_at_progress_hook(downloads):
+    downloads.steps, downloads.delay = 100, 0.01
+
+    async def scenario():
+        manager = YouTubeDownloadJobManager()
+        job = manager.submit(URL, KIND_VIDEO, quality="720p", mode="merged")
+        while not job.files:
+            await asyncio.sleep(0.01)
+        await manager.cancel(job.id)
+        assert job.status == JOB_CANCELLED
+        assert downloads.running == 0  # worker đã thực sự dừng
+        with pytest.raises(RuntimeError, match="cancelled"):
+            await manager.wait(job)
+        await manager.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_expired_jobs_removed_periodically_and_on_read(downloads):
+    async def scenario():
+        manager = YouTubeDownloadJobManager(job_ttl=0, cleanup_interval=0.05)
+        job = manager.submit(URL, KIND_AUDIO, audio_format="mp3")
+        await manager.wait(job)
+        # Không có request nào: vòng dọn định kỳ vẫn xóa job hết hạn rồi tự dừng
+        await asyncio.wait_for(manager._cleanup_task, timeout=1)
+        assert manager.jobs == {} and manager._by_key == {}
+
+        job = manager.submit(URL, KIND_AUDIO, audio_format="m4a")
+        await manager.wait(job)
+        time.sleep(0.01)
+        assert manager.get(job.id) is None
+        assert manager.list_jobs() == []
+        await manager.shutdown()
+
+    asyncio.run(scenario())
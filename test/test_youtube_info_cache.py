@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from app.services.youtube import youtube_info_cache as info_cache_module
+from app.services.youtube.youtube_info_cache import YouTubeInfoCache
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+class _FakeYoutubeDL:
+    """Thay yt_dlp.YoutubeDL: đếm số lần extract, chậm một chút để các thread chồng lên nhau"""
+    calls = []
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False, process=True):
+        assert download is False and process is False
+        _FakeYoutubeDL.calls.append(url)
+        time.sleep(0.05)
+        return {"id": VIDEO_ID, "title": "Video", "formats": [{"format_id": "18"}]}
+
+
+@pytest.fixture
+def fake_ydl(monkeypatch):
+    _FakeYoutubeDL.calls = []
+    monkeypatch.setattr(info_cache_module.yt_dlp, "YoutubeDL", _FakeYoutubeDL)
+    return _FakeYoutubeDL
+
+
+def test_concurrent_extracts_call_yt_dlp_once(fake_ydl):
+    cache = YouTubeInfoCache()
+    urls = [f"https://www.youtube.com/watch?v={VIDEO_ID}", f"https://youtu.be/{VIDEO_ID}"] * 10
+    results = []
+    threads = [threading.Thread(target=lambda url=url: results.append(cache.extract(url))) for url in urls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(fake_ydl.calls) == 1
+    assert len(results) == len(urls)
+    status = cache.get_status()
+    assert status["misses"] == 1
+    assert status["hits"] == len(urls) - 1
+    # Lock theo video được gỡ khi thread cuối cùng xong
+    assert cache._key_locks == {}
+
+
+def test_callers_get_independent_copies(fake_ydl):
+    cache = YouTubeInfoCache()
+    first = cache.extract(f"https://youtu.be/{VIDEO_ID}")
+    first["formats"].append({"format_id": "mutated"})
+    second = cache.extract(f"https://youtu.be/{VIDEO_ID}")
+    assert second["formats"] == [{"format_id": "18"}]
+
+
+def test_expired_entry_is_extracted_again(fake_ydl):
+    cache = YouTubeInfoCache(ttl=0)
+    cache.extract(f"https://youtu.be/{VIDEO_ID}")
+    cache.extract(f"https://youtu.be/{VIDEO_ID}")
+    assert len(fake_ydl.calls) == 2
+
+
+def test_lru_eviction():
+    cache = YouTubeInfoCache(max_entries=2)
+    cache.put("a", {"id": "a"})
+    cache.put("b", {"id": "b"})
+    cache.get("a")  # a mới dùng -> b bị evict
+    cache.put("c", {"id": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"id": "a"}
+    assert cache.get_status()["evictions"] == 1
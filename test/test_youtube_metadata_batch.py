@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from app.models.youtube.youtube_metadata_model import YouTubeMetadata
+from app.services.youtube import youtube_metadata_batch as batch_module
+from app.services.youtube.youtube_metadata_batch import YouTubeMetadataBatch, KIND_OG
+
+
+def _metadata(video_id):
+    return YouTubeMetadata(video_id=video_id, title=f"Video {video_id}", description=None, image=None,
+                           url=f"https://www.youtube.com/watch?v={video_id}")
+
+
+class _FakeClient:
+    closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.fixture
+def og(monkeypatch):
+    """Thay YouTubeServiceOg: ghi lại URL được lấy, video 'failVideo01' lỗi"""
+    calls = []
+    client = _FakeClient()
+
+    async def fetch_metadata(url, http_client):
+        assert http_client is client
+        calls.append(url)
+        await asyncio.sleep(0)
+        video_id = url.rsplit("=", 1)[-1]
+        if video_id == "failVideo01":
+            raise ValueError("video unavailable")
+        return _metadata(video_id)
+
+    monkeypatch.setattr(batch_module.YouTubeServiceOg, "create_client", staticmethod(lambda: client))
+    monkeypatch.setattr(batch_module.YouTubeServiceOg, "fetch_metadata", staticmethod(fetch_metadata))
+    og.calls = calls
+    og.client = client
+    return og
+
+
+def _collect(batch, urls, **kwargs):
+    async def scenario():
+        return [event async for event in batch.stream(urls, **kwargs)]
+
+    return asyncio.run(scenario())
+
+
+def test_normalize_groups_urls_by_video_id():
+    groups, invalid = YouTubeMetadataBatch.normalize([
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://example.com/video",
+        " https://youtu.be/dQw4w9WgXcQ ",
+        "https://m.youtube.com/shorts/abcdefghijk",
+    ])
+    assert list(groups) == ["dQw4w9WgXcQ", "abcdefghijk"]
+    assert groups["dQw4w9WgXcQ"] == ["https://www.youtube.com/watch?v=dQw4w9WgXcQ", " https://youtu.be/dQw4w9WgXcQ "]
+    assert invalid == ["https://example.com/video"]
+
+
+def test_cache_ttl_and_lru_bound(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(batch_module.time, "monotonic", lambda: now[0])
+    batch = YouTubeMetadataBatch(ttl=60, max_entries=2)
+    batch.put(KIND_OG, "a", _metadata("a"))
+    batch.put(KIND_OG, "b", _metadata("b"))
+    assert batch.get("full", "a") is None  # cache tách theo kind
+    assert batch.get(KIND_OG, "a").video_id == "a"  # a mới dùng -> b bị đẩy ra trước
+    batch.put(KIND_OG, "c", _metadata("c"))
+    assert batch.get(KIND_OG, "b") is None
+    assert batch.get(KIND_OG, "a") is not None
+
+    now[0] += 61
+    assert batch.get(KIND_OG, "a") is None
+    assert batch.get_status()["entries"] == 1
+
+
+def test_stream_fetches_each_video_once_and_caches(og):
+    batch = YouTubeMetadataBatch()
+    urls = ["https://www.youtube.com/watch?v=dQw4w9WgXcQ", "https://youtu.be/dQw4w9WgXcQ",
+            "https://youtu.be/failVideo01", "not a url"]
+    events = _collect(batch, urls)
+
+    start, *results, summary = events
+    assert start["event"] == "start" and start["unique_videos"] == 2 and start["invalid_urls"] == 1
+    assert len(og.calls) == 2 and og.client.closed
+    by_video = {event["video_id"]: event for event in results}
+    assert by_video["dQw4w9WgXcQ"]["urls"] == urls[:2] and by_video["dQw4w9WgXcQ"]["from_cache"] is False
+    assert by_video["failVideo01"]["success"] is False and by_video["failVideo01"]["error"] == "video unavailable"
+    assert by_video[None]["success"] is False
+    assert (summary["processed"], summary["successful_count"], summary["failed_count"]) == (3, 1, 2)
+
+    # Lần hai: video đã lấy thành công trả từ cache, video lỗi lấy lại
+    og.calls.clear()
+    start, *results, summary = _collect(batch, urls[:3])
+    assert start["cache_hits"] == 1
+    assert results[0]["video_id"] == "dQw4w9WgXcQ" and results[0]["from_cache"] is True
+    assert og.calls == ["https://www.youtube.com/watch?v=failVideo01"]
+    assert batch.get_status()["hits"] == 1 and batch.get_status()["misses"] == 3